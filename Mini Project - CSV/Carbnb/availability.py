@@ -0,0 +1,142 @@
+from bisect import bisect_left
+from datetime import datetime as dt
+from config import RENT_PATH
+from tablestore import get_table
+from profiling import scanned
+
+
+class CarSchedule:
+    """
+    The bookings of a single car, kept as a sorted list of non-overlapping intervals.
+
+    Bookings of a car never overlap (every new one is checked against the existing
+    ones, and touching end points count as a conflict), so sorting them by pickup
+    time also sorts them by return time. That lets a conflict check find the only
+    bookings that could overlap a period with one binary search.
+    """
+
+    def __init__(self):
+        self._starts = []
+        self._ends = []
+        self._ids = []
+
+    def __len__(self):
+        return len(self._ids)
+
+    def conflicts(self, start, end, ignore_id=None):
+        """
+        Check whether a period overlaps any booking of the car, in O(log n).
+
+        Parameters:
+            start: The start of the period.
+            end: The end of the period.
+            ignore_id (optional): ID of a booking to leave out, e.g. the order being edited.
+
+        Returns:
+            bool: True if the period overlaps a booking, False otherwise.
+        """
+        # The first booking that ends at or after the start of the period
+        i = first = bisect_left(self._ends, start)
+        while i < len(self._ids) and self._starts[i] <= end:
+            if self._ids[i] != ignore_id:
+                scanned(i - first + 1)
+                return True
+            i += 1
+        scanned(i - first)
+        return False
+
+    def add(self, rent_id, start, end):
+        i = bisect_left(self._starts, start)
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
+        self._ids.insert(i, rent_id)
+
+    def remove(self, rent_id, start):
+        i = bisect_left(self._starts, start)
+        while i < len(self._ids) and self._ids[i] != rent_id:
+            i += 1
+        if i < len(self._ids):
+            del self._starts[i], self._ends[i], self._ids[i]
+
+
+class AvailabilityIndex:
+    """
+    Per-car schedules of all the rental orders, built from the rent table on first use.
+
+    Rent saves, edits and deletes update the index in place. If the rent table is
+    reloaded from disk because another process changed it, the index is rebuilt.
+    """
+
+    def __init__(self):
+        self._cars = {}
+        self._orders = {}
+        self._generation = None
+
+    def _sync(self):
+        table = get_table(RENT_PATH)
+        table.refresh()
+        if table.generation != self._generation:
+            self.rebuild()
+
+    def rebuild(self):
+        """
+        Build the schedules again from the rows of the rent table.
+        """
+        table = get_table(RENT_PATH)
+        self._cars = {}
+        self._orders = {}
+        for row in table.rows():
+            self._add(row['ID'], row['Car'], dt.strptime(row['Pickup Time'], '%Y-%m-%d %H:%M:%S'),
+                      dt.strptime(row['Return Time'], '%Y-%m-%d %H:%M:%S'))
+        self._generation = table.generation
+
+    def _add(self, rent_id, car, start, end):
+        self._cars.setdefault(car, CarSchedule()).add(rent_id, start, end)
+        self._orders[rent_id] = (car, start)
+
+    def is_free(self, car, start, end, ignore_id=None):
+        """
+        Check whether a car has no booking overlapping a period.
+
+        Parameters:
+            car: Serial number of the car.
+            start (datetime): The pickup time.
+            end (datetime): The return time.
+            ignore_id (optional): ID of an order to leave out, e.g. the order being edited.
+
+        Returns:
+            bool: True if the car is free for the whole period.
+        """
+        self._sync()
+        schedule = self._cars.get(str(car))
+        ignore_id = str(ignore_id) if ignore_id is not None else None
+        return schedule is None or not schedule.conflicts(start, end, ignore_id)
+
+    def put(self, rent_id, car, start, end):
+        """
+        Add an order to the index, replacing its previous booking if it has one.
+        """
+        self._sync()
+        self.discard(rent_id)
+        self._add(str(rent_id), str(car), start, end)
+
+    def put_row(self, row):
+        """
+        Add an order to the index from a rent row, as saved by FileHandler.
+        """
+        self.put(row['ID'], row['Car'], dt.strptime(str(row['Pickup Time']), '%Y-%m-%d %H:%M:%S'),
+                 dt.strptime(str(row['Return Time']), '%Y-%m-%d %H:%M:%S'))
+
+    def discard(self, rent_id):
+        """
+        Remove an order from the index, if it is in it.
+        """
+        self._sync()
+        order = self._orders.pop(str(rent_id), None)
+        if order is not None:
+            car, start = order
+            self._cars[car].remove(str(rent_id), start)
+
+
+# The process-wide index used by helpers.is_available and the Rent writes
+INDEX = AvailabilityIndex()
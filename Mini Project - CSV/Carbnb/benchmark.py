@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime as dt, timedelta
+from types import SimpleNamespace
+import config
+
+# The benchmark never touches the configured files. It runs on CSV files in CARBNB_BENCH_FOLDER,
+# kept and reused by later runs of the same size and seed, or else in a temporary folder removed
+# when the run ends. The paths are set before the rest of the application is imported, since
+# its modules read them on import.
+BENCH_FOLDER = os.environ.get('CARBNB_BENCH_FOLDER') or tempfile.mkdtemp(prefix='carbnb-bench-')
+for name, file_name in (('CARS_PATH', 'cars.csv'), ('PERSON_PATH', 'person.csv'), ('RENT_PATH', 'rent.csv'),
+                        ('REVENUE_PATH', 'revenue_daily.csv'), ('RENT_ID_COUNTER', 'id_counter.txt'),
+                        ('LOGGER', 'carbnb.log'), ('PROFILE_PATH', 'profile.json')):
+    setattr(config, name, os.path.join(BENCH_FOLDER, file_name))
+
+from config import *  # noqa: E402
+from helpers import get_by_id, is_available  # noqa: E402
+from importer import batches  # noqa: E402
+from storage import get_engine  # noqa: E402
+from synthetic import SyntheticData  # noqa: E402
+from tablestore import get_table, compact_all  # noqa: E402
+from rent import Rent  # noqa: E402
+import rollup  # noqa: E402
+import earnings  # noqa: E402
+import profiling  # noqa: E402
+
+# The dataset the benchmark files hold, so a kept folder is only loaded again for another size or seed
+STAMP_PATH = os.path.join(BENCH_FOLDER, 'dataset.json')
+
+
+def load(data):
+    """
+    Fill the benchmark files with a synthetic dataset, unless they already hold it.
+
+    Parameters:
+        data (SyntheticData): The dataset.
+
+    Returns:
+        float: The seconds the load took, or None if the files already held the dataset.
+    """
+    dataset = {'rows': data.person_count + data.car_count + data.order_count, 'seed': data.seed}
+    try:
+        with open(STAMP_PATH) as fh:
+            if json.load(fh) == dataset:
+                return None
+    except (FileNotFoundError, ValueError):
+        pass
+
+    started = time.perf_counter()
+    engine = get_engine()
+    # Emptied through the engine, so the rollup and the availability index are emptied with them
+    for entity in ('rent', 'cars', 'person'):
+        for keys in batches(engine.keys(entity)):
+            engine.delete_many(entity, keys)
+
+    orders = ((i, str(pickup), str(ret), client, car) for i, pickup, ret, client, car in data.orders())
+    for entity, fieldnames, rows in (('person', PERSON_FIELDNAMES, data.persons()),
+                                     ('cars', CARS_FIELDNAMES, data.cars()), ('rent', RENT_FIELDNAMES, orders)):
+        for batch in batches(rows):
+            engine.put_many(entity, [dict(zip(fieldnames, row)) for row in batch])
+    compact_all()
+
+    # New orders must never get the IDs of the generated ones
+    with open(RENT_ID_COUNTER, 'w') as fh:
+        fh.write(str(data.order_count))
+
+    with open(STAMP_PATH, 'w') as fh:
+        json.dump(dataset, fh)
+    return time.perf_counter() - started
+
+
+def measure(calls):
+    """
+    Time every call of an operation on its own.
+
+    Parameters:
+        calls (iterable): Callables taking no arguments.
+
+    Returns:
+        dict: The number of calls, and the total, mean, median, 95th percentile and
+        slowest time in seconds.
+    """
+    times = []
+    for call in calls:
+        started = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - started)
+
+    times.sort()
+    count = len(times)
+    total = sum(times)
+    return {'count': count, 'total': total, 'mean': total / count if count else 0.0,
+            'p50': times[count // 2] if count else 0.0, 'p95': times[int(count * 0.95)] if count else 0.0,
+            'max': times[-1] if count else 0.0}
+
+
+def run(rows, seed=0, ops=1000):
+    """
+    Load a synthetic dataset and time the core operations on it.
+
+    menu.year_cal() and menu.range_cal() print earnings.get_engine().total(), and the menu module
+    starts the menu when imported, so 'year_cal' and 'range_cal' time that total over a
+    calendar year and over a range of up to 90 days.
+
+    Parameters:
+        rows (int): Size of the dataset, see SyntheticData.
+        seed: Seed of the dataset and of the operations' arguments. Defaults to 0.
+        ops (int): Number of timed calls per operation. Defaults to 1000.
+
+    Returns:
+        dict: The run's settings and environment, the load time and the timings of every operation,
+        and the profiling statistics if profiling is on.
+    """
+    data = SyntheticData(rows, seed)
+    load_seconds = load(data)
+    rng = random.Random(f"{seed}:benchmark")
+
+    # Stored times sort as text in time order
+    pickups, returns = get_table(RENT_PATH).columns(['Pickup Time', 'Return Time'])
+    first = dt.fromisoformat(min(pickups)) if pickups else data.start
+    last = dt.fromisoformat(max(returns)) if returns else data.start
+    span = max(1, (last - first).days)
+
+    def random_key():
+        file_path = rng.choice((PERSON_PATH, CARS_PATH, RENT_PATH) if data.order_count else (PERSON_PATH, CARS_PATH))
+        if file_path == PERSON_PATH:
+            return data.person_id(rng.randrange(data.person_count)), file_path
+        if file_path == CARS_PATH:
+            return data.car_id(rng.randrange(data.car_count)), file_path
+        return rng.randrange(data.order_count), file_path
+
+    def random_order():
+        # is_available() only reads the car, times and ID of the order it checks
+        pickup = first + timedelta(days=rng.randrange(span), hours=rng.randrange(24))
+        return SimpleNamespace(id=None, car=SimpleNamespace(serial=data.car_id(rng.randrange(data.car_count))),
+                               _pickup_time=pickup, _return_time=pickup + timedelta(days=rng.randint(1, 14)))
+
+    def random_period(max_days):
+        start = first + timedelta(days=rng.randrange(span))
+        return start, start + timedelta(days=rng.randint(1, max_days))
+
+    # New orders are booked after every generated one, each in its own stretch of 15 days
+    created = []
+
+    def create(k):
+        pickup = last + timedelta(days=1 + 15 * k)
+        ret = pickup + timedelta(days=rng.randint(1, 14))
+        order = Rent(pickup_time=str(pickup), return_time=str(ret),
+                     client=str(data.person_id(rng.randrange(data.person_count))),
+                     car=str(data.car_id(rng.randrange(data.car_count))))
+        order.save(new=True)
+        created.append(order)
+
+    operations = {
+        'get_by_id': measure(lambda key=random_key(): get_by_id(*key) for _ in range(ops)),
+        'is_available': measure(lambda order=random_order(): is_available(order) for _ in range(ops)),
+        'rent_create': measure(lambda k=k: create(k) for k in range(ops)),
+        'year_cal': measure(lambda year=rng.randint(first.year, last.year):
+                            earnings.get_engine().total(dt(year, 1, 1), dt(year, 12, 31))
+                            for _ in range(ops)),
+        'range_cal': measure(lambda period=random_period(90): earnings.get_engine().total(*period) for _ in range(ops)),
+        'delete': measure(lambda order=order: order.delete() for order in list(created)),
+    }
+
+    result = {'backend': 'csv', 'rows': rows, 'seed': seed, 'ops': ops,
+              'counts': {'person': data.person_count, 'cars': data.car_count, 'rent': data.order_count},
+              'load_seconds': load_seconds, 'started': dt.now().isoformat(timespec='seconds'),
+              'python': platform.python_version(), 'platform': platform.platform(), 'operations': operations}
+    # With CARBNB_PROFILE=1, the inner timings of the run come with it
+    if profiling.is_enabled():
+        result['profile'] = profiling.stats()
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the core operations on a synthetic dataset.")
+    parser.add_argument('--rows', type=int, default=10000, help="Size of the dataset, e.g. 1000 to 10000000")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--ops', type=int, default=1000, help="Timed calls per operation")
+    parser.add_argument('--output', help="Append the results to this JSON Lines file")
+    args = parser.parse_args()
+
+    try:
+        result = run(args.rows, args.seed, args.ops)
+    finally:
+        if 'CARBNB_BENCH_FOLDER' not in os.environ:
+            profiling.enable(False)  # The statistics are in the result, not written to the removed folder
+            shutil.rmtree(BENCH_FOLDER, ignore_errors=True)
+
+    line = json.dumps(result)
+    if args.output:
+        with open(args.output, 'a') as fh:
+            fh.write(line + '\n')
+    print(line)
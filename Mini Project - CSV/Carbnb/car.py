@@ -1,7 +1,7 @@
 from config import *
 from filehandler import FileHandler
-from helpers import get_by_id
 from person import Person
+from identity import Ref
 
 
 class Car(FileHandler):
@@ -17,9 +17,11 @@ class Car(FileHandler):
          engine (int): Engine capacity of the car.
          day_cost (int): Daily rental cost of the car.
          km (int): Total kilometers driven by the car.
-         owner (Person): Owner of the car, represented by a Person object.
+         owner (Ref): Owner of the car, a lazy reference to a Person object.
      """
 
+    __slots__ = ('_serial', '_brand', '_model', '_year', '_engine', '_day_cost', '_km', '_owner', '_session')
+
     def __init__(self, serial, brand, model, year, engine, day_cost, km, owner):
         # Initialize the car with specified attributes
         self.serial = serial
@@ -152,27 +154,32 @@ class Car(FileHandler):
 
     @owner.setter
     def owner(self, new_value):
+        # Only the owner's ID is kept. The Person is built through the identity map when it is used
+        if not isinstance(new_value, Ref):
+            new_value = Ref(PERSON_PATH, new_value, Person.from_row)
+            assert new_value.resolve() is not None, f"This owner ID does not exists in our database"
+
+        self._owner = new_value
 
-        row = get_by_id(new_value, PERSON_PATH)
-        assert new_value is not None, f"This owner ID does not exists in our database"
+    @classmethod
+    def from_row(cls, row):
+        """
+        Create a Car object from a row of the cars file, without validating it again.
+        The owner is referenced lazily, so no Person is built for it.
 
-        self._owner = Person(row['ID'], row['First Name'], row['Last Name'], row['Age'], row['Email'],
-                             row['Phone'])
+        Parameters:
+            row (dict): The row, keyed by the file's field names.
+
+        Returns:
+            Car: The car of the row.
+        """
+        return cls._from_values((int(row['Serial']), row['Brand'], row['Model'], int(row['Year']),
+                                 int(row['Engine']), int(row['Day Cost']), int(row['KM']),
+                                 Ref(PERSON_PATH, row['Owner'], Person.from_row)))
 
     @classmethod
     def load_from_csv(cls):
-        # Load car objects from a CSV file
+        # Load car objects from a CSV file. The owners are only built if they are used
         reader = FileHandler.load(file_path=CARS_PATH)
-        objects = []
-
-        for row in reader:
-            objects.append(cls(serial=int(row['Serial']),
-                               brand=row['Brand'],
-                               model=row['Model'],
-                               year=int(row['Year']),
-                               engine=int(row['Engine']),
-                               day_cost=int(row['Day Cost']),
-                               km=int(row['KM']),
-                               owner=int(row['Owner'])))
-
-        return objects
+
+        return [cls.from_row(row) for row in reader]
@@ -1,5 +1,7 @@
 # Configuration settings for the Car Rental Management System
 
+import os
+
 # File paths for various CSV files used in the system.
 # These paths are utilized by other modules to access and manage data.
 
@@ -12,12 +14,21 @@ PERSON_PATH = r'C:\Users\User\PycharmProjects\class2\Mini Project\Package\System
 RENT_PATH = r'C:\Users\User\PycharmProjects\class2\Mini Project\Package\System files\rent.csv'
 # Path to the CSV file containing rental transaction data
 
+REVENUE_PATH = r'C:\Users\User\PycharmProjects\class2\Mini Project\Package\System files\revenue_daily.csv'
+# Path to the CSV file holding the daily revenue rollup, maintained alongside rent.csv
+
 RENT_ID_COUNTER = r'C:\Users\User\PycharmProjects\class2\Mini Project\Package\System files\id_counter.txt'
-# Path to the file used for tracking the next available rental ID
+# Path to the file used for tracking the next rental ID that has not been reserved yet
 
 LOGGER = r'C:\Users\User\PycharmProjects\class2\Mini Project\Package\System files\carbnb.log'
 # Path to the log file for the application
 
+PROFILE_PATH = r'C:\Users\User\PycharmProjects\class2\Mini Project\Package\System files\profile.json'
+# Path to the file the profiling statistics are written to when the application exits
+
+AUDIT_INDEX = r'C:\Users\User\PycharmProjects\class2\Mini Project\Package\System files\audit.db'
+# Path to the audit index, a SQLite database of the records of the log file, see audit.py
+
 # Field names for the CSV files. These are used by the FileHandler class
 # to read and write data to the CSV files in a structured format.
 
@@ -29,3 +40,64 @@ CARS_FIELDNAMES = ['Serial','Brand','Model','Year','Engine','Day Cost','KM','Own
 
 PERSON_FIELDNAMES = ['ID','First Name','Last Name','Age','Email','Phone']
 # Field names for the person.csv file
+
+REVENUE_FIELDNAMES = ['Key','Day','Car','Owner','Revenue','Orders']
+# Field names for the revenue_daily.csv file. Key joins Day (days since the epoch), Car and Owner
+
+# Write-ahead journal settings used by the tablestore module.
+
+JOURNAL_MODE = True
+# If True, inserts, updates and deletes are appended to a journal file next to each CSV file
+# instead of rewriting the whole file on every change
+
+JOURNAL_COMPACT_THRESHOLD = 1000
+# Minimum number of journal records before the journal is folded back into its CSV file.
+# Compaction also waits until the journal is as long as the CSV file itself, keeping writes O(1) amortized
+
+WRITE_FLUSH_INTERVAL = 0.0
+# Seconds the changes to a table are held in memory before they are written together (group commit).
+# 0 writes every change before the call making it returns. Changes still held when the process is killed are lost
+
+WRITE_DURABILITY = 'normal'
+# When the CSV files and journals are synced to disk. Every rewrite of a CSV file replaces it in one step either way.
+# 'off': never, the operating system writes them in its own time; 'normal': a rewritten file is synced before it
+# replaces the old one, so a power loss never leaves it half written; 'full': journal appends and the replacing
+# are synced too, so a change survives a power loss once it is written
+
+LOCK_TIMEOUT = 30.0
+# Seconds to wait for another process to release a table's lock file before giving up with a TimeoutError.
+# Only enforced on Windows, where the lock is polled; elsewhere the wait is left to the operating system
+
+# Rental ID allocation settings used by the sequence module.
+
+ID_BLOCK_SIZE = 1000
+# Number of rental IDs a process reserves in the counter file at a time. IDs are then handed out
+# from memory, and the unused rest of a block is skipped when the process exits
+
+# Bulk import settings used by the importer module.
+
+IMPORT_BATCH_SIZE = 5000
+# Number of rows the bulk importer reads and validates at a time
+
+# Profiling settings used by the profiling module.
+
+PROFILE = os.environ.get('CARBNB_PROFILE', '0') not in ('', '0')
+# If True, the hot paths (FileHandler methods, availability checks and earnings) record their call counts,
+# latencies and rows scanned. Turned on by setting the CARBNB_PROFILE environment variable to 1
+
+# Application log settings used by the logqueue module.
+
+LOG_FORMAT = 'json'
+# Format of the log records: 'json' writes one JSON object per line, 'text' the classic 'LEVEL:time:message' lines
+
+LOG_ROTATE = 'size'
+# When the log file is rotated: 'size' once it reaches LOG_MAX_BYTES, or 'midnight' once a day
+
+LOG_MAX_BYTES = 5 * 1024 * 1024
+# Size in bytes at which the log file is rotated, when LOG_ROTATE is 'size'
+
+LOG_BACKUP_COUNT = 5
+# Number of rotated log files kept next to the log file
+
+LOG_FLUSH_RECORDS = 100
+# The background log writer flushes the log file whenever its queue runs dry, and at least every this many records
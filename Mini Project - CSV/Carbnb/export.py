@@ -0,0 +1,142 @@
+import argparse
+import csv
+import gzip
+import json
+from datetime import datetime as dt, timedelta
+from config import *
+from helpers import to_epoch, EPOCH
+from tablestore import get_table
+import rollup
+
+DAY = 86400  # Seconds in a day
+
+# What can be exported: the file, the fields written out, the field behind each filter,
+# the fields holding numbers, and the field holding the pickup time (rent) or day (revenue).
+# Revenue days are written out as 'YYYY-MM-DD'.
+EXPORTS = {
+    'person': {'path': PERSON_PATH, 'fields': PERSON_FIELDNAMES, 'filters': {'owner': 'ID'},
+               'numbers': ('Age',)},
+    'cars': {'path': CARS_PATH, 'fields': CARS_FIELDNAMES, 'filters': {'car': 'Serial', 'owner': 'Owner'},
+             'numbers': ('Year', 'Engine', 'Day Cost', 'KM')},
+    'rent': {'path': RENT_PATH, 'fields': RENT_FIELDNAMES, 'filters': {'car': 'Car', 'owner': None},
+             'numbers': (), 'time': 'Pickup Time'},
+    'revenue': {'path': REVENUE_PATH, 'fields': REVENUE_FIELDNAMES[1:],
+                'filters': {'car': 'Car', 'owner': 'Owner'}, 'numbers': ('Revenue', 'Orders'), 'time': 'Day'},
+}
+
+FORMATS = ('csv', 'jsonl')
+
+
+def _source(name, car=None, owner=None):
+    # The rows of an export matching its car and owner filters, through the tables' indexes.
+    # Orders have no owner field, so they are found through the owner's cars
+    export = EXPORTS[name]
+    table = rollup.rollup_table() if name == 'revenue' else get_table(export['path'])
+    for key, value in (('car', car), ('owner', owner)):
+        assert value is None or key in export['filters'], f"The {name} export cannot be filtered by {key}"
+
+    if name == 'rent' and owner is not None:
+        serials = [car_row['Serial'] for car_row in get_table(CARS_PATH).find('Owner', owner)]
+        return (row for serial in serials if car is None or serial == str(car)
+                for row in table.scan('Car', serial))
+
+    lookups = [(export['filters'][key], str(value)) for key, value in (('car', car), ('owner', owner))
+               if value is not None]
+    if not lookups:
+        return table.scan()
+
+    column, value = lookups[0]
+    if column == table.key:
+        rows = [row for row in (table.get(value),) if row is not None]
+    else:
+        rows = table.scan(column, value)
+    return (row for row in rows if all(row[column] == value for column, value in lookups[1:]))
+
+
+def iter_rows(name, start=None, end=None, car=None, owner=None):
+    """
+    Stream the rows of a table or report, copying one row at a time.
+
+    Parameters:
+        name (str): 'person', 'cars', 'rent' or 'revenue' (the daily revenue rollup).
+        start (datetime, optional): Only orders picked up, or revenue earned, on this day or later.
+        end (datetime, optional): Only orders picked up, or revenue earned, on this day or earlier.
+        car (optional): Only this car's rows.
+        owner (optional): Only the rows of this owner's cars.
+
+    Yields:
+        list: The values of a row, in the order of EXPORTS[name]['fields'].
+    """
+    assert name in EXPORTS, f"Unknown export: {name}"
+    export = EXPORTS[name]
+    assert start is None and end is None or 'time' in export, f"The {name} export cannot be filtered by date"
+
+    # Both days of the period are included, as in rollup.total()
+    first_day = to_epoch(start) // DAY if start is not None else None
+    last_day = to_epoch(end) // DAY if end is not None else None
+
+    for row in _source(name, car, owner):
+        if 'time' in export:
+            if name == 'revenue':
+                day = int(row['Day'])
+                row['Day'] = (EPOCH + timedelta(days=day)).date().isoformat()
+            else:
+                day = to_epoch(dt.fromisoformat(row[export['time']])) // DAY
+            if first_day is not None and day < first_day or last_day is not None and day > last_day:
+                continue
+
+        for field in export['numbers']:
+            row[field] = int(row[field])
+        yield [row[field] for field in export['fields']]
+
+
+def export(name, path, fmt='csv', compress=None, start=None, end=None, car=None, owner=None):
+    """
+    Write a table or report to a CSV or JSON Lines file, one row at a time.
+
+    Parameters:
+        name (str): 'person', 'cars', 'rent' or 'revenue'.
+        path (str): The file to write.
+        fmt (str): 'csv' or 'jsonl'. Defaults to 'csv'.
+        compress (bool): gzip the file. Defaults to True for paths ending in '.gz'.
+        start, end, car, owner (optional): Filters, as in iter_rows().
+
+    Returns:
+        int: The number of rows written.
+    """
+    assert fmt in FORMATS, f"Unknown export format: {fmt}"
+    if compress is None:
+        compress = path.endswith('.gz')
+
+    fields = EXPORTS[name]['fields']
+    rows = iter_rows(name, start, end, car, owner)
+    count = 0
+    with (gzip.open(path, 'wt', newline='') if compress else open(path, 'w', newline='')) as fh:
+        if fmt == 'csv':
+            writer = csv.writer(fh)
+            writer.writerow(fields)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                fh.write(json.dumps(dict(zip(fields, row))) + '\n')
+                count += 1
+
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export a table or the daily revenue report.")
+    parser.add_argument('name', choices=sorted(EXPORTS))
+    parser.add_argument('path', help="Output file. Paths ending in .gz are compressed")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--start', type=dt.fromisoformat, help="First day, YYYY-MM-DD")
+    parser.add_argument('--end', type=dt.fromisoformat, help="Last day, YYYY-MM-DD")
+    parser.add_argument('--car')
+    parser.add_argument('--owner')
+    args = parser.parse_args()
+
+    count = export(args.name, args.path, args.format, start=args.start, end=args.end, car=args.car,
+                   owner=args.owner)
+    print(f"{count} rows exported to {args.path}")
@@ -1,7 +1,9 @@
-import csv
 from abc import abstractmethod, ABCMeta
 import helpers
 from config import *
+from storage import get_engine, ENTITIES, ENTITY_OF_PATH
+from tablestore import batch
+from profiling import profiled
 
 
 class FileHandler(metaclass=ABCMeta):
@@ -12,8 +14,40 @@ class FileHandler(metaclass=ABCMeta):
 
     The class provides generic methods for loading, saving, deleting, and checking
     the existence of data in CSV files, which are overridden in child classes as needed.
+    All reads and writes go through the storage engine of the storage module, by default
+    the shared in-memory tables of the tablestore module.
     """
 
+    # Entities keep their attributes in slots rather than a per-instance __dict__.
+    # Subclasses list their stored attributes in storage order, followed by '_session'.
+    __slots__ = ()
+
+    @classmethod
+    def _from_values(cls, values):
+        """
+        Create an object straight from stored values, skipping __init__ and the validating
+        setters. Only for rows read back from storage, which were validated when written.
+
+        Parameters:
+            values (iterable): Values of the class's slots, in __slots__ order.
+
+        Returns:
+            The new object.
+        """
+        obj = cls.__new__(cls)
+        for name, value in zip(cls.__slots__, values):
+            object.__setattr__(obj, name, value)
+        return obj
+
+    def __setattr__(self, name, value):
+        # Public attributes are set through validating properties. An object that belongs
+        # to a session reports them, so the session knows which objects to write back.
+        super().__setattr__(name, value)
+        if not name.startswith('_'):
+            session = getattr(self, '_session', None)
+            if session is not None:
+                session.mark_dirty(self, name)
+
     @abstractmethod
     def obj_to_str(self):
         """
@@ -46,6 +80,7 @@ class FileHandler(metaclass=ABCMeta):
         """
         pass
 
+    @profiled(rows=len)
     def load(self=None, file_path=None):
         """
         Load data from a CSV file.
@@ -55,19 +90,14 @@ class FileHandler(metaclass=ABCMeta):
             file_path (str, optional): Path of the CSV file to load.
 
         Returns:
-            list of dict: Rows from the CSV file as dictionaries.
+            list of dict: Rows from the CSV file as dictionaries, in file order.
         """
         if self:
             file_path = self.get_file_path()
-        else:
-            file_path = file_path
 
-        with open(file=file_path, mode='r') as fh:
-            reader = csv.DictReader(fh)
-            rows = [x for x in reader]
-
-            return rows
+        return list(get_engine().scan(ENTITY_OF_PATH[file_path]))
 
+    @profiled(rows=lambda row: int(row is not None))
     def check_id(self=None, object_id=None, check_rent=None):
         """
              Check if an ID exists in the corresponding CSV file.
@@ -78,10 +108,8 @@ class FileHandler(metaclass=ABCMeta):
                  check_rent (bool, optional): Flag to check in the rent file.
 
              Returns:
-                 dict or None: Dictionary containing the rows and reader if the ID is found; None otherwise.
+                 dict or None: The row holding the ID if it is found; None otherwise.
              """
-        res = None
-
         # Determine the appropriate file path based on the context (rental or other).
         if object_id or check_rent:
             file_path = RENT_PATH
@@ -89,28 +117,9 @@ class FileHandler(metaclass=ABCMeta):
             file_path = self.get_file_path()
             object_id = self.get_id()
 
-        # Open the file and read the data to check for the existence of the given ID.
-        with open(file=file_path, mode='r') as fh:
-            reader = csv.DictReader(fh)
-            rows = [x for x in reader]
-
-            # Loop through the rows to find a matching ID.
-            for row in rows:
-                # Special handling for cars, checking 'Serial' instead of 'ID'.
-                if file_path == CARS_PATH:
-                    if row['Serial'] == str(object_id):
-                        new_rows = [x for x in rows if x['Serial'] != str(object_id)]
-                        res = {"rows": new_rows, "reader": reader}
-                        break
-                # Standard handling for other types of objects.
-                else:
-                    if row['ID'] == str(object_id):
-                        new_rows = [x for x in rows if x['ID'] != str(object_id)]
-                        res = {"rows": new_rows, "reader": reader}
-                        break
-
-        return res
+        return get_engine().get(ENTITY_OF_PATH[file_path], object_id)
 
+    @profiled()
     def delete(self=None, object_d: dict = None):
         """
                 Delete an object from its corresponding CSV file.
@@ -122,54 +131,44 @@ class FileHandler(metaclass=ABCMeta):
         # Determine the context and prepare for deletion.
         if object_d:
             file_path = RENT_PATH
-            reader_d = FileHandler.check_id(object_id=object_d['ID'])
+            object_id = object_d['ID']
         else:
             file_path = self.get_file_path()
+            object_id = self.get_id()
 
             # Special handling for clients and cars, checking for open orders.
-            if file_path == PERSON_PATH or CARS_PATH:
+            if file_path in (PERSON_PATH, CARS_PATH):
                 open_orders = helpers.get_orders(self, future_orders=True)
                 assert len(open_orders) == 0, "Unable to delete client."
 
-            reader_d = self.check_id()
-
-        # If the object to be deleted is found, proceed with deletion.
-        if reader_d:
-            with open(file=file_path, mode='w', newline='') as new_file:
-                writer = csv.DictWriter(new_file, fieldnames=reader_d['reader'].fieldnames)
-                writer.writeheader()
-                writer.writerows(reader_d['rows'])
+        # The engine keeps the revenue rollup and availability index in step
+        get_engine().delete(ENTITY_OF_PATH[file_path], object_id)
 
-    def save(self=None, object_d: dict = None):
+    @profiled()
+    def save(self=None, object_d: dict = None, new=False):
         """
                Save an object to its corresponding CSV file.
+               An existing row with the same ID is replaced, unless the object is new.
 
                Parameters:
                    self (optional): Instance of the class calling the method.
                    object_d (dict, optional): Dictionary representing the object to be saved.
+                   new (bool, optional): True for a new object, which must not overwrite a stored row.
+
+               Raises:
+                   AssertionError: If the object is new and its ID already exists.
                """
         # Determine the context and prepare for saving.
         if self:
-            file_path = self.get_file_path(fieldnames=True)
-            reader_d = self.check_id()
+            file_path = self.get_file_path()
+            row = self.obj_to_dict()
         else:
             file_path = RENT_PATH
-            reader_d = FileHandler.check_id(object_id=object_d['ID'])
-            reader_d['rows'].append(object_d)
-            sorted_rows = sorted(reader_d['rows'], key=lambda d: d['ID'])
-            reader_d['rows'] = sorted_rows
-
-        # If the object is not present in the file, append it.
-        if reader_d:
-            if self:
-                reader_d['rows'].append(self.obj_to_dict())
-            with open(file=file_path['file_path'], mode='w', newline='') as new_file:
-                writer = csv.DictWriter(new_file, fieldnames=reader_d['reader'].fieldnames)
-                writer.writeheader()
-                writer.writerows(reader_d['rows'])
-
-        # Additional code to append the object to the file.
-        with open(file=file_path['file_path'], mode='a', newline='') as fh:
-            writer = csv.DictWriter(fh, fieldnames=file_path['fieldnames'])
-            row = self.obj_to_dict()
-            writer.writerow(row)
+            row = object_d
+
+        engine, entity = get_engine(), ENTITY_OF_PATH[file_path]
+        key = row[ENTITIES[entity][1]]
+        # The check and the write are made in one batch, so no other process writes the ID in between
+        with batch():
+            assert not new or engine.get(entity, key) is None, f"ID {key} already exists"
+            engine.put(entity, row)
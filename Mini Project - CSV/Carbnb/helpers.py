@@ -1,7 +1,12 @@
-import csv
-from datetime import datetime as dt
+from datetime import datetime as dt, timedelta
 from config import *
-import logging
+from tablestore import get_table
+from availability import INDEX
+from profiling import profiled
+from logqueue import setup_logging
+
+EPOCH = dt(1970, 1, 1)
+SECOND = timedelta(seconds=1)
 
 
 def auto_log(msg, object_id):
@@ -12,12 +17,11 @@ def auto_log(msg, object_id):
            msg (str): The message to log.
            object_id: The ID of the object related to the log message.
        """
-    # Configure logging settings
-    logging.basicConfig(filename=LOGGER, level=logging.DEBUG, format='%(levelname)s:%(asctime)s:%(message)s')
-    # Log the message
-    logging.info(f"{msg}: ID: {object_id}")
+    # Queue the message for the background log writer, so the caller never waits on the disk
+    setup_logging().info(f"{msg}: ID: {object_id}", extra={'event': msg, 'object_id': object_id})
 
 
+@profiled()
 def is_available(order):
     """
        Check if a car is available for rental within the specified time frame.
@@ -28,23 +32,11 @@ def is_available(order):
        Returns:
            bool: True if available, False otherwise.
        """
-    # Load existing rental orders
-    reader = order.load()
-    flag = True
-
-    # Check each order for time overlap
-    for row in reader:
-        pickup_time = dt.strptime(row['Pickup Time'], '%Y-%m-%d %H:%M:%S')
-        return_time = dt.strptime(row['Return Time'], '%Y-%m-%d %H:%M:%S')
-
-        # Determine if the requested times conflict with existing orders
-        if return_time >= order._pickup_time >= pickup_time or pickup_time <= order._return_time <= return_time:
-            flag = False
-            break
-
-    return flag
+    # Look only at the bookings of the requested car, through its sorted schedule
+    return INDEX.is_free(order.car.serial, order._pickup_time, order._return_time, ignore_id=order.id)
 
 
+@profiled(rows=lambda row: int(row is not None))
 def get_by_id(id_, file):
     """
        Retrieve a record by its ID from a specified CSV file.
@@ -56,26 +48,8 @@ def get_by_id(id_, file):
        Returns:
            dict or None: The found record as a dictionary, or None if not found.
        """
-    # Read data from the specified file
-    with open(file=file, mode='r') as fh:
-        reader = csv.DictReader(fh)
-        rows = [x for x in reader]
-
-    res = None
-
-    # Search for the ID in the appropriate column based on the file type
-    if file == CARS_PATH:
-        for row in rows:
-            if row['Serial'] == str(id_):
-                res = row
-                break
-    else:
-        for row in rows:
-            if row['ID'] == str(id_):
-                res = row
-                break
-
-    return res
+    # Look the ID up in the table's primary key index ('Serial' for cars, 'ID' otherwise)
+    return get_table(file).get(id_)
 
 
 def get_cars(self):
@@ -88,18 +62,7 @@ def get_cars(self):
        Returns:
            list of dict: A list of car records.
        """
-    res = []
-    # Read car data from the file
-    with open(file=CARS_PATH, mode='r') as fh:
-        reader = csv.DictReader(fh)
-        rows = [x for x in reader]
-
-        # Find cars that match the person's ID
-        for row in rows:
-            if row['ID'] == self.id:
-                res.append(row)
-
-    return res
+    return get_table(CARS_PATH).find('Owner', self.id)
 
 
 def get_orders(self, future_orders=False):
@@ -113,28 +76,67 @@ def get_orders(self, future_orders=False):
         Returns:
             list of dict: A list of order records.
         """
+    # Pick the rent index matching the object type
+    if self.__class__.__name__ == 'Person':
+        rows = get_table(RENT_PATH).find('Client', self.get_id())
+    elif self.__class__.__name__ == 'Car':
+        rows = get_table(RENT_PATH).find('Car', self.get_id())
+    else:
+        return []
+
+    if not future_orders:
+        return rows
+
+    now = dt.now()
+    return [row for row in rows if dt.strptime(row['Pickup Time'], '%Y-%m-%d %H:%M:%S') > now]
+
+
+@profiled(rows=len)
+def find_available_cars(pickup_time, return_time, brand=None, max_day_cost=None, min_year=None):
+    """
+        Find all the cars that are free for a whole rental period, optionally filtered.
+
+        Parameters:
+            pickup_time (datetime): The start of the rental period.
+            return_time (datetime): The end of the rental period.
+            brand (str, optional): Only cars of this brand.
+            max_day_cost (int, optional): Only cars costing at most this much per day.
+            min_year (int, optional): Only cars made in this year or later.
+
+        Returns:
+            list of dict: The car records of the available cars.
+        """
+    if brand:
+        brand = brand.capitalize()  # Brands are stored capitalized
+
     res = []
-    # Read rental data from the file
-    with open(file=RENT_PATH, mode='r') as fh:
-        reader = csv.DictReader(fh)
-        rows = [x for x in reader]
-
-        # Check for orders based on the object type and condition
-        for row in rows:
-            pickup_time = dt.strptime(row['Pickup Time'], '%Y-%m-%d %H:%M:%S')
-            if self.__class__.__name__ == 'Person':
-                # Retrieve orders for a person
-                if int(row['Client']) == int(self.id) and (
-                        future_orders and pickup_time > dt.now() or not future_orders):
-                    res.append(row)
-            elif self.__class__.__name__ == 'Car':
-                # Retrieve orders for a car
-                if int(row['Car']) == int(self.id) and (future_orders and pickup_time > dt.now() or not future_orders):
-                    res.append(row)
+    # A single pass over the cars, with an O(log n) schedule lookup for each car that passes the filters
+    for car in get_table(CARS_PATH).rows():
+        if brand and car['Brand'] != brand:
+            continue
+        if max_day_cost is not None and int(car['Day Cost']) > int(max_day_cost):
+            continue
+        if min_year is not None and int(car['Year']) < int(min_year):
+            continue
+        if INDEX.is_free(car['Serial'], pickup_time, return_time):
+            res.append(car)
 
     return res
 
 
+def to_epoch(time):
+    """
+       Convert a datetime to integer epoch seconds, for compact numeric storage.
+
+       Parameters:
+           time (datetime): The time to convert. Naive times are treated as UTC.
+
+       Returns:
+           int: Seconds since 1970-01-01 00:00:00.
+       """
+    return (time - EPOCH) // SECOND
+
+
 def rent_cost_general(days, car):
     """
        Calculate the total rental cost for a specified number of days.
@@ -0,0 +1,126 @@
+import threading
+from tablestore import get_table
+
+# The session of each thread's innermost `with Session()` block, if any
+_local = threading.local()
+
+
+def current_session():
+    """
+    Returns:
+        Session or None: The session the calling thread is working in.
+    """
+    return getattr(_local, 'session', None)
+
+
+class IdentityMap:
+    """
+    The single in-memory object of every row loaded through a reference, per file and ID.
+
+    Objects are built from their row the first time they are needed and shared from
+    then on. The objects of a file are dropped whenever its table changes (its version
+    moves), so a shared object never outlives the row it was built from.
+    """
+
+    def __init__(self):
+        self._objects = {}
+        self._versions = {}
+
+    def get(self, file_path, key, build):
+        """
+        Return the object of a row, building it on first use.
+
+        Parameters:
+            file_path (str): Path of the CSV file holding the row.
+            key: The primary key of the row.
+            build (callable): Builds the object from the row, e.g. Car.from_row.
+
+        Returns:
+            The object of the row, or None if there is no row with that key.
+        """
+        table = get_table(file_path)
+        table.refresh()
+        if self._versions.get(file_path) != table.version:
+            self._objects[file_path] = {}
+            self._versions[file_path] = table.version
+
+        objects = self._objects[file_path]
+        key = str(key)
+        if key not in objects:
+            row = table.get(key)
+            objects[key] = build(row) if row is not None else None
+
+        return objects[key]
+
+    def clear(self):
+        """
+        Drop every shared object.
+        """
+        self._objects = {}
+        self._versions = {}
+
+
+# The process-wide identity map used by the references between entities
+IDENTITY = IdentityMap()
+
+
+class Ref:
+    """
+    A lazy reference to an entity stored in another CSV file, holding only its key.
+
+    Reading the key attribute never touches the table. Reading any other attribute
+    resolves the reference through the identity map and reads it from the shared
+    object, so loading many rows builds no referenced objects until they are used.
+    """
+
+    __slots__ = ('key', 'file_path', 'build', 'key_attr')
+
+    def __init__(self, file_path, key, build, key_attr='id'):
+        """
+        Parameters:
+            file_path (str): Path of the CSV file holding the referenced row.
+            key: The primary key of the referenced row.
+            build (callable): Builds the referenced object from its row, e.g. Person.from_row.
+            key_attr (str): The attribute of the object that holds its key.
+        """
+        # Set straight on the slots, bypassing __setattr__ below
+        _set = object.__setattr__
+        _set(self, 'key', key)
+        _set(self, 'file_path', file_path)
+        _set(self, 'build', build)
+        _set(self, 'key_attr', key_attr)
+
+    def resolve(self):
+        """
+        Returns:
+            The referenced object, or None if its row does not exist. Inside a session,
+            it is the session's own instance of the entity.
+        """
+        session = current_session()
+        if session is not None:
+            return session.load(self.file_path, self.key, self.build)
+        return IDENTITY.get(self.file_path, self.key, self.build)
+
+    def __getattr__(self, name):
+        # Only called for attributes a Ref does not have itself
+        if name in Ref.__slots__:
+            raise AttributeError(name)
+        if name == self.key_attr:
+            return self.key
+
+        target = self.resolve()
+        assert target is not None, f"ID {self.key} does not exist in {self.file_path}"
+        return getattr(target, name)
+
+    def __setattr__(self, name, value):
+        # Setting an entity attribute through the reference sets it on the referenced object
+        if name in Ref.__slots__:
+            object.__setattr__(self, name, value)
+            return
+
+        target = self.resolve()
+        assert target is not None, f"ID {self.key} does not exist"
+        setattr(target, name, value)
+
+    def __repr__(self):
+        return f"Ref({self.file_path!r}, {self.key!r})"
@@ -0,0 +1,240 @@
+import argparse
+import csv
+from itertools import islice
+from config import *
+from snapshot import get_snapshot
+from tablestore import batch
+from storage import get_engine, ENTITY_OF_PATH
+from identity import Ref
+from person import Person
+from car import Car
+from rent import Rent
+from sequence import RENT_IDS
+
+
+class ImportResult:
+    """
+    The outcome of a bulk import.
+
+    Attributes:
+        counts (dict): Number of rows imported, keyed by file path.
+        errors (list): (file path, line, message) of every rejected row. Nothing is written if there are any.
+    """
+
+    def __init__(self):
+        self.counts = {PERSON_PATH: 0, CARS_PATH: 0, RENT_PATH: 0}
+        self.errors = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+def read_rows(path):
+    """
+    Read the rows of an import file: a CSV file with the same header as the system file it is imported into.
+
+    Parameters:
+        path (str): The path of the file.
+
+    Yields:
+        tuple: The line number and the row, as a dict keyed by field name.
+    """
+    with open(path, 'r', newline='') as fh:
+        reader = csv.DictReader(fh)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def batches(rows, size=IMPORT_BATCH_SIZE):
+    """
+    Split an iterable into lists of at most `size` items.
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def find_overlaps(bookings):
+    """
+    Find the bookings that overlap an earlier booking of the same car, with a sweep over
+    the bookings sorted by car and pickup time.
+
+    Touching end points count as an overlap, as in CarSchedule.conflicts.
+
+    Parameters:
+        bookings (list): (car, pickup, return) of every booking.
+
+    Returns:
+        set: Positions in `bookings` of the rejected bookings.
+    """
+    overlaps = set()
+    car, latest_end = None, None
+    for i in sorted(range(len(bookings)), key=lambda i: bookings[i][:2]):
+        booking_car, pickup, return_ = bookings[i]
+        if booking_car != car:
+            car, latest_end = booking_car, return_
+        elif pickup <= latest_end:
+            overlaps.add(i)
+        else:
+            latest_end = return_
+    return overlaps
+
+
+class Importer:
+    """
+    Load persons, cars and rental orders in bulk, without the interactive menu.
+
+    Rows are validated in batches by the entity classes' own setters. References
+    are checked against in-memory sets of the existing and imported keys instead of
+    a table lookup per row, and bookings against the availability index and each
+    other. If every row is valid, all the rows are written in a single batch, one
+    journal append (or one rewrite) per file. Otherwise nothing is written.
+    """
+
+    def __init__(self):
+        snapshot = get_snapshot()
+        self.keys = {PERSON_PATH: set(snapshot.person['ID']),
+                     CARS_PATH: set(snapshot.cars['Serial']),
+                     RENT_PATH: set(snapshot.rent['ID'])}
+        self.objects = {PERSON_PATH: [], CARS_PATH: [], RENT_PATH: []}
+        self.result = ImportResult()
+
+    def _check_new(self, file_path, key):
+        assert str(key) not in self.keys[file_path], f"ID {key} already exists in {file_path}"
+
+    def _check_exists(self, file_path, key):
+        assert str(key) in self.keys[file_path], f"ID {key} does not exist in {file_path}"
+
+    def _validate(self, file_path, chunk, build):
+        # Build every row of a batch into an entity, keeping the valid ones
+        for line, row in chunk:
+            try:
+                obj = build(row)
+            except (AssertionError, ValueError, KeyError, TypeError) as e:
+                self.result.errors.append((file_path, line, str(e) or type(e).__name__))
+                continue
+            self.keys[file_path].add(str(obj.get_id()))
+            self.objects[file_path].append((line, obj))
+
+    def _person(self, row):
+        self._check_new(PERSON_PATH, row['ID'])
+        return Person(row['ID'], row['First Name'], row['Last Name'], row['Age'], row['Email'], row['Phone'])
+
+    def _car(self, row):
+        self._check_new(CARS_PATH, row['Serial'])
+        self._check_exists(PERSON_PATH, row['Owner'])
+        return Car(row['Serial'], row['Brand'], row['Model'], row['Year'], row['Engine'], row['Day Cost'],
+                   row['KM'], Ref(PERSON_PATH, row['Owner'], Person.from_row))
+
+    def _rent(self, row):
+        # Orders without an ID get one from the rent ID sequence
+        if row.get('ID'):
+            self._check_new(RENT_PATH, row['ID'])
+        self._check_exists(PERSON_PATH, row['Client'])
+        self._check_exists(CARS_PATH, row['Car'])
+        return Rent(row['Pickup Time'], row['Return Time'], Ref(PERSON_PATH, row['Client'], Person.from_row),
+                    Ref(CARS_PATH, row['Car'], Car.from_row, key_attr='serial'), id_=row.get('ID') or None)
+
+    def add_persons(self, rows):
+        """
+        Validate persons for the import.
+
+        Parameters:
+            rows (iterable): (line, row) pairs, each row a dict keyed by PERSON_FIELDNAMES.
+        """
+        for chunk in batches(rows):
+            self._validate(PERSON_PATH, chunk, self._person)
+
+    def add_cars(self, rows):
+        """
+        Validate cars for the import. Their owners must exist or be added first.
+
+        Parameters:
+            rows (iterable): (line, row) pairs, each row a dict keyed by CARS_FIELDNAMES.
+        """
+        for chunk in batches(rows):
+            self._validate(CARS_PATH, chunk, self._car)
+
+    def add_orders(self, rows):
+        """
+        Validate rental orders for the import. Their clients and cars must exist or be added first.
+
+        Parameters:
+            rows (iterable): (line, row) pairs, each row a dict keyed by RENT_FIELDNAMES.
+        """
+        for chunk in batches(rows):
+            self._validate(RENT_PATH, chunk, self._rent)
+
+    def commit(self):
+        """
+        Write every validated row in one batch, unless some row was rejected.
+
+        Returns:
+            ImportResult: The number of rows written per file and the rejected rows.
+        """
+        orders = self.objects[RENT_PATH]
+        # Orders already passed the check against the stored bookings, this checks them against each other
+        bookings = [(order.car.serial, order.pickup_time, order.return_time) for _, order in orders]
+        for i in sorted(find_overlaps(bookings)):
+            self.result.errors.append((RENT_PATH, orders[i][0], "Chosen vehicle is already taken within the "
+                                                                "desired time frame"))
+
+        if self.result.errors:
+            return self.result
+
+        with batch():
+            # The engine keeps the revenue rollup and the availability index in step with the rows
+            engine = get_engine()
+            for file_path in (PERSON_PATH, CARS_PATH, RENT_PATH):
+                engine.put_many(ENTITY_OF_PATH[file_path], [obj.obj_to_dict() for _, obj in self.objects[file_path]])
+                self.result.counts[file_path] = len(self.objects[file_path])
+
+            # Imported IDs must never be handed out again to new orders
+            if orders:
+                RENT_IDS.advance(max(int(order.id) for _, order in orders) + 1)
+
+        self.objects = {PERSON_PATH: [], CARS_PATH: [], RENT_PATH: []}
+        return self.result
+
+
+def import_files(persons=None, cars=None, orders=None):
+    """
+    Import persons, cars and rental orders from CSV files in one batch.
+
+    Parameters:
+        persons (str, optional): Path of a file of persons.
+        cars (str, optional): Path of a file of cars.
+        orders (str, optional): Path of a file of rental orders.
+
+    Returns:
+        ImportResult: The number of rows written per file and the rejected rows.
+    """
+    importer = Importer()
+    if persons:
+        importer.add_persons(read_rows(persons))
+    if cars:
+        importer.add_cars(read_rows(cars))
+    if orders:
+        importer.add_orders(read_rows(orders))
+    return importer.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import persons, cars and rental orders from CSV files.")
+    parser.add_argument('--persons', help="CSV file with the header " + ','.join(PERSON_FIELDNAMES))
+    parser.add_argument('--cars', help="CSV file with the header " + ','.join(CARS_FIELDNAMES))
+    parser.add_argument('--orders', help="CSV file with the header " + ','.join(RENT_FIELDNAMES))
+    args = parser.parse_args()
+
+    result = import_files(args.persons, args.cars, args.orders)
+    for file_path, line, message in result.errors:
+        print(f"{file_path} line {line}: {message}")
+    if result.ok:
+        print(f"{result.counts[PERSON_PATH]} persons, {result.counts[CARS_PATH]} cars and "
+              f"{result.counts[RENT_PATH]} orders imported")
+    else:
+        print(f"{len(result.errors)} rows rejected, nothing was imported")
@@ -0,0 +1,137 @@
+import errno
+import os
+import time
+from contextlib import contextmanager
+from config import LOCK_TIMEOUT
+
+# Cross-process file locks. Windows locks a byte of the lock file with msvcrt,
+# other platforms lock the whole file with fcntl. msvcrt has no shared locks, so
+# on Windows a shared lock is exclusive too.
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+    import fcntl
+
+
+def _acquire(fd, shared):
+    if msvcrt:
+        # msvcrt locks from the current position, always the first byte here. LK_NBLCK fails at once
+        # while another process holds the byte, so it is retried with a growing delay up to LOCK_TIMEOUT
+        os.lseek(fd, 0, os.SEEK_SET)
+        deadline, delay = time.monotonic() + LOCK_TIMEOUT, 0.001
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                return
+            except OSError as e:
+                if e.errno not in (errno.EDEADLOCK, errno.EACCES):
+                    raise
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"File lock not acquired within {LOCK_TIMEOUT} seconds") from e
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+    else:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+
+def _release(fd):
+    if msvcrt:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """
+    Hold a lock on a file for the duration of a with block, waiting for other
+    processes that hold it. Any number of processes can hold a shared lock at once,
+    while an exclusive lock is held by one process and keeps out shared ones.
+
+    The lock file is created if needed and never removed. It should be a file of
+    its own, not the data file it protects, since data files may be replaced
+    while the lock is held.
+
+    Parameters:
+        path (str): Path of the lock file.
+        shared (bool): If True, take a shared (reader) lock instead of an exclusive (writer) one.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT)
+    try:
+        _acquire(fd, shared)
+        try:
+            yield
+        finally:
+            _release(fd)
+    finally:
+        os.close(fd)
+
+
+class FileLock:
+    """
+    A lock file kept open between locks, for locks taken on every call, which also
+    holds a counter, e.g. the version of the data it protects.
+
+    Like file_lock(), but without opening and closing the file every time. The
+    lock is not re-entrant, and threads sharing the object must take turns.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters:
+            path (str): Path of the lock file.
+        """
+        self.path = path
+        self._fd = None
+        self._pid = None
+
+    def _open(self):
+        # A forked process opens the file again, since flock() treats a shared descriptor as one holder
+        if self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+            self._pid = os.getpid()
+        return self._fd
+
+    @contextmanager
+    def hold(self, shared=False):
+        """
+        Hold the lock for the duration of a with block, see file_lock().
+
+        Parameters:
+            shared (bool): If True, take a shared (reader) lock instead of an exclusive (writer) one.
+        """
+        fd = self._open()
+        _acquire(fd, shared)
+        try:
+            yield
+        finally:
+            _release(fd)
+
+    def read_counter(self):
+        """
+        Return the counter held in the lock file. Call it while holding the lock.
+
+        Returns:
+            int: The counter, 0 for a new lock file.
+        """
+        fd = self._open()
+        os.lseek(fd, 0, os.SEEK_SET)
+        try:
+            return int(os.read(fd, 32) or 0)
+        except ValueError:
+            return 0
+
+    def increment_counter(self):
+        """
+        Add one to the counter held in the lock file. Call it while holding the lock exclusively.
+
+        Returns:
+            int: The new counter.
+        """
+        counter = self.read_counter() + 1
+        # The counter only grows, so its new digits always cover the old ones
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, str(counter).encode())
+        return counter
@@ -5,6 +5,9 @@ from rent import Rent
 from filehandler import FileHandler
 from helpers import *
 from config import *
+from tablestore import compact_all
+from earnings import get_engine
+import profiling
 
 
 def main_menu():
@@ -14,7 +17,7 @@ def main_menu():
        Returns:
            str: The user's choice of action.
        """
-    possible_actions = ['1', '2', '3', '4', '5', '6', '7', '0']
+    possible_actions = ['1', '2', '3', '4', '5', '6', '7', '8', '9', '0']
     print('\n*** Carbnb **\n'
           '[1] Add a client\n'
           '[2] Edit/Delete a client\n'
@@ -23,6 +26,8 @@ def main_menu():
           '[5] Create a new order\n'
           '[6] Edit/Delete an order\n'
           '[7] Calculate earnings\n'
+          '[8] Find available cars\n'
+          '[9] Show performance statistics\n'
           '[0] Exit')
     action1 = input('-->')
 
@@ -276,10 +281,8 @@ def get_car(id_num):
     # Attempting to retrieve car details from the file system
     try:
         car_d = get_by_id(id_num, CARS_PATH)
-        # Creating a car object from the retrieved details
-        car = Car(serial=car_d['Serial'], brand=car_d['Brand'], model=car_d['Model'],
-                  year=car_d['Year'], engine=car_d['Engine'], day_cost=car_d['Day Cost'],
-                  km=car_d['KM'], owner=car_d['Owner'])
+        # Creating a car object from the retrieved details. Its owner is only built if it is used
+        car = Car.from_row(car_d)
         car.show()
         return car
     except TypeError as e:
@@ -542,14 +545,14 @@ def edit_order(order_d):
                 pickup_year = input("Enter new Pickup Time:\nYear (YYYY): ")
                 pickup_month = input("Month (MM): ")
                 pickup_day = input('Day (DD): ')
-                order_d['Pickup Time'] = f"{pickup_year}-{pickup_month}-{pickup_day}"
+                order_d['Pickup Time'] = f"{pickup_year}-{pickup_month}-{pickup_day} 00:00:00"
             case '2':
                 # Editing return time
                 return_year = input("Enter pickup time: \n"
                                     "Year (YYYY): ")
                 return_month = input("Month (MM): ")
                 return_day = input("Day (DD): ")
-                order_d['Return Time'] = f"{return_year}-{return_month}-{return_day}"
+                order_d['Return Time'] = f"{return_year}-{return_month}-{return_day} 00:00:00"
             case '3':
                 # Editing client ID
                 order_d['Client'] = input('Enter new Client ID')
@@ -663,19 +666,17 @@ def save_order(order_d: dict, new_order=False):
     # Attempting to create a Rent object with the provided details
     while res is None:
         try:
-            # Validating and creating a new Rent object
-            Rent(pickup_time=order_d['Pickup Time'], return_time=order_d['Return Time'],
-                 client=order_d['Client'], car=order_d['Car'])
+            # Validating and creating the Rent object. An edited order keeps its ID
+            o = Rent(pickup_time=order_d['Pickup Time'], return_time=order_d['Return Time'],
+                     client=order_d['Client'], car=order_d['Car'], id_=None if new_order else order_d['ID'])
         except AssertionError as e:
             print(e)
             order_menu()
         else:
             if new_order:
                 # Handling new order creation
-                o = Rent(pickup_time=order_d['Pickup Time'], return_time=order_d['Return Time'],
-                         client=order_d['Client'], car=order_d['Car'])
                 res = o
-                FileHandler.save(self=o)
+                FileHandler.save(self=o, new=True)
             elif res is None:
                 # Updating an existing order
                 FileHandler.save(object_d=order_d)
@@ -715,6 +716,48 @@ def add_order():
     menu_navigator()
 
 
+# CAR SEARCH
+
+
+def find_cars():
+    """
+    Prompts the user for a rental period and optional filters, and lists all the cars
+    available for the whole period.
+    """
+    print("Please enter the rental period:")
+    pickup_year = input("Enter pickup time: \n"
+                        "Year (YYYY): ")
+    pickup_month = input("Month (MM): ")
+    pickup_day = input("Day (DD): ")
+
+    return_year = input("Enter return time: \n"
+                        "Year (YYYY): ")
+    return_month = input("Month (MM): ")
+    return_day = input("Day (DD): ")
+
+    # Optional filters, left empty to skip
+    brand = input("Brand (leave empty for any): ") or None
+    max_day_cost = input("Maximum day cost (leave empty for any): ") or None
+    min_year = input("Minimum year (leave empty for any): ") or None
+
+    try:
+        pickup_time = dt.strptime(f"{pickup_year}-{pickup_month}-{pickup_day} 00:00:00", '%Y-%m-%d %H:%M:%S')
+        return_time = dt.strptime(f"{return_year}-{return_month}-{return_day} 00:00:00", '%Y-%m-%d %H:%M:%S')
+        cars = find_available_cars(pickup_time, return_time, brand=brand, max_day_cost=max_day_cost,
+                                   min_year=min_year)
+    except ValueError as e:
+        print(e)
+        print("Dates and numbers must contain numbers only")
+    else:
+        # Printing the available cars
+        print(f"\n*** {len(cars)} available cars ***")
+        for car in cars:
+            print(f"{car['Serial']}: {car['Brand']} {car['Model']} ({car['Year']}), {car['Day Cost']} NIS per day")
+
+    # Returning to the main menu
+    menu_navigator()
+
+
 # EARNING CALCULATION
 
 
@@ -757,6 +800,7 @@ def get_date_range(year=False, date_range=False):
     return {'start': start_date, 'end': end_date}
 
 
+@profiling.profiled()
 def year_cal(date_d):
     """
     Calculates and prints the total earnings for a given calendar year.
@@ -764,24 +808,14 @@ def year_cal(date_d):
     Parameters:
         date_d (dict): Dictionary with 'start' and 'end' dates.
     """
-    orders = FileHandler.load(file_path=RENT_PATH)
-    cars = Car.load_from_csv()
-    res = 0
-
-    # Iterating through orders to calculate earnings
-    for order in orders:
-        car = [x for x in cars if x.id == int(order['Car'])][0]
-        pickup_date = dt.strptime(order['Pickup Time'], '%Y-%m-%d %H:%M:%S')
-        if date_d['start'] < pickup_date < date_d['end']:
-            # Calculating earnings for each order within the date range
-            return_date = dt.strptime(order['Return Time'], '%Y-%m-%d %H:%M:%S')
-            days = return_date - pickup_date
-            res += rent_cost_general(days, car)
+    # Summing the earnings of the orders picked up within the year
+    res = get_engine().total(date_d['start'], date_d['end'])
 
     # Printing the calculated yearly earnings
     print('\n', ('*' * 10), f"Yearly earnings for calendar year {date_d['start'].year} are {res} NIS", ('*' * 10))
 
 
+@profiling.profiled()
 def range_cal(date_d):
     """
     Calculates and prints the total earnings for a custom date range.
@@ -789,24 +823,13 @@ def range_cal(date_d):
     Parameters:
         date_d (dict): Dictionary with 'start' and 'end' dates.
     """
-    orders = FileHandler.load(file_path=RENT_PATH)
-    cars = Car.load_from_csv()
-    res = 0
+    # Summing the earnings of the orders picked up within the date range
+    res = get_engine().total(date_d['start'], date_d['end'])
 
     # Formatting start and end dates for display
     start_str = dt.strftime(date_d['start'], '%Y-%m-%d')
     end_str = dt.strftime(date_d['end'], '%Y-%m-%d')
 
-    # Iterating through orders to calculate earnings
-    for order in orders:
-        car = [x for x in cars if x.id == int(order['Car'])][0]
-        pickup_date = dt.strptime(order['Pickup Time'], '%Y-%m-%d %H:%M:%S')
-        if date_d['start'] < pickup_date < date_d['end']:
-            # Calculating earnings for each order within the date range
-            return_date = dt.strptime(order['Return Time'], '%Y-%m-%d %H:%M:%S')
-            days = return_date - pickup_date
-            res += rent_cost_general(days, car)
-
     # Printing the calculated earnings for the custom date range
     print('\n', ('*' * 10), f"Earnings between {start_str}-{end_str} are {res} NIS", ('*' * 10))
 
@@ -841,6 +864,23 @@ def yearly_earnings(year=False, date_range=False):
     menu_navigator()
 
 
+############################ PERFORMANCE STATISTICS ###########################################
+
+
+def show_stats():
+    """
+    Print the call counts, latencies and rows scanned recorded so far, and write them to PROFILE_PATH.
+    """
+    print(profiling.summary())
+
+    if profiling.is_enabled():
+        profiling.dump()
+        print(f"\nStatistics written to {PROFILE_PATH}")
+
+    # Returning to the main menu
+    menu_navigator()
+
+
 def menu_navigator():
     """
     This function navigates through different functionalities of the application based on user input.
@@ -864,7 +904,12 @@ def menu_navigator():
             order_menu()  # Opens the order management menu
         case '7':
             yearly_earnings()  # Calculates and displays yearly earnings
+        case '8':
+            find_cars()  # Lists the cars available for a rental period
+        case '9':
+            show_stats()  # Prints the timings recorded by the profiling module
         case '0':
+            compact_all()  # Folds the write journals back into the CSV files
             print('Goodbye!')  # Exits the application
             exit(0)
 
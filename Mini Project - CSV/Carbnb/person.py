@@ -4,6 +4,8 @@ import re
 
 
 class Person(FileHandler):
+    __slots__ = ('_id', '_f_name', '_l_name', '_age', '_email', '_phone', '_session')
+
     def __init__(self, id_, f_name, l_name, age, email, phone):
         """
            Initializes a new Person object.
@@ -149,6 +151,20 @@ class Person(FileHandler):
 
         self._phone = new_val
 
+    @classmethod
+    def from_row(cls, row):
+        """
+            Creates a Person object from a row of the person file, without validating it again.
+
+            Parameters:
+                row (dict): The row, keyed by the file's field names.
+
+            Returns:
+                Person: The person of the row.
+        """
+        return cls._from_values((row['ID'], row['First Name'], row['Last Name'], row['Age'],
+                                 row['Email'], row['Phone']))
+
     @classmethod
     def load_from_csv(cls):
         """
@@ -159,13 +175,4 @@ class Person(FileHandler):
         """
         reader = FileHandler.load(file_path=PERSON_PATH)
 
-        objects = []
-        for row in reader:
-            objects.append(cls(id_=row['ID'],
-                               f_name=row['First Name'],
-                               l_name=row['Last Name'],
-                               age=row['Age'],
-                               email=int(row['Email']),
-                               phone=int(row['Phone'])))
-
-        return objects
+        return [cls.from_row(row) for row in reader]
@@ -2,15 +2,17 @@ from abc import ABC
 from datetime import datetime
 from config import *
 from filehandler import FileHandler
-from helpers import get_by_id, is_available
+from helpers import is_available
+from sequence import RENT_IDS
 from car import Car
 from person import Person
+from identity import Ref
 
 
 class Rent(FileHandler, ABC):
-    __ID_COUNTER = 0 # Static variable to track the rental order ID
+    __slots__ = ('id', '_pickup_time', '_return_time', '_client', '_car', '_session')
 
-    def __init__(self, pickup_time, return_time, client, car):
+    def __init__(self, pickup_time, return_time, client, car, id_=None):
         """
               Initializes a new Rent object.
 
@@ -19,31 +21,14 @@ class Rent(FileHandler, ABC):
                   return_time (str): The return time for the rental.
                   client (int): The ID of the client renting the car.
                   car (int): The serial number of the car being rented.
+                  id_ (int, optional): The ID of an existing rental order. A new ID is allocated if omitted.
               """
-        Rent.get_id_counter()  # Retrieving the current ID counter value
-
-        self.id = Rent.__ID_COUNTER  # Setting the rental order ID
+        # Setting the rental order ID, allocated in memory from a reserved block of IDs
+        self.id = RENT_IDS.next_id() if id_ is None else int(id_)
+        self.car = car  # Set first, the return time setter checks the car's availability
         self.pickup_time = pickup_time
         self.return_time = return_time
         self.client = client
-        self.car = car
-
-        Rent.__ID_COUNTER += 1  # Incrementing the ID counter
-        Rent.save_id_counter()  # Saving the updated counter to file
-
-    # Static methods for managing the ID counter
-
-    @staticmethod
-    def get_id_counter():
-        # Code to retrieve the ID counter from file ...
-        with open(RENT_ID_COUNTER, 'r') as fh:
-            Rent.__ID_COUNTER = int(fh.read())
-
-    @staticmethod
-    def save_id_counter():
-        # Code to save the ID counter to file ...
-        with open(RENT_ID_COUNTER, 'w') as fh:
-            fh.write(str(Rent.__ID_COUNTER))
 
     # Methods for representing the object as a string or a dictionary
     def obj_to_str(self):
@@ -123,15 +108,15 @@ class Rent(FileHandler, ABC):
 
     @car.setter
     def car(self, new_val):
-        assert len(new_val) > 6 and not any(x.isalpha() for x in new_val), f"Invalid ID number. " \
-                                                                           f"Number cannot contain letters or be " \
-                                                                           f"under 6 characters"
-
-        row = get_by_id(new_val, CARS_PATH)
-        assert row is not None, f"This car Serial Number does not exists in our database"
+        # Only the car's serial number is kept. The Car is built through the identity map when it is used
+        if not isinstance(new_val, Ref):
+            assert len(new_val) > 6 and not any(x.isalpha() for x in new_val), f"Invalid ID number. " \
+                                                                               f"Number cannot contain letters or be " \
+                                                                               f"under 6 characters"
+            new_val = Ref(CARS_PATH, new_val, Car.from_row, key_attr='serial')
+            assert new_val.resolve() is not None, f"This car Serial Number does not exists in our database"
 
-        self._car = Car(row['Serial'], row['Brand'], row['Model'], row['Year'],
-                        row['Engine'], row['Day Cost'], row['KM'], row['Owner'])
+        self._car = new_val
 
     @property
     def client(self):
@@ -139,14 +124,15 @@ class Rent(FileHandler, ABC):
 
     @client.setter
     def client(self, new_val):
-        assert len(new_val) > 6 and not any(x.isalpha() for x in new_val), f"Invalid ID number. " \
-                                                                           f"Number cannot contain letters or be " \
-                                                                           f"under 6 characters"
-        row = get_by_id(new_val, PERSON_PATH)
-        assert row is not None, f"This client ID does not exists in our database"
+        # Only the client's ID is kept. The Person is built through the identity map when it is used
+        if not isinstance(new_val, Ref):
+            assert len(new_val) > 6 and not any(x.isalpha() for x in new_val), f"Invalid ID number. " \
+                                                                               f"Number cannot contain letters or be " \
+                                                                               f"under 6 characters"
+            new_val = Ref(PERSON_PATH, new_val, Person.from_row)
+            assert new_val.resolve() is not None, f"This client ID does not exists in our database"
 
-        self._client = Person(row['ID'], row['First Name'], row['Last Name'], row['Age'], row['Email'],
-                              row['Phone'])
+        self._client = new_val
 
     def rent_cost(self):
         """
@@ -158,6 +144,25 @@ class Rent(FileHandler, ABC):
         days = self._return_time - self._pickup_time
         return days.days * self.car.day_cost
 
+    @classmethod
+    def from_row(cls, row):
+        """
+            Creates a Rent object from a row of the rent file, without validating it again.
+            The car and client are referenced lazily, so no Car or Person is built for them.
+
+            Parameters:
+                row (dict): The row, keyed by the file's field names.
+
+            Returns:
+                Rent: The rental order of the row.
+        """
+        # fromisoformat parses the stored 'YYYY-MM-DD HH:MM:SS' far faster than strptime
+        return cls._from_values((int(row['ID']),
+                                 datetime.fromisoformat(row['Pickup Time']),
+                                 datetime.fromisoformat(row['Return Time']),
+                                 Ref(PERSON_PATH, row['Client'], Person.from_row),
+                                 Ref(CARS_PATH, row['Car'], Car.from_row, key_attr='serial')))
+
     @classmethod
     def load_from_csv(cls):
         """
@@ -168,11 +173,4 @@ class Rent(FileHandler, ABC):
             """
         reader = FileHandler.load(file_path=RENT_PATH)
 
-        objects = []
-        for row in reader:
-            objects.append(cls(pickup_time=row['Pickup Time'],
-                               return_time=row['Return Time'],
-                               client=int(row['Client']),
-                               car=int(row['Car'])))
-
-        return objects
+        return [cls.from_row(row) for row in reader]
@@ -0,0 +1,158 @@
+import os
+from datetime import datetime as dt
+from config import CARS_PATH, RENT_PATH, REVENUE_PATH
+from helpers import to_epoch
+from tablestore import get_table
+from profiling import profiled, scanned
+
+DAY = 86400  # Seconds in a day
+
+
+def _entry(order, car):
+    # The rollup key, day, car, owner and revenue of an order, or None if its car is gone.
+    # An order earns its whole rental days times the current day cost of its car.
+    if car is None:
+        return None
+
+    pickup = to_epoch(dt.fromisoformat(str(order['Pickup Time'])))
+    return_ = to_epoch(dt.fromisoformat(str(order['Return Time'])))
+    day = pickup // DAY
+    revenue = (return_ - pickup) // DAY * int(car['Day Cost'])
+    return f"{day}:{car['Serial']}:{car['Owner']}", day, car['Serial'], car['Owner'], revenue
+
+
+def _add(totals, entry, sign=1):
+    # Adds an order's revenue to rollup rows kept in a dictionary by key
+    key, day, car, owner, revenue = entry
+    row = totals.setdefault(key, {'Key': key, 'Day': day, 'Car': car, 'Owner': owner, 'Revenue': 0, 'Orders': 0})
+    row['Revenue'] = int(row['Revenue']) + sign * revenue
+    row['Orders'] = int(row['Orders']) + sign
+
+
+def rebuild():
+    """
+    Recompute the whole rollup from the rent and cars tables and rewrite its file.
+    """
+    cars = {car['Serial']: car for car in get_table(CARS_PATH).rows()}
+    totals = {}
+    for order in get_table(RENT_PATH).rows():
+        entry = _entry(order, cars.get(order['Car']))
+        if entry is not None:
+            _add(totals, entry)
+
+    get_table(REVENUE_PATH).replace_all(totals.values())
+
+
+def rollup_table():
+    """
+    Return the table of the daily revenue rollup, building it from the existing orders
+    the first time it is used.
+
+    Returns:
+        Table: The table of REVENUE_PATH.
+    """
+    if not os.path.exists(REVENUE_PATH):
+        rebuild()
+    return get_table(REVENUE_PATH)
+
+
+def replace_order(old, new):
+    """
+    Update the rollup for an order that is about to be saved, edited or deleted.
+    Must be called before the rent table is changed.
+
+    Parameters:
+        old (dict or None): The stored rent row of the order, or None for a new order.
+        new (dict or None): The rent row about to be stored, or None for a deletion.
+    """
+    table = rollup_table()
+    totals = {}
+    for order, sign in ((old, -1), (new, 1)):
+        entry = _entry(order, get_table(CARS_PATH).get(order['Car'])) if order is not None else None
+        if entry is None:
+            continue
+
+        # Start from the stored row of the order's day, car and owner
+        stored = table.get(entry[0])
+        if entry[0] not in totals and stored is not None:
+            totals[entry[0]] = stored
+        _add(totals, entry, sign)
+
+    for key, row in totals.items():
+        if row['Orders'] > 0:
+            table.put(row)
+        else:
+            table.remove(key)
+
+
+def record_orders(orders):
+    """
+    Add many new orders to the rollup at once, writing each rollup row they touch once.
+    Must be called after their cars are stored and before the orders themselves are.
+
+    Parameters:
+        orders (iterable): The rent rows about to be stored.
+    """
+    table, cars = rollup_table(), get_table(CARS_PATH)
+    totals = {}
+    for order in orders:
+        entry = _entry(order, cars.get(order['Car']))
+        if entry is None:
+            continue
+
+        stored = table.get(entry[0])
+        if entry[0] not in totals and stored is not None:
+            totals[entry[0]] = stored
+        _add(totals, entry)
+
+    for row in totals.values():
+        table.put(row)
+
+
+def refresh_car(serial):
+    """
+    Recompute the rollup rows of a car from its orders, e.g. after its day cost,
+    owner or serial number changed or it was deleted.
+
+    Parameters:
+        serial: Serial number of the car.
+    """
+    table = rollup_table()
+    for row in table.find('Car', serial):
+        table.remove(row['Key'])
+
+    car = get_table(CARS_PATH).get(serial)
+    totals = {}
+    for order in get_table(RENT_PATH).find('Car', serial) if car is not None else ():
+        _add(totals, _entry(order, car))
+
+    for row in totals.values():
+        table.put(row)
+
+
+@profiled()
+def total(start, end, owner=None):
+    """
+    Sum the revenue of the orders picked up between two dates, both days included.
+
+    Parameters:
+        start (datetime): The first day of the period.
+        end (datetime): The last day of the period.
+        owner (optional): Only count the cars of this owner.
+
+    Returns:
+        int: The total revenue of the period.
+    """
+    first, last = to_epoch(start) // DAY, to_epoch(end) // DAY
+    owner = str(owner) if owner is not None else None
+
+    # One pass over the rollup columns, read with a single refresh of the table
+    res = rows = 0
+    for day, row_owner, revenue in zip(*rollup_table().columns(['Day', 'Owner', 'Revenue'])):
+        if first <= int(day) <= last:
+            rows += 1
+            if owner is None or row_owner == owner:
+                res += int(revenue)
+
+    scanned(rows)
+    return res
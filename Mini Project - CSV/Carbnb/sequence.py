@@ -0,0 +1,87 @@
+import os
+import threading
+from config import RENT_ID_COUNTER, ID_BLOCK_SIZE
+from locks import file_lock
+
+
+class IdAllocator:
+    """
+    Hands out unique IDs from blocks reserved in a counter file.
+
+    The counter file holds the first ID no process has reserved yet. Reserving a
+    block moves it forward by the block size under a file lock, and the IDs of the
+    block are then handed out from memory without touching the disk. The counter is
+    written before any ID of a block is used, so a crash can only leave a gap in
+    the sequence, never hand out an ID twice.
+    """
+
+    def __init__(self, counter_path, block_size=ID_BLOCK_SIZE):
+        """
+        Parameters:
+            counter_path (str): Path of the counter file.
+            block_size (int): Number of IDs reserved at a time.
+        """
+        self.counter_path = counter_path
+        self.lock_path = counter_path + '.lock'
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0  # The first ID past the reserved block
+        self._lock = threading.Lock()
+
+    def _read_counter(self):
+        try:
+            with open(self.counter_path, 'r') as fh:
+                return int(fh.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_counter(self, value):
+        # Replace the counter file in one step, so a crash never leaves it half written
+        temp_path = self.counter_path + '.tmp'
+        with open(temp_path, 'w') as fh:
+            fh.write(str(value))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(temp_path, self.counter_path)
+
+    def _reserve(self):
+        with file_lock(self.lock_path):
+            start = self._read_counter()
+            self._write_counter(start + self.block_size)
+
+        self._next, self._end = start, start + self.block_size
+
+    def advance(self, start):
+        """
+        Move the sequence past IDs that were given out some other way, e.g. the IDs of
+        imported orders, so that they are never handed out again.
+
+        Parameters:
+            start (int): The first ID that may still be handed out.
+        """
+        with self._lock:
+            with file_lock(self.lock_path):
+                if self._read_counter() < start:
+                    self._write_counter(start)
+
+            # The rest of the reserved block is skipped up to the new start
+            self._next = max(self._next, min(start, self._end))
+
+    def next_id(self):
+        """
+        Return a new ID, reserving a new block first if the current one is used up.
+
+        Returns:
+            int: An ID that has not been handed out before, by this or any other process.
+        """
+        with self._lock:
+            if self._next >= self._end:
+                self._reserve()
+
+            new_id = self._next
+            self._next += 1
+            return new_id
+
+
+# The allocator of rental order IDs
+RENT_IDS = IdAllocator(RENT_ID_COUNTER)
@@ -0,0 +1,160 @@
+import copy
+import identity
+from config import *
+from filehandler import FileHandler
+from tablestore import get_table, batch
+from person import Person
+from car import Car
+from rent import Rent
+
+# The CSV file of every entity class a session can load
+ENTITY_PATHS = {Person: PERSON_PATH, Car: CARS_PATH, Rent: RENT_PATH}
+
+
+class Session:
+    """
+    A unit of work over the entity objects: one instance per row, with changes written at commit.
+
+    Within a session every row is represented by a single object, whether it is
+    loaded with get() or reached through a reference (a car's owner, an order's car
+    or client), so an edit made through one path is seen through all of them.
+    Setting a public attribute of a loaded object marks it dirty. commit() then
+    writes the new, changed and deleted objects in one batch, a single append to
+    each changed table's journal (or a single rewrite of each file when journaling
+    is off).
+
+    Example:
+        with Session() as session:
+            car = session.get(Car, 1234567)
+            car.day_cost = 300
+            car.owner.phone = '0501234567'
+        # Both changes are written when the block exits
+    """
+
+    def __init__(self):
+        self._objects = {}  # (file path, key) -> the session's object of a row
+        self._originals = {}  # id(object) -> a copy of the object as it was loaded
+        self._dirty = {}  # id(object) -> (object, names of the attributes set since the last commit)
+        self._new = []
+        self._deleted = []
+        self._outer = None
+
+    def __enter__(self):
+        # References resolved in the block go through this session
+        self._outer = identity.current_session()
+        identity._local.session = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        identity._local.session = self._outer
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def _attach(self, obj, key, file_path):
+        self._objects[(file_path, str(key))] = obj
+        original = copy.copy(obj)
+        original._session = None
+        self._originals[id(obj)] = original
+        obj._session = self
+
+    def load(self, file_path, key, build):
+        """
+        Return the session's object of a row, building it on first use.
+
+        Parameters:
+            file_path (str): Path of the CSV file holding the row.
+            key: The primary key of the row.
+            build (callable): Builds the object from the row, e.g. Car.from_row.
+
+        Returns:
+            The object of the row, or None if there is no row with that key.
+        """
+        obj = self._objects.get((file_path, str(key)))
+        if obj is None:
+            row = get_table(file_path).get(key)
+            if row is None:
+                return None
+            obj = build(row)
+            self._attach(obj, key, file_path)
+
+        return obj
+
+    def get(self, cls, key):
+        """
+        Return the session's instance of an entity.
+
+        Parameters:
+            cls (type): Person, Car or Rent.
+            key: The entity's ID (serial number for cars).
+
+        Returns:
+            The entity, or None if it does not exist.
+        """
+        return self.load(ENTITY_PATHS[cls], key, cls.from_row)
+
+    def add(self, obj):
+        """
+        Add a new entity to the session. It is saved at commit.
+        """
+        self._objects[(obj.get_file_path(), str(obj.get_id()))] = obj
+        self._new.append(obj)
+
+    def delete(self, obj):
+        """
+        Mark an entity of the session for deletion at commit.
+        """
+        self._objects.pop((obj.get_file_path(), str(obj.get_id())), None)
+        if obj in self._new:
+            self._new.remove(obj)
+        else:
+            self._deleted.append(obj)
+
+    def mark_dirty(self, obj, name):
+        """
+        Record that an attribute of an entity was set. Called by the entities themselves.
+        """
+        self._dirty.setdefault(id(obj), (obj, set()))[1].add(name)
+
+    def dirty_attributes(self, obj):
+        """
+        Returns:
+            set: Names of the attributes of an entity set since the last commit.
+        """
+        return set(self._dirty.get(id(obj), (None, ()))[1])
+
+    def commit(self):
+        """
+        Write every new, changed and deleted entity of the session in one batch.
+        """
+        with batch():
+            for obj in self._new:
+                FileHandler.save(obj, new=True)
+                self._attach(obj, obj.get_id(), obj.get_file_path())
+
+            for obj, _ in self._dirty.values():
+                original = self._originals.get(id(obj))
+                if original is None or obj.obj_to_dict() == original.obj_to_dict():
+                    continue
+
+                FileHandler.save(obj)
+                # A changed ID is saved as a new row, so the row under the old ID is deleted, as the menu's edits do
+                if str(obj.get_id()) != str(original.get_id()):
+                    self._objects.pop((obj.get_file_path(), str(original.get_id())), None)
+                    FileHandler.delete(original)
+                self._attach(obj, obj.get_id(), obj.get_file_path())
+
+            for obj in self._deleted:
+                FileHandler.delete(self._originals.get(id(obj), obj))
+
+        self._new, self._dirty, self._deleted = [], {}, []
+
+    def rollback(self):
+        """
+        Forget the session's pending changes and every object it loaded.
+        """
+        for obj in self._objects.values():
+            obj._session = None
+        self._objects, self._originals = {}, {}
+        self._new, self._dirty, self._deleted = [], {}, []
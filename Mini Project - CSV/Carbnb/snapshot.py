@@ -0,0 +1,154 @@
+from array import array
+from datetime import datetime as dt
+from config import *
+from helpers import to_epoch
+from tablestore import get_table
+
+# The type of every column of the snapshot tables. 'int' columns are held in 64-bit
+# integer arrays, 'time' columns too, as epoch seconds, and 'str' columns are dictionary encoded.
+COLUMN_TYPES = {
+    PERSON_PATH: {'ID': 'str', 'First Name': 'str', 'Last Name': 'str', 'Age': 'int', 'Email': 'str',
+                  'Phone': 'str'},
+    CARS_PATH: {'Serial': 'str', 'Brand': 'str', 'Model': 'str', 'Year': 'int', 'Engine': 'int',
+                'Day Cost': 'int', 'KM': 'int', 'Owner': 'str'},
+    RENT_PATH: {'ID': 'str', 'Pickup Time': 'time', 'Return Time': 'time', 'Client': 'str', 'Car': 'str'},
+}
+
+
+class StringColumn:
+    """
+    A dictionary-encoded column of strings.
+
+    Every distinct value is stored once, in `values`, and the column itself is an
+    array of integer codes indexing into it. Repeated values such as brands, owners
+    or the car of each order cost one integer per row.
+    """
+
+    def __init__(self, items):
+        """
+        Parameters:
+            items (iterable): The values of the column, in row order.
+        """
+        self.positions = {}  # value -> code
+        self.values = []  # code -> value
+        self.codes = array('q')
+
+        positions, values = self.positions, self.values
+        for item in items:
+            code = positions.get(item)
+            if code is None:
+                code = positions[item] = len(values)
+                values.append(item)
+            self.codes.append(code)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+    def __iter__(self):
+        values = self.values
+        return (values[code] for code in self.codes)
+
+    def code(self, value):
+        """
+        Return the code of a value, or -1 if the column does not hold it.
+        """
+        return self.positions.get(str(value), -1)
+
+
+class ColumnTable:
+    """
+    A read-only, column-oriented copy of one CSV table: one array per column.
+    """
+
+    def __init__(self, file_path):
+        """
+        Parameters:
+            file_path (str): Path of the CSV file, a key of COLUMN_TYPES.
+        """
+        self.file_path = file_path
+        self.columns = {}
+
+        types = COLUMN_TYPES[file_path]
+        table = get_table(file_path)
+        self.key = table.key
+        for name, items in zip(types, table.columns(types)):
+            if types[name] == 'str':
+                self.columns[name] = StringColumn(items)
+            elif types[name] == 'time':
+                # fromisoformat parses the stored 'YYYY-MM-DD HH:MM:SS' far faster than strptime
+                self.columns[name] = array('q', (to_epoch(dt.fromisoformat(item)) for item in items))
+            else:
+                self.columns[name] = array('q', map(int, items))
+
+        self._positions = None
+
+    def __len__(self):
+        return len(self.columns[self.key])
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def row(self, i):
+        """
+        Returns:
+            dict: The values of row i, keyed by column name.
+        """
+        return {column: values[i] for column, values in self.columns.items()}
+
+    def position(self, key):
+        """
+        Return the row number of a key, or -1 if the table has no row with that key.
+        """
+        if self._positions is None:
+            self._positions = {key: i for i, key in enumerate(self.columns[self.key])}
+        return self._positions.get(str(key), -1)
+
+
+class Snapshot:
+    """
+    A read-only, columnar copy of the cars, person and rent tables for reporting.
+
+    Attributes:
+        cars (ColumnTable): The cars table.
+        person (ColumnTable): The person table.
+        rent (ColumnTable): The rent table.
+    """
+
+    def __init__(self):
+        self.cars = ColumnTable(CARS_PATH)
+        self.person = ColumnTable(PERSON_PATH)
+        self.rent = ColumnTable(RENT_PATH)
+
+    def rent_car_positions(self):
+        """
+        Returns:
+            array: For every order, the row number of its car in the cars table, or -1 if the car is gone.
+        """
+        # Resolve each distinct car once, then map the order codes through the result
+        by_code = [self.cars.position(car) for car in self.rent['Car'].values]
+        return array('q', (by_code[code] for code in self.rent['Car'].codes))
+
+
+_cache = {'versions': None, 'snapshot': None}
+
+
+def get_snapshot():
+    """
+    Return a Snapshot of the current data, reusing the last one while none of its tables has changed.
+
+    Returns:
+        Snapshot: The snapshot of the current data.
+    """
+    tables = [get_table(file_path) for file_path in COLUMN_TYPES]
+    for table in tables:
+        table.refresh()
+
+    versions = tuple(table.version for table in tables)
+    if versions != _cache['versions']:
+        _cache['snapshot'] = Snapshot()
+        _cache['versions'] = versions
+
+    return _cache['snapshot']
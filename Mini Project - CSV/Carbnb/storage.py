@@ -0,0 +1,271 @@
+from abc import ABCMeta, abstractmethod
+from config import *
+from tablestore import get_table, batch
+from availability import INDEX
+import rollup
+
+# The CSV file and key field of every entity
+ENTITIES = {'person': (PERSON_PATH, 'ID'), 'cars': (CARS_PATH, 'Serial'), 'rent': (RENT_PATH, 'ID')}
+
+# The entity stored in each CSV file
+ENTITY_OF_PATH = {file_path: entity for entity, (file_path, _) in ENTITIES.items()}
+
+
+def _key_order(key):
+    """
+    Return the sort key of a row key: integer keys by their value, ahead of any other key.
+
+    Parameters:
+        key: The key, as stored or as given by the caller.
+
+    Returns:
+        tuple: A value that orders the keys.
+    """
+    key = str(key)
+    try:
+        return 0, int(key), ''
+    except ValueError:
+        return 1, 0, key
+
+
+def _in_range(key, start=None, end=None):
+    """
+    Check whether a key is within a range, comparing keys by _key_order.
+
+    Parameters:
+        key: The key to check.
+        start (optional): The smallest key included. Defaults to no lower bound.
+        end (optional): The first key past the range. Defaults to no upper bound.
+
+    Returns:
+        bool: True if the key is within the range.
+    """
+    order = _key_order(key)
+    return (start is None or order >= _key_order(start)) and (end is None or order < _key_order(end))
+
+
+class StorageEngine(metaclass=ABCMeta):
+    """
+    The interface every storage backend implements, so the entity classes and the menus
+    work the same whatever keeps their rows.
+
+    Rows are dictionaries keyed by the CSV field names, addressed by entity ('person',
+    'cars' or 'rent') and key (the 'ID' field, 'Serial' for cars). Keys are looked up as
+    strings, like every CSV value, and ordered as numbers when they are integers. The batch
+    methods are the primitives; the single-row ones are built on them.
+
+    Methods:
+        get_many: Rows of many keys.
+        put_many: Inserts or replaces many rows.
+        delete_many: Deletes the rows of many keys.
+        scan: Rows within a key range, in key order.
+        count: Number of rows of an entity.
+    """
+
+    @abstractmethod
+    def get_many(self, entity, keys):
+        """
+        Return the rows of many keys.
+
+        Parameters:
+            entity (str): 'person', 'cars' or 'rent'.
+            keys (iterable): The keys to look up.
+
+        Returns:
+            dict: A copy of the row of every key that exists, keyed by the key.
+        """
+
+    @abstractmethod
+    def put_many(self, entity, rows):
+        """
+        Insert many rows, replacing the stored rows with the same keys.
+        """
+
+    @abstractmethod
+    def delete_many(self, entity, keys):
+        """
+        Delete the rows of many keys. Keys that do not exist are ignored.
+        """
+
+    @abstractmethod
+    def keys(self, entity):
+        """
+        Return the keys of all the rows of an entity, in any order.
+        """
+
+    def scan(self, entity, start=None, end=None):
+        """
+        Iterate over the rows whose key is within a range, in key order.
+
+        Parameters:
+            entity (str): 'person', 'cars' or 'rent'.
+            start (optional): The smallest key included. Defaults to the first row.
+            end (optional): The first key past the range. Defaults to past the last row.
+
+        Yields:
+            dict: Copies of the rows, in the order they are stored when no range is given.
+        """
+        if start is None and end is None:
+            keys = self.keys(entity)
+        else:
+            keys = sorted((key for key in self.keys(entity) if _in_range(key, start, end)), key=_key_order)
+
+        # Rows are fetched a chunk at a time, so a scan never copies the whole entity at once
+        for i in range(0, len(keys), 500):
+            rows = self.get_many(entity, keys[i:i + 500])
+            for key in keys[i:i + 500]:
+                if key in rows:
+                    yield rows[key]
+
+    def count(self, entity):
+        """
+        Return the number of rows of an entity.
+        """
+        return len(self.keys(entity))
+
+    def get(self, entity, key):
+        """
+        Return a copy of the row of a key, or None if it does not exist.
+        """
+        return self.get_many(entity, [key]).get(str(key))
+
+    def put(self, entity, row):
+        """
+        Insert a row, replacing the stored row with the same key.
+        """
+        self.put_many(entity, [row])
+
+    def delete(self, entity, key):
+        """
+        Delete the row of a key, if it exists.
+        """
+        self.delete_many(entity, [key])
+
+
+class TableEngine(StorageEngine):
+    """
+    The CSV files, through the shared in-memory tables of the tablestore module.
+
+    Writes keep the daily revenue rollup and the availability index in step with the
+    rent and cars tables, and a batch of writes is persisted once per file.
+    """
+
+    def get_many(self, entity, keys):
+        table = get_table(ENTITIES[entity][0])
+        rows = {}
+        for key in keys:
+            row = table.get(key)
+            if row is not None:
+                rows[str(key)] = row
+        return rows
+
+    def put_many(self, entity, rows):
+        file_path, key = ENTITIES[entity]
+        table = get_table(file_path)
+        rows, new = list(rows), set()
+        with batch():
+            # Orders not stored yet are added to the rollup together, writing each rollup row they touch once
+            if file_path == RENT_PATH:
+                seen = set()
+                for i, row in enumerate(rows):
+                    if str(row[key]) not in seen and table.get(row[key]) is None:
+                        new.add(i)
+                    seen.add(str(row[key]))
+                rollup.record_orders(rows[i] for i in sorted(new))
+
+            for i, row in enumerate(rows):
+                # The rollup must see the stored order before it is replaced
+                if file_path == RENT_PATH and i not in new:
+                    rollup.replace_order(table.get(row[key]), row)
+
+                table.put(row)
+
+                if file_path == CARS_PATH:
+                    rollup.refresh_car(row[key])
+                if file_path == RENT_PATH:
+                    INDEX.put_row(row)
+
+    def delete_many(self, entity, keys):
+        file_path = ENTITIES[entity][0]
+        table = get_table(file_path)
+        with batch():
+            for key in keys:
+                if file_path == RENT_PATH:
+                    rollup.replace_order(table.get(key), None)
+
+                table.remove(key)
+
+                if file_path == CARS_PATH:
+                    rollup.refresh_car(key)
+                if file_path == RENT_PATH:
+                    INDEX.discard(key)
+
+    def keys(self, entity):
+        return get_table(ENTITIES[entity][0]).keys()
+
+    def scan(self, entity, start=None, end=None):
+        table, key = get_table(ENTITIES[entity][0]), ENTITIES[entity][1]
+        if start is None and end is None:
+            yield from table.scan()
+            return
+
+        # A single pass over the table, which is refreshed once, copying only the rows in range
+        rows = [row for row in table.scan() if _in_range(row[key], start, end)]
+        rows.sort(key=lambda row: _key_order(row[key]))
+        yield from rows
+
+
+class MemoryEngine(StorageEngine):
+    """
+    Rows kept in dictionaries only, for tests and for benchmarking the other engines against.
+
+    The availability index, revenue rollup, identity map and snapshots read the
+    tablestore directly, so they do not see the rows of this engine.
+    """
+
+    def __init__(self):
+        self._rows = {entity: {} for entity in ENTITIES}
+
+    def get_many(self, entity, keys):
+        rows = self._rows[entity]
+        return {str(key): dict(rows[str(key)]) for key in keys if str(key) in rows}
+
+    def put_many(self, entity, rows):
+        stored, key = self._rows[entity], ENTITIES[entity][1]
+        for row in rows:
+            row = {field: str(value) for field, value in row.items()}
+            stored[row[key]] = row
+
+    def delete_many(self, entity, keys):
+        stored = self._rows[entity]
+        for key in keys:
+            stored.pop(str(key), None)
+
+    def keys(self, entity):
+        return list(self._rows[entity])
+
+
+_engine = TableEngine()
+
+
+def get_engine():
+    """
+    Returns:
+        StorageEngine: The engine the entity classes store their rows in.
+    """
+    return _engine
+
+
+def set_engine(engine):
+    """
+    Make the entity classes store their rows in another engine.
+
+    Parameters:
+        engine (StorageEngine): The new engine.
+
+    Returns:
+        StorageEngine: The previous engine, so it can be put back.
+    """
+    global _engine
+    previous, _engine = _engine, engine
+    return previous
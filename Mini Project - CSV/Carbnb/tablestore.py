@@ -0,0 +1,591 @@
+import atexit
+import csv
+import os
+import threading
+from contextlib import contextmanager, ExitStack
+from config import *
+from locks import FileLock
+
+# Journal record types: an upsert carries the full row, a tombstone only the key
+UPSERT = 'U'
+TOMBSTONE = 'D'
+
+DURABILITY_LEVELS = ('off', 'normal', 'full')
+
+
+class Table:
+    """
+    In-memory copy of a single CSV table, kept coherent with the file on disk.
+
+    The file is parsed once and its rows are kept in a dictionary keyed by the
+    table's primary key column, so lookups by ID are O(1). Secondary indexes map
+    the values of selected columns (e.g. 'Owner', 'Client', 'Car') to the keys
+    of the rows holding them.
+
+    Every write goes through the table: the in-memory rows and indexes are
+    updated first and the change is then persisted. In journal mode the change
+    is appended to a journal file next to the CSV file, and the journal is
+    folded back into the CSV file by compact(). Otherwise the whole file is
+    rewritten. A rewrite goes to a temporary file that then replaces the CSV
+    file, so a crash leaves either the old file or the new one.
+
+    Several processes can share the files. Each table has a lock file: a read
+    checks whether the table changed on disk, and reloads it under a shared lock
+    if it did, and a write
+    reloads the changes of other processes and persists its own under an
+    exclusive lock, so no process writes over rows it has not seen. Every write
+    also increments the version number kept in the lock file. The table
+    reloads when that number or the modification stamps of its files change,
+    and otherwise answers from memory.
+
+    With a flush interval, the changes are held in memory and written together
+    once the interval has passed since the first of them (group commit), so a
+    burst of writes costs one append or one rewrite.
+    """
+
+    def __init__(self, file_path, key, fieldnames, indexed=(), journal=JOURNAL_MODE,
+                 flush_interval=WRITE_FLUSH_INTERVAL, durability=WRITE_DURABILITY):
+        """
+        Parameters:
+            file_path (str): Path of the CSV file backing the table.
+            key (str): Name of the primary key column.
+            fieldnames (list): Column names, used if the file has no header yet.
+            indexed (tuple): Columns to keep secondary indexes on.
+            journal (bool): If True, writes are appended to the table's journal file.
+            flush_interval (float): Seconds to hold changes before writing them, 0 to write them at once.
+            durability (str): 'off', 'normal' or 'full', see WRITE_DURABILITY.
+        """
+        assert durability in DURABILITY_LEVELS, f"Unknown durability level: {durability}"
+        self.file_path = file_path
+        self.journal_path = file_path + '.journal'
+        self.lock_path = file_path + '.lock'
+        self._file_lock = FileLock(self.lock_path)
+        self.key = key
+        self.fieldnames = fieldnames
+        self.indexed = indexed
+        self.journal = journal
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self._rows = {}
+        self._indexes = {}
+        self._journal_len = 0
+        self._base_len = 0
+        self._stamp = None
+        self._pending = None  # Records held back while the table is in a batch()
+        self._queued = []  # Records written, but held until the flush interval has passed
+        self._timer = None
+        self._lock = threading.RLock()
+        self._lock_mode = None  # 'shared' or 'exclusive' while the thread holding _lock holds the file lock
+        self.generation = 0  # Incremented every time the table is (re)loaded from disk
+        self.version = 0  # Incremented on every change to the in-memory rows, including reloads
+
+    @staticmethod
+    def _file_stamp(path):
+        # Modification time and size identify the version of a file on disk
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _disk_stamp(self):
+        # Called with the file lock held. The version number catches the changes that leave the
+        # modification time and size of the files as they were, the stamps the changes made by hand
+        return (self._file_lock.read_counter(), self._file_stamp(self.file_path),
+                self._file_stamp(self.journal_path))
+
+    @contextmanager
+    def _locked(self, exclusive=False):
+        # Hold the table's file lock, unless this thread already holds it (in a batch() or an outer call).
+        # Called with _lock held
+        if self._lock_mode is not None:
+            assert self._lock_mode == 'exclusive' or not exclusive, "A shared lock cannot be upgraded"
+            yield
+            return
+
+        with self._file_lock.hold(shared=not exclusive):
+            self._lock_mode = 'exclusive' if exclusive else 'shared'
+            try:
+                yield
+            finally:
+                self._lock_mode = None
+
+    def refresh(self):
+        """
+        Reload the table if its files changed since they were last read.
+        """
+        with self._lock:
+            # Most reads find the files as they were, which needs no file lock: a write of another process
+            # moves the stamp once it has touched a file, and a moved stamp is read again under the lock
+            if not self._queued and self._disk_stamp() == self._stamp:
+                return
+
+            with self._locked(exclusive=bool(self._queued)):
+                stamp = self._disk_stamp()
+                if stamp != self._stamp:
+                    # Held changes go into the journal first, so the reload replays them over the changes on disk
+                    if self._queued:
+                        records, self._queued = self._queued, []
+                        self._append(records)
+                    self._load()
+
+    def _load(self):
+        rows = {}
+        if self._file_stamp(self.file_path) is not None:
+            with open(file=self.file_path, mode='r', newline='') as fh:
+                reader = csv.DictReader(fh)
+                if reader.fieldnames:
+                    self.fieldnames = reader.fieldnames
+                for row in reader:
+                    rows[row[self.key]] = row
+
+        self._rows = rows
+        self._base_len = len(rows)
+        self._journal_len = self._replay_journal()
+        self._build_indexes()
+        self._stamp = self._disk_stamp()
+        self.generation += 1
+        self.version += 1
+
+    def _replay_journal(self):
+        # Apply the journal records on top of the rows read from the CSV file
+        count = 0
+        if self._file_stamp(self.journal_path) is None:
+            return count
+
+        with open(file=self.journal_path, mode='r', newline='') as fh:
+            for record in csv.reader(fh):
+                # A record cut short by a crash mid-append is ignored
+                if record and record[0] == UPSERT and len(record) == len(self.fieldnames) + 1:
+                    row = dict(zip(self.fieldnames, record[1:]))
+                    self._rows[row[self.key]] = row
+                elif record and record[0] == TOMBSTONE and len(record) == 2:
+                    self._rows.pop(record[1], None)
+                else:
+                    continue
+                count += 1
+
+        return count
+
+    def _build_indexes(self):
+        self._indexes = {column: {} for column in self.indexed}
+        for key, row in self._rows.items():
+            self._index_row(key, row)
+
+    def _index_row(self, key, row):
+        # Dictionaries are used as ordered sets so results keep the file order
+        for column, index in self._indexes.items():
+            index.setdefault(row[column], {})[key] = None
+
+    def _unindex_row(self, key, row):
+        for column, index in self._indexes.items():
+            keys = index.get(row[column])
+            if keys is not None:
+                keys.pop(key, None)
+                if not keys:
+                    del index[row[column]]
+
+    def _write(self):
+        # Replace the file in one step, so a crash never leaves it half written. The file then
+        # holds every change, so the journal and the held changes are dropped
+        temp_path = f"{self.file_path}.{os.getpid()}.tmp"
+        with open(file=temp_path, mode='w', newline='') as fh:
+            writer = csv.DictWriter(fh, fieldnames=self.fieldnames)
+            writer.writeheader()
+            writer.writerows(self._rows.values())
+            if self.durability != 'off':
+                fh.flush()
+                os.fsync(fh.fileno())
+        try:
+            os.replace(temp_path, self.file_path)
+        except OSError:
+            os.remove(temp_path)
+            raise
+
+        if self._file_stamp(self.journal_path) is not None:
+            os.remove(self.journal_path)
+        if self.durability == 'full':
+            _sync_dir(self.file_path)
+
+        self._file_lock.increment_counter()
+        self._queued = []
+        self._journal_len = 0
+        self._base_len = len(self._rows)
+        self._stamp = self._disk_stamp()
+
+    def _append(self, records):
+        # Replaying ignores a record cut short by a crash, so appends are only synced at 'full'
+        created = self._file_stamp(self.journal_path) is None
+        with open(file=self.journal_path, mode='a', newline='') as fh:
+            csv.writer(fh).writerows(records)
+            if self.durability == 'full':
+                fh.flush()
+                os.fsync(fh.fileno())
+        if created and self.durability == 'full':
+            _sync_dir(self.journal_path)
+        self._file_lock.increment_counter()
+        self._journal_len += len(records)
+
+    def _persist(self, record):
+        self.version += 1
+
+        # Inside a batch() the change is only written when the batch ends
+        if self._pending is not None:
+            self._pending.append(record)
+        else:
+            self._commit([record])
+
+    def _commit(self, records):
+        # Write the changes now, or hold them until the flush interval has passed
+        if self.flush_interval <= 0:
+            self._flush(records)
+            return
+
+        self._queued.extend(records)
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """
+        Write the changes held back by the flush interval.
+        """
+        with self._lock:
+            self._timer = None
+            if not self._queued:
+                return
+
+        with self._lock, self._locked(exclusive=True):
+            self.refresh()
+            records, self._queued = self._queued, []
+            if not records:
+                return
+
+            try:
+                self._flush(records)
+            except BaseException:
+                # Replaying a record twice is harmless, so they are all kept for the next flush
+                self._queued = records + self._queued
+                raise
+
+    def _flush(self, records):
+        # Append the changes to the journal, or rewrite the whole file when journaling is off
+        if self.journal:
+            self._append(records)
+        else:
+            self._write()
+
+        self._stamp = self._disk_stamp()
+
+        # Compacting only once the journal outgrows the CSV file keeps the rewrites geometric
+        if self.journal and self._journal_len >= max(JOURNAL_COMPACT_THRESHOLD, self._base_len):
+            self.compact()
+
+    def compact(self):
+        """
+        Fold the journal back into the CSV file and truncate it.
+        Replaying a journal is idempotent, so a crash between the two steps loses nothing.
+        """
+        with self._lock, self._locked(exclusive=True):
+            self.refresh()
+            if self._file_stamp(self.journal_path) is None and not self._queued:
+                return
+
+            self._write()
+
+    def rows(self):
+        """
+        Returns:
+            list of dict: Copies of all the rows in the table, in file order.
+        """
+        with self._lock:
+            self.refresh()
+            return [dict(row) for row in self._rows.values()]
+
+    def keys(self):
+        """
+        Returns:
+            list: The keys of all the rows in the table, in file order.
+        """
+        with self._lock:
+            self.refresh()
+            return list(self._rows)
+
+    def columns(self, names):
+        """
+        Read whole columns of the table without copying its rows.
+
+        Parameters:
+            names (iterable): The columns to read.
+
+        Returns:
+            list of list: The values of every named column, in file order.
+        """
+        with self._lock:
+            self.refresh()
+            rows = self._rows.values()
+            return [[row[name] for row in rows] for name in names]
+
+    def get(self, key):
+        """
+        Retrieve a single row by its primary key.
+
+        Parameters:
+            key: The key to look up. Compared as a string, like the CSV values.
+
+        Returns:
+            dict or None: A copy of the row, or None if the key does not exist.
+        """
+        with self._lock:
+            self.refresh()
+            row = self._rows.get(str(key))
+            return dict(row) if row is not None else None
+
+    def find(self, column, value):
+        """
+        Retrieve all rows whose indexed column holds a given value.
+
+        Parameters:
+            column (str): One of the table's indexed columns.
+            value: The value to look up. Compared as a string.
+
+        Returns:
+            list of dict: Copies of the matching rows.
+        """
+        with self._lock:
+            self.refresh()
+            keys = self._indexes[column].get(str(value), {})
+            return [dict(self._rows[key]) for key in keys]
+
+    def scan(self, column=None, value=None):
+        """
+        Iterate over the rows of the table, or over those whose indexed column holds a value,
+        copying one row at a time.
+
+        Only the keys are taken when the iteration starts. A row changed meanwhile is seen
+        as it is when it is reached, and a row removed meanwhile is skipped.
+
+        Parameters:
+            column (str, optional): One of the table's indexed columns.
+            value (optional): The value to look up. Compared as a string.
+
+        Yields:
+            dict: Copies of the rows, in file order.
+        """
+        with self._lock:
+            self.refresh()
+            keys = list(self._rows) if column is None else list(self._indexes[column].get(str(value), {}))
+
+        for key in keys:
+            with self._lock:
+                row = self._rows.get(key)
+                row = dict(row) if row is not None else None
+            if row is not None:
+                yield row
+
+    def put(self, row):
+        """
+        Insert a row, or replace the existing row with the same key, and persist the change.
+
+        Parameters:
+            row (dict): The row to store. Values are converted to strings.
+        """
+        with self._lock, self._locked(exclusive=True):
+            self.refresh()
+            self._persist(self._store(row))
+
+    def put_many(self, rows):
+        """
+        Insert or replace many rows, checking the file on disk and persisting the changes once.
+
+        Parameters:
+            rows (iterable): The rows to store. Values are converted to strings.
+        """
+        with self._lock, self._locked(exclusive=True):
+            self.refresh()
+            records = [self._store(row) for row in rows]
+            if not records:
+                return
+
+            self.version += 1
+            if self._pending is not None:
+                self._pending.extend(records)
+            else:
+                self._commit(records)
+
+    def _store(self, row):
+        # Puts a row in memory and returns its journal record
+        row = {field: str(row[field]) for field in self.fieldnames}
+        key = row[self.key]
+
+        old = self._rows.get(key)
+        if old is not None:
+            self._unindex_row(key, old)
+
+        self._rows[key] = row
+        self._index_row(key, row)
+        return [UPSERT] + [row[field] for field in self.fieldnames]
+
+    def remove(self, key):
+        """
+        Remove the row with the given key and persist the change.
+
+        Parameters:
+            key: The key of the row to remove.
+
+        Returns:
+            bool: True if a row was removed, False if the key does not exist.
+        """
+        with self._lock, self._locked(exclusive=True):
+            self.refresh()
+            key = str(key)
+            row = self._rows.pop(key, None)
+            if row is None:
+                return False
+
+            self._unindex_row(key, row)
+            self._persist([TOMBSTONE, key])
+            return True
+
+    def replace_all(self, rows):
+        """
+        Replace every row of the table and rewrite the CSV file, dropping its journal.
+
+        Parameters:
+            rows (iterable of dict): The new rows. Values are converted to strings.
+        """
+        with self._lock, self._locked(exclusive=True):
+            self._rows = {}
+            for row in rows:
+                row = {field: str(row[field]) for field in self.fieldnames}
+                self._rows[row[self.key]] = row
+
+            self._build_indexes()
+            self._write()
+            if self._pending is not None:
+                self._pending = []
+            self.version += 1
+
+
+def _sync_dir(path):
+    # A new or replaced file only survives a power loss once its folder is synced. Windows cannot open folders
+    if os.name == 'nt':
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# Primary key and secondary index columns for each of the system's tables
+TABLE_SPECS = {
+    CARS_PATH: ('Serial', CARS_FIELDNAMES, ('Owner',)),
+    PERSON_PATH: ('ID', PERSON_FIELDNAMES, ()),
+    RENT_PATH: ('ID', RENT_FIELDNAMES, ('Client', 'Car')),
+    REVENUE_PATH: ('Key', REVENUE_FIELDNAMES, ('Day', 'Car')),
+}
+
+_tables = {}
+
+
+def get_table(file_path):
+    """
+    Return the process-wide Table for a CSV file, creating it on first use.
+
+    Parameters:
+        file_path (str): Path of one of the system's CSV files.
+
+    Returns:
+        Table: The shared table object for that file.
+    """
+    table = _tables.get(file_path)
+    if table is None:
+        key, fieldnames, indexed = TABLE_SPECS[file_path]
+        table = Table(file_path, key, fieldnames, indexed)
+        _tables[file_path] = table
+
+    return table
+
+
+@contextmanager
+def batch():
+    """
+    Hold back the writes to all the system's tables until the end of a with block,
+    then write each changed table once: a single journal append, or a single rewrite
+    of the file when journaling is off, or held with the other changes of the flush
+    interval. The tables are locked for the whole block, their file locks included,
+    so other processes see all of the block's changes or none of them.
+
+    The in-memory rows change straight away, so reads inside the block see the
+    changes. Nested batches join the outermost one.
+    """
+    tables = [get_table(file_path) for file_path in TABLE_SPECS]
+    for table in tables:
+        table._lock.acquire()
+
+    # Always taken in the order of TABLE_SPECS, so two processes never wait on each other
+    file_locks = ExitStack()
+    try:
+        for table in tables:
+            file_locks.enter_context(table._locked(exclusive=True))
+    except BaseException:
+        file_locks.close()
+        for table in tables:
+            table._lock.release()
+        raise
+
+    started = [table for table in tables if table._pending is None]
+    for table in started:
+        table._pending = []
+
+    try:
+        yield
+    finally:
+        try:
+            for table in started:
+                records, table._pending = table._pending, None
+                if records:
+                    table._commit(records)
+        finally:
+            file_locks.close()
+            for table in tables:
+                table._lock.release()
+
+
+@atexit.register
+def flush_all():
+    """
+    Write the changes held back by the flush interval in all the tables.
+    """
+    for table in list(_tables.values()):
+        table.flush()
+
+
+def compact_all():
+    """
+    Fold the journals of all the system's tables back into their CSV files.
+    """
+    for file_path in TABLE_SPECS:
+        get_table(file_path).compact()
+
+
+def start_compactor(interval=60.0):
+    """
+    Start a daemon thread that compacts all the journals every `interval` seconds.
+
+    Parameters:
+        interval (float): Seconds to wait between compactions.
+
+    Returns:
+        threading.Event: Set it to stop the thread.
+    """
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            compact_all()
+
+    threading.Thread(target=run, name='carbnb-compactor', daemon=True).start()
+    return stop
@@ -1,9 +1,45 @@
 import unittest
+import multiprocessing
 from rent import Rent
 from car import Car
 from person import Person
+from helpers import get_by_id, get_cars
+from tablestore import get_table, Table
+from config import *
+from datetime import datetime
+import rollup
+import os
+import tempfile
+from sequence import IdAllocator
+from identity import Ref, IDENTITY
+from unittest.mock import patch, MagicMock
+from session import Session
+from snapshot import get_snapshot
+from helpers import to_epoch
+import earnings
+from array import array
+import importer
+import export
+import gzip
+import json
+import storage
+from synthetic import SyntheticData
+import profiling
+import logqueue
+from helpers import auto_log
+import audit
+import locks
+import errno
 
 
+
+def put_people(path, first_id, count):
+    # Run in a process of its own by test_file_locking
+    table = Table(path, 'ID', PERSON_FIELDNAMES, journal=False)
+    for i in range(first_id, first_id + count):
+        table.put({'ID': i, 'First Name': 'Test', 'Last Name': 'Testing', 'Age': 20,
+                   'Email': 'mashu@mashu.com', 'Phone': '0501234567'})
+
 class MyTestCase(unittest.TestCase):
 
     def test_person(self):
@@ -103,6 +139,483 @@ class MyTestCase(unittest.TestCase):
         c.delete()
         p.delete()
 
+    def test_table_store(self):
+        # save a client and a car, make sure the indexed lookups find them and forget them after delete
+        p = Person(id_=123456789, f_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        c = Car(serial=123456789, brand='Test', model='Testing', year=2023,
+                engine=1600, day_cost=600, km=2000, owner='123456789')
+        c.save()
+
+        self.assertEqual(get_by_id(123456789, PERSON_PATH)['Email'], 'mashu@mashu.com')
+        self.assertEqual([x['Serial'] for x in get_cars(p)], ['123456789'])
+
+        c.delete()
+        p.delete()
+        self.assertIsNone(get_by_id(123456789, CARS_PATH))
+        self.assertEqual(get_cars(p), [])
+
+    def test_journal_compaction(self):
+        # save a client, make sure it is journaled and not in the CSV file until compaction
+        p = Person(id_=987654321, f_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        table = get_table(PERSON_PATH)
+        table.compact()
+        p.save()
+
+        with open(PERSON_PATH) as fh:
+            self.assertNotIn('987654321', fh.read())
+        self.assertIsNotNone(p.check_id(), "Object found in journal")
+
+        table.compact()
+        with open(PERSON_PATH) as fh:
+            self.assertIn('987654321', fh.read())
+
+        p.delete()
+        table.compact()
+        self.assertIsNone(p.check_id())
+
+    def test_availability(self):
+        # book a car, make sure overlapping bookings fail and the freed period can be booked again
+        p = Person(id_=987654321, f_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        c = Car(serial=987654321, brand='Test', model='Testing', year=2023,
+                engine=1600, day_cost=600, km=2000, owner='987654321')
+        c.save()
+        r = Rent(pickup_time='2090-01-10 00:00:00', return_time='2090-01-20 00:00:00',
+                 client='987654321', car='987654321')
+        r.save()
+
+        for pickup, ret in [('2090-01-01 00:00:00', '2090-01-30 00:00:00'),
+                            ('2090-01-15 00:00:00', '2090-01-25 00:00:00'),
+                            ('2090-01-05 00:00:00', '2090-01-10 00:00:00')]:
+            with self.assertRaises(AssertionError):
+                Rent(pickup_time=pickup, return_time=ret, client='987654321', car='987654321')
+
+        r.delete()
+        r2 = Rent(pickup_time='2090-01-01 00:00:00', return_time='2090-01-30 00:00:00',
+                  client='987654321', car='987654321')
+
+        self.assertIsInstance(r2, Rent)
+        c.delete()
+        p.delete()
+
+    def test_revenue_rollup(self):
+        # make sure order and car writes keep the daily revenue rollup in step
+        year = (datetime(2091, 1, 1), datetime(2091, 12, 31))
+        p = Person(id_=987654321, f_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        c = Car(serial=987654321, brand='Test', model='Testing', year=2023,
+                engine=1600, day_cost=600, km=2000, owner='987654321')
+        c.save()
+        r = Rent(pickup_time='2091-01-10 00:00:00', return_time='2091-01-20 00:00:00',
+                 client='987654321', car='987654321')
+        r.save()
+        self.assertEqual(rollup.total(*year), 6000)
+        self.assertEqual(rollup.total(datetime(2091, 1, 10), datetime(2091, 1, 10), owner=987654321), 6000)
+
+        r.pickup_time = '2091-01-15 00:00:00'
+        r.save()
+        self.assertEqual(rollup.total(*year), 3000)
+        self.assertEqual(rollup.total(datetime(2091, 1, 10), datetime(2091, 1, 14)), 0)
+
+        c.day_cost = 100
+        c.save()
+        self.assertEqual(rollup.total(*year), 500)
+
+        r.delete()
+        self.assertEqual(rollup.total(*year), 0)
+        c.delete()
+        p.delete()
+
+    def test_id_allocator(self):
+        # two allocators sharing a counter file, as in two processes, never hand out the same ID
+        with tempfile.TemporaryDirectory() as folder:
+            counter = os.path.join(folder, 'id_counter.txt')
+            first, second = IdAllocator(counter, block_size=10), IdAllocator(counter, block_size=10)
+
+            ids = [allocator.next_id() for _ in range(15) for allocator in (first, second)]
+            self.assertEqual(len(set(ids)), len(ids))
+            with open(counter) as fh:
+                self.assertEqual(int(fh.read()), 40)
+
+    def test_lazy_references(self):
+        # loading cars builds no owners, and a shared owner is built once, on first use
+        p = Person(id_=987654321, f_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        for serial in (9876543, 9876544):
+            Car(serial=serial, brand='Test', model='Testing', year=2023,
+                engine=1600, day_cost=600, km=2000, owner='987654321').save()
+
+        IDENTITY.clear()
+        with patch.object(Person, 'from_row', wraps=Person.from_row) as build:
+            cars = [c for c in Car.load_from_csv() if c.owner.id == '987654321']
+            self.assertEqual(build.call_count, 0)
+
+            self.assertEqual(len(cars), 2)
+            self.assertIsInstance(cars[0].owner, Ref)
+            self.assertEqual(cars[0].owner.l_name, 'Testing')
+            self.assertIs(cars[0].owner.resolve(), cars[1].owner.resolve())
+            self.assertEqual(build.call_count, 1)
+
+        for c in cars:
+            c.delete()
+        p.delete()
+
+    def test_session(self):
+        # one instance per row within a session, and the edits are written at commit
+        p = Person(id_=987654321, f_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        Car(serial=9876543, brand='Test', model='Testing', year=2023,
+            engine=1600, day_cost=600, km=2000, owner='987654321').save()
+
+        with Session() as session:
+            car = session.get(Car, 9876543)
+            owner = session.get(Person, 987654321)
+            self.assertIs(car.owner.resolve(), owner)
+
+            car.day_cost = 300
+            car.owner.l_name = 'Edited'
+            self.assertEqual(owner.l_name, 'Edited')
+            self.assertEqual(session.dirty_attributes(car), {'day_cost'})
+            self.assertEqual(get_by_id(9876543, CARS_PATH)['Day Cost'], '600')
+
+        self.assertEqual(get_by_id(9876543, CARS_PATH)['Day Cost'], '300')
+        self.assertEqual(get_by_id(987654321, PERSON_PATH)['Last Name'], 'Edited')
+
+        with Session() as session:
+            session.delete(session.get(Car, 9876543))
+        self.assertIsNone(get_by_id(9876543, CARS_PATH))
+        p.delete()
+
+    def test_from_row(self):
+        # stored rows are rebuilt into slotted objects without running the setters
+        row = {'ID': '987654321', 'First Name': 'Test', 'Last Name': 'Testing', 'Age': '20',
+               'Email': 'mashu@mashu.com', 'Phone': '0501234567'}
+        p = Person.from_row(row)
+        self.assertEqual(p.obj_to_dict(), row)
+        self.assertFalse(hasattr(p, '__dict__'))
+
+        r = Rent.from_row({'ID': '98765', 'Pickup Time': '2090-01-01 00:00:00', 'Return Time': '2090-01-11 00:00:00',
+                           'Client': '987654321', 'Car': '9876543'})
+        self.assertEqual(r.pickup_time, datetime(2090, 1, 1))
+        self.assertEqual(r.obj_to_dict()['Car'], '9876543')
+
+    def test_snapshot(self):
+        # the snapshot holds one array per column, with repeated strings stored once
+        p = Person(id_=987654321, f_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        cars = [Car(serial=serial, brand='Test', model='Testing', year=2023,
+                    engine=1600, day_cost=600, km=2000, owner='987654321') for serial in (9876543, 9876544)]
+        for c in cars:
+            c.save()
+        r = Rent(pickup_time='2091-01-10 00:00:00', return_time='2091-01-20 00:00:00',
+                 client='987654321', car='9876543')
+        r.save()
+
+        snapshot = get_snapshot()
+        self.assertIs(get_snapshot(), snapshot)
+        first, second = snapshot.cars.position(9876543), snapshot.cars.position(9876544)
+        self.assertEqual(snapshot.cars['Day Cost'][first], 600)
+        self.assertEqual(snapshot.cars['Owner'].codes[first], snapshot.cars['Owner'].codes[second])
+        self.assertEqual(snapshot.cars.row(second)['Brand'], 'Test')
+        order = snapshot.rent.position(r.id)
+        self.assertEqual(snapshot.rent['Pickup Time'][order], to_epoch(datetime(2091, 1, 10)))
+        self.assertEqual(snapshot.rent_car_positions()[order], first)
+        self.assertEqual(earnings.get_engine().total(datetime(2091, 1, 1), datetime(2091, 12, 31)), 6000)
+
+        r.delete()
+        self.assertIsNot(get_snapshot(), snapshot)
+        for c in cars:
+            c.delete()
+        p.delete()
+
+    def test_earnings(self):
+        # an order counts whole in the period it is picked up in, and the period's ends are left out unless inclusive
+        start, end = datetime(2091, 1, 1), datetime(2091, 2, 1)
+        pickups = array('q', (to_epoch(time) for time in (datetime(2090, 12, 25), start, datetime(2091, 1, 10),
+                                                          datetime(2091, 1, 15), datetime(2091, 1, 28), end)))
+        returns = array('q', (pickup + 10 * 86400 for pickup in pickups))
+        engine = earnings.EarningsEngine(pickups, returns, array('q', [0, 0, 1, -1, 0, 0]), array('q', [100, 300]))
+
+        self.assertEqual(engine.total(start, end), 4000)
+        self.assertEqual(engine.total(start, end, inclusive=True), 6000)
+        self.assertEqual(engine.total(datetime(2090, 12, 1), start), 1000)
+        self.assertEqual(engine.total(end, start), 0)
+
+    def test_import(self):
+        # a bulk import writes every file in one go, or nothing if a row is rejected
+        files = {'persons': 'ID,First Name,Last Name,Age,Email,Phone\n'
+                            '987654321,Test,Testing,20,mashu@mashu.com,0501234567\n',
+                 'cars': 'Serial,Brand,Model,Year,Engine,Day Cost,KM,Owner\n'
+                         '9876543,Test,Testing,2023,1600,600,2000,987654321\n'
+                         '9876544,Test,Testing,2023,1600,600,2000,987654321\n',
+                 'orders': 'ID,Pickup Time,Return Time,Client,Car\n'
+                           '98765,2091-01-10 00:00:00,2091-01-20 00:00:00,987654321,9876543\n'
+                           '98766,2091-01-15 00:00:00,2091-01-25 00:00:00,987654321,9876543\n'}
+        with tempfile.TemporaryDirectory() as folder:
+            paths = {}
+            for name, text in files.items():
+                paths[name] = os.path.join(folder, name + '.csv')
+                with open(paths[name], 'w') as fh:
+                    fh.write(text)
+
+            result = importer.import_files(**paths)
+            self.assertEqual([(e[0], e[1]) for e in result.errors], [(RENT_PATH, 3)])
+            self.assertIsNone(get_by_id(9876543, CARS_PATH))
+
+            with open(paths['orders'], 'w') as fh:
+                fh.write(files['orders'].replace('98766,2091-01-15 00:00:00,2091-01-25', '98766,2091-01-25 00:00:00,2091-01-30'))
+            result = importer.import_files(**paths)
+            self.assertTrue(result.ok)
+            self.assertEqual(list(result.counts.values()), [1, 2, 2])
+
+        self.assertEqual(rollup.total(datetime(2091, 1, 1), datetime(2091, 12, 31)), 9000)
+        self.assertEqual(len(get_table(RENT_PATH).find('Car', 9876543)), 2)
+
+        # new orders get IDs past the imported ones, and a new order never overwrites a stored one
+        r = Rent(pickup_time='2091-02-10 00:00:00', return_time='2091-02-20 00:00:00',
+                 client='987654321', car='9876544')
+        self.assertGreater(r.id, 98766)
+        r.id = 98765
+        self.assertRaises(AssertionError, r.save, new=True)
+        self.assertEqual(get_by_id(98765, RENT_PATH)['Car'], '9876543')
+
+        for order in get_table(RENT_PATH).find('Client', 987654321):
+            Rent.from_row(order).delete()
+        for serial in (9876543, 9876544):
+            Car.from_row(get_by_id(serial, CARS_PATH)).delete()
+        Person.from_row(get_by_id(987654321, PERSON_PATH)).delete()
+
+        # the rows are written through the storage engine in use
+        engine = storage.MemoryEngine()
+        previous = storage.set_engine(engine)
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                path = os.path.join(folder, 'persons.csv')
+                with open(path, 'w') as fh:
+                    fh.write(files['persons'])
+                self.assertTrue(importer.import_files(persons=path).ok)
+            self.assertEqual(engine.get('person', 987654321)['Last Name'], 'Testing')
+            self.assertIsNone(get_table(PERSON_PATH).get(987654321))
+        finally:
+            storage.set_engine(previous)
+
+    def test_export(self):
+        # exports stream the filtered rows to CSV or gzipped JSON Lines
+        p = Person(id_=987654321, f_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        c = Car(serial=9876543, brand='Test', model='Testing', year=2023,
+                engine=1600, day_cost=600, km=2000, owner='987654321')
+        c.save()
+        orders = [Rent(pickup_time=f'2091-01-{day} 10:00:00', return_time=f'2091-01-{day + 2} 10:00:00',
+                       client='987654321', car='9876543') for day in (10, 20)]
+        for r in orders:
+            r.save()
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'rent.csv')
+            self.assertEqual(export.export('rent', path, owner=987654321, end=datetime(2091, 1, 10)), 1)
+            with open(path) as fh:
+                self.assertEqual(fh.read().splitlines(),
+                                 ['ID,Pickup Time,Return Time,Client,Car',
+                                  f'{orders[0].id},2091-01-10 10:00:00,2091-01-12 10:00:00,987654321,9876543'])
+
+            path = os.path.join(folder, 'revenue.jsonl.gz')
+            self.assertEqual(export.export('revenue', path, fmt='jsonl', car=9876543), 2)
+            with gzip.open(path, 'rt') as fh:
+                rows = sorted(json.loads(line)['Day'] for line in fh)
+            self.assertEqual(rows, ['2091-01-10', '2091-01-20'])
+            self.assertEqual(export.export('cars', path, fmt='jsonl', owner=987654321), 1)
+
+        for r in orders:
+            r.delete()
+        c.delete()
+        p.delete()
+
+
+    def test_storage_engines(self):
+        # the entity classes work the same on every engine, batch operations included
+        for engine in (storage.TableEngine(), storage.MemoryEngine()):
+            previous = storage.set_engine(engine)
+            try:
+                p = Person(id_=987654321, f_name='Test', l_name='Testing', age=20, email='mashu@mashu.com',
+                           phone='0501234567')
+                p.save()
+                self.assertEqual(p.check_id()['Last Name'], 'Testing')
+
+                engine.put_many('person', [{'ID': 987654322 + i, 'First Name': 'Test', 'Last Name': 'Testing',
+                                            'Age': 20, 'Email': 'mashu@mashu.com', 'Phone': '0501234567'}
+                                           for i in range(3)])
+                keys = [row['ID'] for row in engine.scan('person', 987654321, 987654324)]
+                self.assertEqual(keys, ['987654321', '987654322', '987654323'])
+                # integer keys are ordered by value, not as strings
+                engine.put_many('person', [{'ID': key, 'First Name': 'Test', 'Last Name': 'Testing', 'Age': 20,
+                                            'Email': 'mashu@mashu.com', 'Phone': '0501234567'} for key in (100, 99)])
+                self.assertEqual([row['ID'] for row in engine.scan('person', 99, 101)], ['99', '100'])
+                keys = [row['ID'] for row in engine.scan('person')]
+                self.assertLess(keys.index('100'), keys.index('99'))
+                engine.delete_many('person', [100, 99])
+                self.assertEqual(sorted(engine.get_many('person', [987654322, 987654324, 1])), ['987654322', '987654324'])
+
+                engine.delete_many('person', [987654322 + i for i in range(3)])
+                p.delete()
+                self.assertIsNone(p.check_id())
+            finally:
+                storage.set_engine(previous)
+
+    def test_synthetic_data(self):
+        # the same seed gives the same rows, and no car is booked twice at the same time
+        data = SyntheticData(2000, seed=7)
+        self.assertEqual((data.person_count, data.car_count, data.order_count), (200, 200, 1600))
+        self.assertEqual(list(data.persons()), list(SyntheticData(2000, seed=7).persons()))
+        self.assertNotEqual(list(data.cars()), list(SyntheticData(2000, seed=8).cars()))
+
+        orders = list(data.orders())
+        self.assertEqual(len({order[0] for order in orders}), 1600)
+        self.assertEqual(importer.find_overlaps([(car, pickup, ret) for _, pickup, ret, _, car in orders]), set())
+        self.assertEqual(data.end, max(order[2] for order in orders))
+
+    def test_profiling(self):
+        # timed calls are counted with the rows they read while profiling is on, and not at all while it is off
+        p = Person(id_=987654321, f_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        profiling.reset()
+        profiling.enable()
+        try:
+            p.check_id()
+            rollup.total(datetime(2091, 1, 1), datetime(2091, 12, 31))
+            stats = profiling.stats()
+            self.assertEqual(stats['filehandler.FileHandler.check_id']['calls'], 1)
+            self.assertEqual(stats['filehandler.FileHandler.check_id']['rows'], 1)
+            self.assertEqual(sum(stats['rollup.total']['histogram'].values()), 1)
+
+            with tempfile.TemporaryDirectory() as folder:
+                path = os.path.join(folder, 'profile.json')
+                profiling.dump(path)
+                with open(path) as fh:
+                    self.assertEqual(json.load(fh)['operations']['rollup.total']['calls'], 1)
+
+            profiling.enable(False)
+            p.check_id()
+            self.assertEqual(profiling.stats()['filehandler.FileHandler.check_id']['calls'], 1)
+        finally:
+            profiling.enable(False)
+            profiling.reset()
+            p.delete()
+
+    def test_log_queue(self):
+        # records are written by the background writer as JSON lines, all of them once it is stopped
+        logqueue.shutdown_logging()
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'carbnb.log')
+            logqueue.setup_logging(path)
+            try:
+                for object_id in range(250):
+                    auto_log('Client added', object_id=object_id)
+                auto_log('Car deleted', object_id=9876543)
+            finally:
+                logqueue.shutdown_logging()
+
+            self.assertEqual([entry['object_id'] for entry in logqueue.read_log(path, 'Client added')], list(range(250)))
+            self.assertEqual(list(logqueue.read_log(path, 'Car deleted'))[0]['message'], 'Car deleted: ID: 9876543')
+
+    def test_audit_index(self):
+        # the records of the log are found by object, event and time, and only new lines are read again
+        with tempfile.TemporaryDirectory() as folder:
+            log = os.path.join(folder, 'carbnb.log')
+            with open(log, 'w') as fh:
+                fh.write('INFO:2024-01-31 10:00:00,123:Car edited: ID: 1234567\n')
+                fh.write('not a record\n')
+                fh.write(json.dumps({'time': '2024-02-10T09:30:00.000', 'level': 'INFO',
+                                     'message': 'Car edited: ID: 1234567', 'event': 'Car edited',
+                                     'object_id': 1234567}) + '\n')
+                fh.write(json.dumps({'time': '2024-02-11T12:00:00.000', 'level': 'INFO',
+                                     'message': 'Client added: ID: 123456789', 'event': 'Client added',
+                                     'object_id': 123456789}) + '\n')
+                fh.write('INFO:2024-02-12 08:00:00,000:Car del')
+
+            index = audit.AuditIndex(log, os.path.join(folder, 'audit.db'))
+            try:
+                self.assertEqual(index.update(), 3)
+                self.assertEqual(index.update(), 0)
+                self.assertEqual([record['time'] for record in index.query(1234567)],
+                                 ['2024-01-31 10:00:00.123', '2024-02-10 09:30:00.000'])
+                self.assertEqual(len(index.query(1234567, datetime(2024, 2, 1), datetime(2024, 3, 1))), 1)
+                self.assertEqual(index.query(event='Client added')[0]['message'], 'Client added: ID: 123456789')
+
+                # the half written line is read once it is complete, and the rotated log before the new one
+                with open(log, 'a') as fh:
+                    fh.write('eted: ID: 1234567\n')
+                os.rename(log, log + '.1')
+                with open(log, 'w') as fh:
+                    fh.write('INFO:2024-02-13 08:00:00,000:Car added: ID: 7654321\n')
+                self.assertEqual(index.latest(1234567)['event'], 'Car deleted')
+                self.assertEqual(index.latest(7654321)['time'], '2024-02-13 08:00:00.000')
+                self.assertEqual(len(index.query()), 5)
+            finally:
+                index.close()
+
+    def test_group_commit(self):
+        # changes are held until the flush interval ends, and a failed rewrite leaves the old file whole
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'person.csv')
+            table = Table(path, 'ID', PERSON_FIELDNAMES, flush_interval=60, durability='full')
+            for i in range(100):
+                table.put({'ID': i, 'First Name': 'Test', 'Last Name': 'Testing', 'Age': 20,
+                           'Email': 'mashu@mashu.com', 'Phone': '0501234567'})
+            self.assertFalse(os.path.exists(table.journal_path))
+            self.assertEqual(table.get(99)['First Name'], 'Test')
+
+            table.flush()
+            self.assertEqual(len(Table(path, 'ID', PERSON_FIELDNAMES).rows()), 100)
+
+            table.compact()
+            with patch('tablestore.os.replace', side_effect=OSError):
+                table.remove(0)
+                self.assertRaises(OSError, table.compact)
+            with open(path) as fh:
+                self.assertIn('\n0,Test', fh.read())
+            self.assertFalse([name for name in os.listdir(folder) if name.endswith('.tmp')])
+
+            table.flush()
+            self.assertEqual(len(Table(path, 'ID', PERSON_FIELDNAMES).rows()), 99)
+
+    def test_file_locking(self):
+        # processes rewriting the same file lose no rows, and a table sees another one's writes
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'person.csv')
+            workers = [multiprocessing.Process(target=put_people, args=(path, 100 * k, 50)) for k in range(4)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+            table = Table(path, 'ID', PERSON_FIELDNAMES, journal=False)
+            self.assertEqual(len(table.rows()), 200)
+            generation = table.generation
+            self.assertEqual(len(table.rows()), 200)
+            self.assertEqual(table.generation, generation)
+
+            put_people(path, 1000, 1)
+            self.assertEqual(table.get(1000)['First Name'], 'Test')
+            self.assertEqual(table.generation, generation + 1)
+            with open(table.lock_path) as fh:
+                self.assertEqual(fh.read(), '201')
+
+            # a read of an unchanged table takes no file lock
+            with patch('locks._acquire') as acquire:
+                table.get(1000)
+            acquire.assert_not_called()
+
+        # on Windows a lock held elsewhere is retried until LOCK_TIMEOUT, any other error is raised at once
+        msvcrt = MagicMock()
+        msvcrt.locking.side_effect = OSError(errno.EBADF, 'Bad file descriptor')
+        with patch('locks.msvcrt', msvcrt), patch('locks.os.lseek'):
+            self.assertRaises(OSError, locks._acquire, 0, False)
+            self.assertEqual(msvcrt.locking.call_count, 1)
+            msvcrt.locking.side_effect = OSError(errno.EACCES, 'Permission denied')
+            with patch('locks.LOCK_TIMEOUT', 0.05):
+                self.assertRaises(TimeoutError, locks._acquire, 0, False)
 
 if __name__ == '__main__':
     unittest.main()
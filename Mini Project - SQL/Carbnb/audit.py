@@ -0,0 +1,249 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+from config import LOGGER, AUDIT_INDEX
+
+# The audit index: the auto_log records of the log file, parsed into a table indexed by
+# object ID and time. It is kept in its own database, so indexing a large log never
+# holds the write lock of the application database.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit (
+    time TEXT NOT NULL,
+    event TEXT NOT NULL,
+    object_id TEXT NOT NULL,
+    level TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS progress (
+    log TEXT PRIMARY KEY,
+    head TEXT NOT NULL,
+    offset INTEGER NOT NULL
+);
+"""
+INDEXES = {'audit_object_time': "CREATE INDEX IF NOT EXISTS audit_object_time ON audit (object_id, time)",
+           'audit_time': "CREATE INDEX IF NOT EXISTS audit_time ON audit (time)"}
+
+# The index can always be built again from the log, so it trades durability on power loss for speed
+PRAGMAS = ('PRAGMA journal_mode = WAL', 'PRAGMA synchronous = NORMAL', 'PRAGMA cache_size = -65536')
+
+COLUMNS = ('time', 'event', 'object_id', 'level')
+
+# Number of records inserted per transaction while a log file is read
+BATCH_SIZE = 5000
+
+# A record of the text log format: 'INFO:2024-01-31 10:00:00,123:Car edited: ID: 1234567'
+TEXT_RECORD = re.compile(r'(\w+):(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),(\d{3}):(.*): ID: (.*)')
+
+
+def parse(line):
+    """
+    Parses an auto_log record of the log file, in the JSON or the text format.
+
+    Args:
+        line (str): A line of the log file.
+
+    Returns:
+        tuple: (time, event, object ID, level), with the time as 'YYYY-MM-DD HH:MM:SS.mmm',
+            or None if the line is not an auto_log record.
+    """
+    line = line.rstrip('\r\n')
+    if line.startswith('{'):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(entry, dict) or 'event' not in entry:
+            return None
+        return entry['time'].replace('T', ' '), entry['event'], str(entry['object_id']), entry['level']
+
+    match = TEXT_RECORD.fullmatch(line)
+    if match is None:
+        return None
+    level, time, millis, event, object_id = match.groups()
+    return f"{time}.{millis}", event, object_id, level
+
+
+def _head(path):
+    # The first complete line of a file, which tells one generation of a rotated log from another
+    try:
+        with open(path, 'rb') as fh:
+            line = fh.readline()
+    except FileNotFoundError:
+        return None
+    return line.decode('utf-8', 'replace') if line.endswith(b'\n') else None
+
+
+def _time(value):
+    # Datetimes are compared with the stored times as text, in the same format
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')[:23] if isinstance(value, datetime) else value
+
+
+class AuditIndex:
+    """
+    Answers who did what to which object, and when, from an index of the log file.
+
+    update() reads only what was appended to the log since the last update, from the
+    byte offset it stopped at. When the log has been rotated, the rest of the rotated
+    file is read first, then any newer rotated files, then the new log file. A rotated
+    file is recognised by its first line.
+    """
+
+    def __init__(self, log=LOGGER, index=AUDIT_INDEX):
+        """
+        Args:
+            log (str, optional): The log file. Defaults to LOGGER.
+            index (str, optional): The index database. Defaults to AUDIT_INDEX.
+        """
+        self.log = log
+        self.conn = sqlite3.connect(index, isolation_level=None)
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+        self.conn.executescript(SCHEMA)
+        for sql in INDEXES.values():
+            self.conn.execute(sql)
+
+    def close(self):
+        """
+        Closes the index database.
+        """
+        self.conn.close()
+
+    def _pending(self):
+        # The files to read, oldest first, with the offset to start each from
+        progress = self.conn.execute("SELECT head, offset FROM progress WHERE log = ?", (self.log,)).fetchone()
+        current = _head(self.log)
+        if progress is not None and progress[0] == current:
+            return [(self.log, progress[1])]
+
+        rotated = sorted((path for path in glob.glob(glob.escape(self.log) + '.*') if _head(path) is not None),
+                         key=os.path.getmtime)
+        heads = [_head(path) for path in rotated]
+        if progress is None:
+            # The first update indexes the rotated files too
+            files = [(path, 0) for path in rotated]
+        elif progress[0] in heads:
+            i = heads.index(progress[0])
+            files = [(rotated[i], progress[1])] + [(path, 0) for path in rotated[i + 1:]]
+        else:
+            # The file the last update stopped in is gone, so only the current log is left to read
+            files = []
+
+        return files + ([(self.log, 0)] if current is not None else [])
+
+    def _read(self, path, offset):
+        # Indexes the complete lines of a file from an offset, saving the progress with every batch
+        head = _head(path)
+        added = 0
+        rows = []
+
+        def save():
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany("INSERT INTO audit (time, event, object_id, level) VALUES (?, ?, ?, ?)", rows)
+                self.conn.execute("INSERT OR REPLACE INTO progress (log, head, offset) VALUES (?, ?, ?)",
+                                  (self.log, head, offset))
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+        with open(path, 'rb') as fh:
+            fh.seek(offset)
+            for line in fh:
+                # A line without its newline is still being written, and is read by the next update
+                if not line.endswith(b'\n'):
+                    break
+                offset += len(line)
+                record = parse(line.decode('utf-8', 'replace'))
+                if record is not None:
+                    rows.append(record)
+                if len(rows) >= BATCH_SIZE:
+                    save()
+                    added += len(rows)
+                    rows = []
+
+        save()
+        return added + len(rows)
+
+    def update(self):
+        """
+        Indexes the records logged since the last update.
+
+        Returns:
+            int: The number of records added to the index.
+        """
+        # Into an empty index, the records are loaded first and indexed once, rather than one by one
+        bulk = self.conn.execute("SELECT 1 FROM audit LIMIT 1").fetchone() is None
+        if bulk:
+            for name in INDEXES:
+                self.conn.execute(f"DROP INDEX IF EXISTS {name}")
+        try:
+            return sum(self._read(path, offset) for path, offset in self._pending())
+        finally:
+            if bulk:
+                for sql in INDEXES.values():
+                    self.conn.execute(sql)
+
+    def query(self, object_id=None, start=None, end=None, event=None, limit=None, newest_first=False, refresh=True):
+        """
+        Finds the records of an object, a period or an event.
+
+        Args:
+            object_id (optional): Only the records of this object ID.
+            start (datetime, optional): Only records logged at or after this time.
+            end (datetime, optional): Only records logged before this time.
+            event (str, optional): Only records of this event, e.g. 'Car edited'.
+            limit (int, optional): At most this many records.
+            newest_first (bool, optional): Return the newest records first. Defaults to oldest first.
+            refresh (bool, optional): Index the newly logged records first. Defaults to True.
+
+        Returns:
+            list of dict: The records, keyed by COLUMNS and 'message', the message auto_log logged.
+        """
+        if refresh:
+            self.update()
+
+        conditions, params = [], []
+        for condition, value in (("object_id = ?", object_id), ("time >= ?", _time(start)),
+                                 ("time < ?", _time(end)), ("event = ?", event)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(str(value))
+
+        sql = f"SELECT {', '.join(COLUMNS)} FROM audit"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY time DESC, rowid DESC" if newest_first else " ORDER BY time, rowid"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        records = [dict(zip(COLUMNS, row)) for row in self.conn.execute(sql, params)]
+        for record in records:
+            record['message'] = f"{record['event']}: ID: {record['object_id']}"
+        return records
+
+    def latest(self, object_id, event=None):
+        """
+        Returns the newest record of an object, e.g. its last edit, or None if it has none.
+        """
+        records = self.query(object_id, event=event, limit=1, newest_first=True)
+        return records[0] if records else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Query the audit index of the log file.")
+    parser.add_argument('--object', help="Object ID")
+    parser.add_argument('--event', help="e.g. 'Car edited'")
+    parser.add_argument('--start', type=datetime.fromisoformat, help="From this time, YYYY-MM-DD[ HH:MM:SS]")
+    parser.add_argument('--end', type=datetime.fromisoformat, help="Before this time, YYYY-MM-DD[ HH:MM:SS]")
+    parser.add_argument('--limit', type=int)
+    args = parser.parse_args()
+
+    audit = AuditIndex()
+    for record in audit.query(args.object, args.start, args.end, args.event, args.limit):
+        print(f"{record['time']} {record['level']} {record['message']}")
+    audit.close()
@@ -0,0 +1,34 @@
+from database import get_connection
+from profiling import scanned
+
+# The latest two bookings of a car picked up by the end of a period, newest first. The
+# rent(car, pickup, return, id) index covers the query, so it is one seek into the index
+LATEST_BOOKINGS = "SELECT id, return FROM rent WHERE car = ? AND pickup <= ? ORDER BY pickup DESC LIMIT 2"
+
+
+def is_free(car, start, end, ignore_id=None):
+    """
+    Checks whether a car has no booking overlapping a period, in O(log n).
+
+    Bookings of a car never overlap (every new one is checked against the existing
+    ones, and touching end points count as a conflict), so sorting them by pickup
+    time also sorts them by return time. Of the bookings picked up by the end of the
+    period, only the latest can reach into it, or the one before it when the latest
+    is the order being left out.
+
+    Args:
+        car: The ID of the car.
+        start (int): The pickup time, in epoch seconds.
+        end (int): The return time, in epoch seconds.
+        ignore_id (optional): ID of an order to leave out, e.g. the order being edited.
+
+    Returns:
+        bool: True if the car is free for the whole period.
+    """
+    ignore_id = str(ignore_id) if ignore_id is not None else None
+    rows = get_connection().execute(LATEST_BOOKINGS, (str(car), end)).fetchall()
+    scanned(len(rows))
+    for rent_id, return_ in rows:
+        if str(rent_id) != ignore_id:
+            return return_ < start
+    return True
@@ -0,0 +1,213 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+import config
+
+# The benchmark never touches the configured database. It runs on a database with the same
+# schema in CARBNB_BENCH_FOLDER, kept and reused by later runs of the same size and seed,
+# or else in a temporary folder removed when the run ends. The paths are set before the
+# rest of the application is imported, since its modules read them on import.
+BENCH_FOLDER = os.environ.get('CARBNB_BENCH_FOLDER') or tempfile.mkdtemp(prefix='carbnb-bench-')
+SOURCE_DATABASE = config.DATABASE
+config.DATABASE = os.path.join(BENCH_FOLDER, 'carbnb.db')
+config.RENT_ID_COUNTER = os.path.join(BENCH_FOLDER, 'id_counter.txt')
+config.LOGGER = os.path.join(BENCH_FOLDER, 'carbnb.log')
+config.PROFILE_PATH = os.path.join(BENCH_FOLDER, 'profile.json')
+
+from config import DATABASE  # noqa: E402
+from database import get_connection, transaction, close_connections  # noqa: E402
+from helpers import get_by_id, is_available, to_epoch, from_epoch  # noqa: E402
+from importer import batches  # noqa: E402
+from storage import get_engine  # noqa: E402
+from synthetic import SyntheticData  # noqa: E402
+from rent import Rent  # noqa: E402
+import rollup  # noqa: E402
+import earnings  # noqa: E402
+import profiling  # noqa: E402
+
+# The dataset the benchmark database holds, so a kept folder is only loaded again for another size or seed
+STAMP_PATH = os.path.join(BENCH_FOLDER, 'dataset.json')
+
+
+def _create_database():
+    # An empty copy of the configured database, brought up to the latest schema on first connection
+    for path in (DATABASE, DATABASE + '-wal', DATABASE + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    source, target = sqlite3.connect(SOURCE_DATABASE), sqlite3.connect(DATABASE)
+    source.backup(target)
+    source.close()
+    tables = {row[0] for row in target.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table in ('rent', 'cars', 'person', 'revenue_daily'):
+        if table in tables:
+            target.execute(f"DELETE FROM {table}")
+    target.commit()
+    target.close()
+
+
+def load(data):
+    """
+    Fills the benchmark database with a synthetic dataset, unless it already holds it.
+
+    Args:
+        data (SyntheticData): The dataset.
+
+    Returns:
+        float: The seconds the load took, or None if the database already held the dataset.
+    """
+    dataset = {'rows': data.person_count + data.car_count + data.order_count, 'seed': data.seed}
+    try:
+        with open(STAMP_PATH) as fh:
+            if json.load(fh) == dataset:
+                return None
+    except (FileNotFoundError, ValueError):
+        pass
+
+    started = time.perf_counter()
+    close_connections()
+    _create_database()
+
+    engine = get_engine()
+    orders = ((str(i), to_epoch(pickup), to_epoch(ret), str(client), str(car))
+              for i, pickup, ret, client, car in data.orders())
+    cars = ((str(row[0]),) + row[1:7] + (str(row[7]),) for row in data.cars())
+    for entity, rows in (('person', data.persons()), ('cars', cars), ('rent', orders)):
+        for batch in batches(rows):
+            engine.put_many(entity, batch)
+
+    # The engine writes the tables only, the rollup and the ID sequence are brought in step once
+    rollup.rebuild()
+    with transaction() as conn:
+        conn.execute("UPDATE id_sequence SET next = MAX(next, ?) WHERE name = 'rent'", (data.order_count,))
+
+    with open(STAMP_PATH, 'w') as fh:
+        json.dump(dataset, fh)
+    return time.perf_counter() - started
+
+
+def measure(calls):
+    """
+    Times every call of an operation on its own.
+
+    Args:
+        calls (iterable): Callables taking no arguments.
+
+    Returns:
+        dict: The number of calls, and the total, mean, median, 95th percentile and
+            slowest time in seconds.
+    """
+    times = []
+    for call in calls:
+        started = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - started)
+
+    times.sort()
+    count = len(times)
+    total = sum(times)
+    return {'count': count, 'total': total, 'mean': total / count if count else 0.0,
+            'p50': times[count // 2] if count else 0.0, 'p95': times[int(count * 0.95)] if count else 0.0,
+            'max': times[-1] if count else 0.0}
+
+
+def run(rows, seed=0, ops=1000):
+    """
+    Loads a synthetic dataset and times the core operations on it.
+
+    menu.year_cal() and menu.range_cal() print earnings.get_engine().total(), and the menu module
+    starts the menu when imported, so 'year_cal' and 'range_cal' time that total over a
+    calendar year and over a range of up to 90 days.
+
+    Args:
+        rows (int): Size of the dataset, see SyntheticData.
+        seed (optional): Seed of the dataset and of the operations' arguments. Defaults to 0.
+        ops (int, optional): Number of timed calls per operation. Defaults to 1000.
+
+    Returns:
+        dict: The run's settings and environment, the load time and the timings of every operation,
+            and the profiling statistics if profiling is on.
+    """
+    data = SyntheticData(rows, seed)
+    load_seconds = load(data)
+    rng = random.Random(f"{seed}:benchmark")
+
+    first, last = get_connection().execute("SELECT MIN(pickup), MAX(return) FROM rent").fetchone()
+    first = from_epoch(first) if first is not None else data.start
+    last = from_epoch(last) if last is not None else data.start
+    span = max(1, (last - first).days)
+
+    def random_key():
+        table = rng.choice(('person', 'cars', 'rent') if data.order_count else ('person', 'cars'))
+        if table == 'person':
+            return data.person_id(rng.randrange(data.person_count)), table
+        if table == 'cars':
+            return str(data.car_id(rng.randrange(data.car_count))), table
+        return str(rng.randrange(data.order_count)), table
+
+    def random_period(max_days):
+        pickup = first + timedelta(days=rng.randrange(span), hours=rng.randrange(24))
+        return pickup, pickup + timedelta(days=rng.randint(1, max_days))
+
+    # New orders are booked after every generated one, each in its own stretch of 15 days
+    created = []
+
+    def create(k):
+        pickup = last + timedelta(days=1 + 15 * k)
+        ret = pickup + timedelta(days=rng.randint(1, 14))
+        order = Rent(pickup_time=str(pickup), return_time=str(ret),
+                     client=str(data.person_id(rng.randrange(data.person_count))),
+                     car=str(data.car_id(rng.randrange(data.car_count))))
+        order.save()
+        created.append(order)
+
+    operations = {
+        'get_by_id': measure(lambda key=random_key(): get_by_id(*key) for _ in range(ops)),
+        'is_available': measure(lambda car=str(data.car_id(rng.randrange(data.car_count))),
+                                period=random_period(14): is_available(car, *period) for _ in range(ops)),
+        'rent_create': measure(lambda k=k: create(k) for k in range(ops)),
+        'year_cal': measure(lambda year=rng.randint(first.year, last.year):
+                            earnings.get_engine().total(datetime(year, 1, 1), datetime(year, 12, 31))
+                            for _ in range(ops)),
+        'range_cal': measure(lambda period=random_period(90): earnings.get_engine().total(*period) for _ in range(ops)),
+        'delete': measure(lambda order=order: order.delete() for order in list(created)),
+    }
+
+    result = {'backend': 'sqlite', 'rows': rows, 'seed': seed, 'ops': ops,
+              'counts': {'person': data.person_count, 'cars': data.car_count, 'rent': data.order_count},
+              'load_seconds': load_seconds, 'started': datetime.now().isoformat(timespec='seconds'),
+              'python': platform.python_version(), 'platform': platform.platform(), 'operations': operations}
+    # With CARBNB_PROFILE=1, the inner timings of the run come with it
+    if profiling.is_enabled():
+        result['profile'] = profiling.stats()
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the core operations on a synthetic dataset.")
+    parser.add_argument('--rows', type=int, default=10000, help="Size of the dataset, e.g. 1000 to 10000000")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--ops', type=int, default=1000, help="Timed calls per operation")
+    parser.add_argument('--output', help="Append the results to this JSON Lines file")
+    args = parser.parse_args()
+
+    try:
+        result = run(args.rows, args.seed, args.ops)
+    finally:
+        close_connections()
+        if 'CARBNB_BENCH_FOLDER' not in os.environ:
+            profiling.enable(False)  # The statistics are in the result, not written to the removed folder
+            shutil.rmtree(BENCH_FOLDER, ignore_errors=True)
+
+    line = json.dumps(result)
+    if args.output:
+        with open(args.output, 'a') as fh:
+            fh.write(line + '\n')
+    print(line)
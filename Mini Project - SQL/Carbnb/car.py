@@ -1,7 +1,9 @@
 from config import CARS_FIELDNAMES
 from filehandler import FileHandler
-from helpers import get_by_id
 from person import Person
+from identity import Ref
+from database import transaction
+import rollup
 
 
 class Car(FileHandler):
@@ -23,6 +25,8 @@ class Car(FileHandler):
         owner (Person): The owner of the car.
     """
 
+    __slots__ = ('_id', '_brand', '_model', '_year', '_engine', '_day_cost', '_km', '_owner', '_session')
+
     def __init__(self, id_, brand, model, year, engine, day_cost, km, owner):
         """
         Initializes a new instance of the Car class.
@@ -60,15 +64,15 @@ class Car(FileHandler):
               f"KM: {self._km}\n"
               f"Owner ID: {self._owner.id}")
 
-    def obj_to_str(self):
+    def obj_to_tuple(self):
         """
-              Converts the car object's properties to a string suitable for database storage.
+              Converts the car object's properties to a tuple of values for database storage.
 
               Returns:
-                  str: A string representation of the car object's properties.
+                  tuple: The car object's properties, in the table's column order.
               """
-        return f"'{self._id}', '{self._brand}', '{self._model}', {self._year}, {self._engine}, " \
-               f"{self._day_cost}, '{self._km}', '{self._owner.id}'"
+        return self._id, self._brand, self._model, self._year, self._engine, \
+            self._day_cost, self._km, self._owner.id
 
     def get_table(self):
         """
@@ -192,12 +196,47 @@ class Car(FileHandler):
 
     @owner.setter
     def owner(self, new_value):
-        owner_data = get_by_id(new_value, table='person')[0]
-        assert new_value is not None, f"This owner ID does not exists in our database"
+        # Only the owner's ID is kept. The Person is built through the identity map when it is used
+        if not isinstance(new_value, Ref):
+            new_value = Ref('person', new_value, Person.from_row)
+            assert new_value.resolve() is not None, f"This owner ID does not exists in our database"
+
+        self._owner = new_value
+
+    # Orders earn the current day cost of their car, so changing or deleting a car
+    # recomputes its rows of the daily revenue rollup
+
+    def edit(self, changes: dict, object_id=None):
+        object_id = self.id if object_id is None else object_id
+        with transaction():
+            super().edit(changes, object_id)
+            if changes.keys() & {'id', 'day_cost', 'owner'}:
+                rollup.refresh_car(object_id)
+                rollup.refresh_car(self.id)
+
+        return True
+
+    def delete(self):
+        with transaction():
+            super().delete()
+            rollup.refresh_car(self.id)
 
-        self._owner = Person(owner_data[0], owner_data[1], owner_data[2], owner_data[3], owner_data[4],
-                             owner_data[5])
+    @classmethod
+    def from_row(cls, row):
+        """
+        Creates a Car object from a row of the cars table, without validating it again.
+        The owner is referenced lazily, so no query is made for it.
+
+        Args:
+            row (tuple): The row, in the table's column order.
+
+        Returns:
+            Car: The car of the row.
+        """
+        return cls._from_values((int(row[0]), row[1], row[2], row[3], row[4], row[5], row[6],
+                                 Ref('person', row[7], Person.from_row)))
 
+    @classmethod
     def load_from_db(cls):
         """
         Class method to load car data from the database and create Car objects.
@@ -207,16 +246,5 @@ class Car(FileHandler):
         """
         cars_data = cls.load(table='cars')
 
-        objects = []
-        for row in cars_data:
-            # Creates Car object for each row in the database and adds it to the list
-            objects.append(cls(id_=int(row[0]),
-                               brand=row[1],
-                               model=row[2],
-                               year=int(row[3]),
-                               engine=int(row[4]),
-                               day_cost=int(row[5]),
-                               km=int(row[6]),
-                               owner=int(row[7])))
-
-        return objects
+        # A single query: the owners are only loaded if they are used
+        return [cls.from_row(row) for row in cars_data]
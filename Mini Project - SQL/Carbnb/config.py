@@ -1,13 +1,22 @@
+import os
+
 # Absolute paths to various system files used in the Carbnb application.
 DATABASE = r'C:\Users\User\PycharmProjects\class2\Mini Project - SQL\Carbnb\System files\carbnb.db'
 # The path to the database file where all application data is stored.
 
 RENT_ID_COUNTER = r'C:\Users\User\PycharmProjects\class2\Mini Project - SQL\Carbnb\System files\id_counter.txt'
-# The path to a text file that keeps track of the current ID counter for rental transactions.
+# The path to a text file that kept the ID counter for rental transactions. It is only read once,
+# when the database is migrated to the id_sequence table.
 
 LOGGER = r'C:\Users\User\PycharmProjects\class2\Mini Project - SQL\Carbnb\System files\carbnb.log'
 # The path to the log file where the application logs its activities.
 
+PROFILE_PATH = r'C:\Users\User\PycharmProjects\class2\Mini Project - SQL\Carbnb\System files\profile.json'
+# The path to the file the profiling statistics are written to when the application exits.
+
+AUDIT_INDEX = r'C:\Users\User\PycharmProjects\class2\Mini Project - SQL\Carbnb\System files\audit.db'
+# The path to the audit index, a separate SQLite database of the records of the log file, see audit.py.
+
 # Field names used in various CSV files or database tables.
 RENT_FIELDNAMES = 'id, pickup, return, client,car'
 # Field names for the rental transactions table or file. It includes the rental ID, pickup date, return date, client ID, and car ID.
@@ -17,3 +26,53 @@ CARS_FIELDNAMES = 'id, brand, model, year, engine, day_cost, km, owner'
 
 PERSON_FIELDNAMES = 'id, pname, lname, age, email, phone'
 # Field names for the persons table or file. It includes person ID, first name, last name, age, email address, and phone number.
+
+DB_PRAGMAS = ['PRAGMA busy_timeout = 5000',
+              'PRAGMA temp_store = MEMORY',
+              'PRAGMA journal_mode = WAL',
+              'PRAGMA synchronous = NORMAL',
+              'PRAGMA cache_size = -20000',
+              'PRAGMA mmap_size = 268435456']
+# Pragmas applied once to every new database connection. busy_timeout makes a connection wait for
+# a lock held by another process instead of failing straight away. In WAL mode readers never wait for
+# the writer, nor the writer for readers, and with synchronous = NORMAL a commit is not synced to disk
+# on its own, only when the WAL is checkpointed: a power loss may undo the last commits, never corrupt
+# the database. cache_size is in KiB when negative (20 MB), mmap_size in bytes (256 MB).
+
+DB_STATEMENT_CACHE = 256
+# Number of compiled SQL statements each connection keeps for reuse.
+
+DB_WRITE_BATCH = 100
+# Maximum number of queued write jobs the writer thread of the database module commits in one transaction.
+
+ID_BLOCK_SIZE = 1000
+# Number of rental IDs a process reserves in the id_sequence table at a time. IDs are then handed out
+# from memory, and the unused rest of a block is skipped when the process exits.
+
+IMPORT_BATCH_SIZE = 5000
+# Number of rows the bulk importer reads and validates at a time.
+
+EXPORT_FETCH_SIZE = 1000
+# Number of rows the exporter fetches from the database at a time, so exports run in constant memory.
+
+MIGRATE_BATCH_SIZE = 5000
+# Number of rows the CSV migration inserts per transaction, so a long load never holds the write lock for long.
+
+PROFILE = os.environ.get('CARBNB_PROFILE', '0') not in ('', '0')
+# If True, the hot paths (queries, FileHandler methods, availability checks and earnings) record their call counts,
+# latencies and rows scanned. Turned on by setting the CARBNB_PROFILE environment variable to 1.
+
+LOG_FORMAT = 'json'
+# Format of the log records: 'json' writes one JSON object per line, 'text' the classic 'LEVEL:time:message' lines.
+
+LOG_ROTATE = 'size'
+# When the log file is rotated: 'size' once it reaches LOG_MAX_BYTES, or 'midnight' once a day.
+
+LOG_MAX_BYTES = 5 * 1024 * 1024
+# Size in bytes at which the log file is rotated, when LOG_ROTATE is 'size'.
+
+LOG_BACKUP_COUNT = 5
+# Number of rotated log files kept next to the log file.
+
+LOG_FLUSH_RECORDS = 100
+# The background log writer flushes the log file whenever its queue runs dry, and at least every this many records.
@@ -0,0 +1,330 @@
+import atexit
+import itertools
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from config import DATABASE, DB_PRAGMAS, DB_STATEMENT_CACHE, DB_WRITE_BATCH
+from schema import migrate
+
+# Every thread keeps its own connection per database file, since sqlite3 connections
+# cannot be shared between threads by default. In WAL mode (see DB_PRAGMAS) they all
+# read in parallel with the one connection writing.
+_local = threading.local()
+
+# Functions called after a transaction is rolled back, so in-memory caches can drop its changes
+_rollback_hooks = []
+
+# Every transaction, and every job of a Writer, gets an ID from here, so IDs increase over time
+_transaction_ids = itertools.count(1)
+
+# One write transaction at a time per database in this process. Threads wait for their
+# turn here, in order, rather than polling SQLite's write lock until busy_timeout runs out
+_write_locks = {}
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_connection(db=DATABASE):
+    """
+    Returns the calling thread's connection to a database, opening and configuring it on first use.
+
+    The connection runs in autocommit mode, so a single statement commits on its own
+    and SELECTs never commit. Use transaction() to group several statements.
+    A newly opened connection first brings the database up to the latest schema.
+
+    Args:
+        db (str, optional): The database file path. Defaults to DATABASE.
+
+    Returns:
+        sqlite3.Connection: The thread's connection to the database.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+        _local.depth = {}
+        _local.current = {}
+        _local.write_locked = set()
+
+    conn = connections.get(db)
+    if conn is None:
+        conn = sqlite3.connect(db, isolation_level=None, cached_statements=DB_STATEMENT_CACHE)
+        for pragma in DB_PRAGMAS:
+            conn.execute(pragma)
+        migrate(conn)
+        connections[db] = conn
+        _local.depth[db] = 0
+        _local.current[db] = None
+
+    return conn
+
+
+@contextmanager
+def transaction(db=DATABASE, mode='IMMEDIATE'):
+    """
+    Runs a block of statements on one connection inside a single transaction.
+
+    The transaction is committed when the outermost block exits and rolled back if it
+    raises. Nested blocks join the enclosing transaction. Write transactions of the
+    process run one at a time.
+
+    Args:
+        db (str, optional): The database file path. Defaults to DATABASE.
+        mode (str, optional): 'IMMEDIATE' takes the write lock straight away. 'DEFERRED' suits
+            blocks that only read: they see one consistent version of the database without
+            holding up writers. Defaults to 'IMMEDIATE'.
+
+    Yields:
+        sqlite3.Connection: The connection the transaction runs on.
+    """
+    assert mode in ('IMMEDIATE', 'DEFERRED'), f"Unknown transaction mode: {mode}"
+    conn = get_connection(db)
+    depth = _local.depth
+
+    write_lock = transaction_id = None
+    if depth[db] == 0:
+        if mode == 'IMMEDIATE':
+            write_lock = _write_locks.setdefault(db, threading.Lock())
+            write_lock.acquire()
+            _local.write_locked.add(db)
+        try:
+            conn.execute(f'BEGIN {mode}')
+        except BaseException:
+            _release(db, write_lock)
+            raise
+        transaction_id = _local.current[db] = next(_transaction_ids)
+    depth[db] += 1
+
+    try:
+        yield conn
+    except BaseException:
+        depth[db] -= 1
+        if depth[db] == 0:
+            try:
+                conn.execute('ROLLBACK')
+            finally:
+                _release(db, write_lock)
+            _local.current[db] = transaction_id
+            try:
+                _rolled_back()
+            finally:
+                _local.current[db] = None
+        raise
+    else:
+        depth[db] -= 1
+        if depth[db] == 0:
+            _local.current[db] = None
+            try:
+                conn.execute('COMMIT')
+            finally:
+                _release(db, write_lock)
+
+
+def _release(db, write_lock):
+    if write_lock is not None:
+        _local.write_locked.discard(db)
+        write_lock.release()
+
+
+def current_transaction(db=DATABASE):
+    """
+    Returns the ID of the calling thread's innermost transaction on a database, a Writer job
+    counting as one. While the rollback hooks run, it is the ID of the one rolled back.
+
+    IDs increase over time, so a transaction started inside the one rolled back has an ID
+    at least as large.
+
+    Args:
+        db (str, optional): The database file path. Defaults to DATABASE.
+
+    Returns:
+        int or None: The transaction's ID, or None outside a transaction.
+    """
+    return getattr(_local, 'current', {}).get(db)
+
+
+def add_rollback_hook(hook):
+    """
+    Registers a function to call whenever a transaction is rolled back.
+
+    Args:
+        hook (callable): A function taking no arguments.
+    """
+    _rollback_hooks.append(hook)
+
+
+def _rolled_back():
+    for hook in _rollback_hooks:
+        hook()
+
+
+def close_connections():
+    """
+    Closes all the connections opened by the calling thread.
+    """
+    for conn in getattr(_local, 'connections', {}).values():
+        conn.close()
+
+    _local.connections = {}
+    _local.depth = {}
+    _local.current = {}
+    _local.write_locked = set()
+
+
+class WriteFuture(Future):
+    """
+    The future of a Writer job. Waiting on it while the calling thread holds the
+    database's write lock, i.e. inside a write transaction(), raises an AssertionError:
+    the writer needs that lock to commit the job, so the wait would never end.
+    """
+
+    def __init__(self, db):
+        super().__init__()
+        self.db = db
+
+    def _check_waitable(self):
+        assert self.db not in getattr(_local, 'write_locked', ()), ("A Writer job's future cannot be waited on "
+                                                                    "inside a write transaction of its database")
+
+    def result(self, timeout=None):
+        self._check_waitable()
+        return super().result(timeout)
+
+    def exception(self, timeout=None):
+        self._check_waitable()
+        return super().exception(timeout)
+
+
+class Writer:
+    """
+    A thread of its own running write jobs on a database, many jobs to a transaction.
+
+    Jobs queued while a transaction runs are committed together in the next one (group
+    commit), each inside a savepoint, so a job that raises is rolled back alone. A job's
+    future is resolved once its transaction is committed, with the job's return value
+    or exception.
+
+    The jobs run on the writer thread's connection. The identity map and snapshot of
+    every other thread see a job's changes as a commit of another connection, and
+    rebuild once it is committed. The writer is only used for bulk and background
+    writes, such as Migration.load(). The entity classes and the menus write on the
+    calling thread's own connection, inside transaction(), and read on it too: in WAL
+    mode every thread's connection already reads in parallel with the one writing, so
+    there are no separate read-only connections.
+
+    A job's future must not be waited on inside a write transaction of the same
+    database, since the job cannot commit until that transaction ends (see WriteFuture).
+    """
+
+    def __init__(self, db=DATABASE, batch_size=DB_WRITE_BATCH):
+        """
+        Args:
+            db (str, optional): The database file path. Defaults to DATABASE.
+            batch_size (int, optional): Maximum number of jobs per transaction. Defaults to DB_WRITE_BATCH.
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.commits = 0
+        self._jobs = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='carbnb-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queues a job. It runs inside a transaction, so its statements go through
+        get_connection() or transaction() as usual, e.g. writer.submit(statements.insert_many, 'cars', rows).
+
+        Args:
+            fn (callable): The job.
+            *args, **kwargs: The job's arguments.
+
+        Returns:
+            WriteFuture: Resolved once the job's transaction is committed.
+        """
+        future = WriteFuture(self.db)
+        self._jobs.put((future, fn, args, kwargs))
+        return future
+
+    def close(self):
+        """
+        Runs the queued jobs, then stops the thread.
+        """
+        self._jobs.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            jobs = [self._jobs.get()]
+            while len(jobs) < self.batch_size and jobs[-1] is not None:
+                try:
+                    jobs.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = jobs[-1] is None
+            jobs = [job for job in jobs if job is not None and job[0].set_running_or_notify_cancel()]
+            if jobs:
+                self._commit(jobs)
+            if stop:
+                close_connections()
+                return
+
+    def _commit(self, jobs):
+        outcomes = []
+        try:
+            with transaction(self.db) as conn:
+                for future, fn, args, kwargs in jobs:
+                    conn.execute('SAVEPOINT job')
+                    outer, _local.current[self.db] = _local.current[self.db], next(_transaction_ids)
+                    try:
+                        outcomes.append((future, fn(*args, **kwargs), None))
+                    except Exception as error:
+                        conn.execute('ROLLBACK TO job')
+                        _rolled_back()
+                        outcomes.append((future, None, error))
+                    finally:
+                        _local.current[self.db] = outer
+                    conn.execute('RELEASE job')
+        except Exception as error:
+            # Nothing of the transaction was committed
+            for future, *_ in jobs:
+                future.set_exception(error)
+            return
+
+        self.commits += 1
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+def get_writer(db=DATABASE):
+    """
+    Returns the process-wide Writer of a database, starting it on first use.
+
+    Args:
+        db (str, optional): The database file path. Defaults to DATABASE.
+
+    Returns:
+        Writer: The database's writer.
+    """
+    with _writers_lock:
+        writer = _writers.get(db)
+        if writer is None:
+            writer = _writers[db] = Writer(db)
+        return writer
+
+
+@atexit.register
+def close_writers():
+    """
+    Runs the jobs queued for every writer and stops their threads.
+    """
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
@@ -0,0 +1,152 @@
+import argparse
+import csv
+import gzip
+import json
+from datetime import datetime
+from config import EXPORT_FETCH_SIZE
+from database import transaction
+from helpers import to_epoch, from_epoch
+
+DAY = 86400  # Seconds in a day
+
+# What can be exported: the query, its output columns, and the condition behind each filter.
+# 'unit' is the length in seconds of one unit of the filtered time column: a second for rent, a day for revenue.
+# Times and days are written out as 'YYYY-MM-DD HH:MM:SS' and 'YYYY-MM-DD'.
+EXPORTS = {
+    'person': {'sql': "SELECT id, pname, lname, age, email, phone FROM person",
+               'columns': ('id', 'pname', 'lname', 'age', 'email', 'phone'),
+               'filters': {'owner': "id = ?"}},
+    'cars': {'sql': "SELECT id, brand, model, year, engine, day_cost, km, owner FROM cars",
+             'columns': ('id', 'brand', 'model', 'year', 'engine', 'day_cost', 'km', 'owner'),
+             'filters': {'car': "id = ?", 'owner': "owner = ?"}},
+    'rent': {'sql': "SELECT id, pickup, return, client, car FROM rent",
+             'columns': ('id', 'pickup', 'return', 'client', 'car'),
+             'filters': {'start': "pickup >= ?", 'end': "pickup < ?", 'car': "car = ?",
+                         'owner': "car IN (SELECT id FROM cars WHERE owner = ?)"},
+             'order': "pickup", 'unit': 1, 'times': ('pickup', 'return')},
+    'revenue': {'sql': "SELECT day, car, owner, revenue, orders FROM revenue_daily",
+                'columns': ('day', 'car', 'owner', 'revenue', 'orders'),
+                'filters': {'start': "day >= ?", 'end': "day < ?", 'car': "car = ?", 'owner': "owner = ?"},
+                'order': "day", 'unit': DAY, 'days': ('day',)},
+}
+
+FORMATS = ('csv', 'jsonl')
+
+
+def _query(name, start=None, end=None, car=None, owner=None):
+    # Builds the statement of an export and the values of its filters
+    export = EXPORTS[name]
+    values = {'car': car, 'owner': owner}
+    # Both days of the period are included, as in rollup.total()
+    if start is not None:
+        values['start'] = to_epoch(start) // DAY * DAY // export.get('unit', 1)
+    if end is not None:
+        values['end'] = (to_epoch(end) // DAY + 1) * DAY // export.get('unit', 1)
+
+    conditions, params = [], []
+    for key, value in values.items():
+        if value is None:
+            continue
+        assert key in export['filters'], f"The {name} export cannot be filtered by {key}"
+        conditions.append(export['filters'][key])
+        params.append(str(value) if key in ('car', 'owner') else value)
+
+    sql = export['sql']
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if 'order' in export:
+        sql += " ORDER BY " + export['order']
+    return sql, params
+
+
+def iter_rows(name, start=None, end=None, car=None, owner=None):
+    """
+    Streams the rows of a table or report, fetching EXPORT_FETCH_SIZE rows at a time.
+
+    All the rows come from one version of the database, read in a single transaction
+    that is held until the generator is exhausted or closed.
+
+    Args:
+        name (str): 'person', 'cars', 'rent' or 'revenue' (the daily revenue rollup).
+        start (datetime, optional): Only orders picked up, or revenue earned, on this day or later.
+        end (datetime, optional): Only orders picked up, or revenue earned, on this day or earlier.
+        car (optional): Only this car's rows.
+        owner (optional): Only the rows of this owner's cars.
+
+    Yields:
+        tuple: The values of a row, in the order of EXPORTS[name]['columns'].
+    """
+    assert name in EXPORTS, f"Unknown export: {name}"
+    sql, params = _query(name, start, end, car, owner)
+
+    columns = EXPORTS[name]['columns']
+    times = [i for i, column in enumerate(columns) if column in EXPORTS[name].get('times', ())]
+    days = [i for i, column in enumerate(columns) if column in EXPORTS[name].get('days', ())]
+
+    with transaction(mode='DEFERRED') as conn:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+
+            for row in rows:
+                if times or days:
+                    row = list(row)
+                    for i in times:
+                        row[i] = str(from_epoch(row[i]))
+                    for i in days:
+                        row[i] = from_epoch(row[i] * DAY).date().isoformat()
+                yield row
+
+
+def export(name, path, fmt='csv', compress=None, start=None, end=None, car=None, owner=None):
+    """
+    Writes a table or report to a CSV or JSON Lines file, one row at a time.
+
+    Args:
+        name (str): 'person', 'cars', 'rent' or 'revenue'.
+        path (str): The file to write.
+        fmt (str, optional): 'csv' or 'jsonl'. Defaults to 'csv'.
+        compress (bool, optional): gzip the file. Defaults to True for paths ending in '.gz'.
+        start, end, car, owner (optional): Filters, as in iter_rows().
+
+    Returns:
+        int: The number of rows written.
+    """
+    assert fmt in FORMATS, f"Unknown export format: {fmt}"
+    if compress is None:
+        compress = path.endswith('.gz')
+
+    columns = EXPORTS[name]['columns']
+    rows = iter_rows(name, start, end, car, owner)
+    count = 0
+    with (gzip.open(path, 'wt', newline='') if compress else open(path, 'w', newline='')) as fh:
+        if fmt == 'csv':
+            writer = csv.writer(fh)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                fh.write(json.dumps(dict(zip(columns, row))) + '\n')
+                count += 1
+
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export a table or the daily revenue report.")
+    parser.add_argument('name', choices=sorted(EXPORTS))
+    parser.add_argument('path', help="Output file. Paths ending in .gz are compressed")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--start', type=datetime.fromisoformat, help="First day, YYYY-MM-DD")
+    parser.add_argument('--end', type=datetime.fromisoformat, help="Last day, YYYY-MM-DD")
+    parser.add_argument('--car')
+    parser.add_argument('--owner')
+    args = parser.parse_args()
+
+    count = export(args.name, args.path, args.format, start=args.start, end=args.end, car=args.car,
+                   owner=args.owner)
+    print(f"{count} rows exported to {args.path}")
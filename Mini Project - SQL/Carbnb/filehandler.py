@@ -1,5 +1,7 @@
 from abc import abstractmethod, ABCMeta
 import helpers
+from storage import get_engine
+from profiling import profiled
 
 
 class FileHandler(metaclass=ABCMeta):
@@ -11,7 +13,7 @@ class FileHandler(metaclass=ABCMeta):
     Subclasses are expected to implement the abstract methods defined here.
 
     Methods:
-        obj_to_str: Abstract method to convert object to string format for database.
+        obj_to_tuple: Abstract method to convert object to a tuple of column values.
         get_table: Abstract method to get the database table name.
         get_fieldnames: Abstract method to get fieldnames for database operations.
         get_id: Abstract method to get the object's ID.
@@ -22,10 +24,40 @@ class FileHandler(metaclass=ABCMeta):
         save: Saves an object to the database.
     """
 
+    # Entities keep their attributes in slots rather than a per-instance __dict__.
+    # Subclasses list their stored attributes in column order, followed by '_session'.
+    __slots__ = ()
+
+    @classmethod
+    def _from_values(cls, values):
+        """
+        Creates an object straight from stored values, skipping __init__ and the validating
+        setters. Only for rows read back from the database, which were validated when written.
+
+        Args:
+            values (iterable): Values of the class's slots, in __slots__ order.
+
+        Returns:
+            The new object.
+        """
+        obj = cls.__new__(cls)
+        for name, value in zip(cls.__slots__, values):
+            object.__setattr__(obj, name, value)
+        return obj
+
+    def __setattr__(self, name, value):
+        # Public attributes are set through validating properties. An object that belongs
+        # to a session reports them, so the session knows which objects to write back.
+        super().__setattr__(name, value)
+        if not name.startswith('_'):
+            session = getattr(self, '_session', None)
+            if session is not None:
+                session.mark_dirty(self, name)
+
     @abstractmethod
-    def obj_to_str(self):
+    def obj_to_tuple(self):
         """
-        Converts the object to a string format suitable for database storage.
+        Converts the object to a tuple of column values, in the table's column order.
         This method must be implemented by subclasses.
         """
         pass
@@ -54,26 +86,23 @@ class FileHandler(metaclass=ABCMeta):
         """
         pass
 
-    def load(self=None, table=None, condition=None):
+    @profiled(rows=len)
+    def load(self=None, table=None):
         """
-        Loads data from a specified table in the database based on a condition.
+        Loads all the data from a specified table in the database.
 
         Args:
             table (str): The name of the table to load data from.
-            condition (str, optional): The condition for data selection.
 
         Returns:
-            list: A list of data rows that match the condition from the specified table.
+            list: A list of all the data rows in the specified table.
         """
-        if condition:
-            query = f'SELECT * FROM {table} WHERE {condition};'
-        else:
-            query = f'SELECT * FROM {table};'
-
-        data_output = helpers.query_db(query, result=True)
+        if self:
+            table = self.get_table()
 
-        return data_output
+        return list(get_engine().scan(table))
 
+    @profiled(rows=len)
     def check_id(self=None, table=None, object_id=None):
         """
         Checks if an ID exists in the specified table in the database.
@@ -89,11 +118,10 @@ class FileHandler(metaclass=ABCMeta):
             object_id = self.get_id()
             table = self.get_table()
 
-        query = f"SELECT * FROM {table} WHERE id = {object_id};"
-        data_output = helpers.query_db(query, result=True)
-
-        return data_output
+        row = get_engine().get(table, object_id)
+        return [row] if row is not None else []
 
+    @profiled()
     def delete(self):
         """
         Deletes the object from its respective table in the database.
@@ -112,28 +140,29 @@ class FileHandler(metaclass=ABCMeta):
             open_orders = helpers.get_orders(self, future_orders=True)
             assert len(open_orders) == 0, "Unable to delete car. This car has open orders related to it."
 
-        query = f"DELETE FROM {table} WHERE id = {object_id};"
-        helpers.query_db(query)
+        get_engine().delete(table, object_id)
 
-    def edit(self, set_clauses: list):
+    @profiled()
+    def edit(self, changes: dict, object_id=None):
         """
         Edits the object's attributes in the database.
 
         Args:
-            set_clauses (list): A list of strings specifying the attributes to be updated.
+            changes (dict): New values keyed by column name.
+            object_id (optional): The ID the row is stored under, if the object's ID was edited.
+                Defaults to the object's current ID.
 
         Returns:
             bool: True if the operation is successful.
         """
-        object_id = self.get_id()
-        table = self.get_table()
-        clauses_str = ", ".join(set_clauses)
+        if object_id is None:
+            object_id = self.get_id()
 
-        query = f"UPDATE {table} SET {clauses_str} WHERE id = '{object_id}';"
-        helpers.query_db(query)
+        get_engine().update(self.get_table(), object_id, changes)
 
         return True
 
+    @profiled()
     def save(self):
         """
         Saves the object to its respective table in the database.
@@ -141,12 +170,8 @@ class FileHandler(metaclass=ABCMeta):
         Returns:
             bool: True if the operation is successful.
         """
-        table = self.get_table()
-        columns = self.get_fieldnames()
-        values = self.obj_to_str()
-
-        query = f"INSERT INTO {table} ({columns}) VALUES ({values});"
-
-        helpers.query_db(query)
+        engine, row = get_engine(), self.obj_to_tuple()
+        assert engine.get(self.get_table(), row[0]) is None, f"ID {row[0]} already exists"
+        engine.put(self.get_table(), row)
 
         return True
@@ -1,15 +1,27 @@
-import sqlite3
-from datetime import datetime as dt
-from config import DATABASE, LOGGER
-import logging
+import calendar
+from datetime import datetime as dt, timedelta
+from config import DATABASE
+from database import get_connection
+import statements
+from availability import is_free
+from profiling import profiled
+from logqueue import setup_logging
 
+EPOCH = dt(1970, 1, 1)
 
-def query_db(query, db=DATABASE, result=False):
+
+@profiled(rows=lambda res: len(res) if res is not None else 0)
+def query_db(query, params=(), db=DATABASE, result=False):
     """
     Executes a SQL query on the specified database.
 
+    The query runs on the calling thread's persistent connection. Outside of a
+    transaction() block a write is committed on its own; inside one it is committed
+    together with the rest of the block.
+
     Args:
-        query (str): The SQL query to be executed.
+        query (str): The SQL query to be executed, with ? placeholders for its values.
+        params (tuple, optional): The values bound to the placeholders.
         db (str, optional): The database file path. Defaults to DATABASE.
         result (bool, optional): If True, fetches and returns the query results.
 
@@ -18,14 +30,10 @@ def query_db(query, db=DATABASE, result=False):
     """
     res = None
 
-    with sqlite3.connect(db) as conn:
-        c = conn.cursor()
-        c.execute(query)
-
-        if result:
-            res = c.fetchall()
+    c = get_connection(db).execute(query, params)
 
-        conn.commit()
+    if result:
+        res = c.fetchall()
 
     return res
 
@@ -38,11 +46,38 @@ def auto_log(msg, object_id):
         msg (str): The message to be logged.
         object_id (int): The ID of the object related to the log message.
     """
-    logging.basicConfig(filename=LOGGER, level=logging.DEBUG, format='%(levelname)s:%(asctime)s:%(message)s')
-    logging.info(f"{msg}: ID: {object_id}")
+    # Queued for the background log writer, so the caller never waits on the disk
+    setup_logging().info(f"{msg}: ID: {object_id}", extra={'event': msg, 'object_id': object_id})
+
+
+def to_epoch(time):
+    """
+    Converts a datetime to the integer epoch seconds stored in the database.
+
+    Args:
+        time (datetime): The time to convert. Naive times are stored as if they were UTC.
+
+    Returns:
+        int: Seconds since 1970-01-01 00:00:00.
+    """
+    return calendar.timegm(time.timetuple())
 
 
-def is_available(car_id, pickup_t, return_t):
+def from_epoch(seconds):
+    """
+    Converts integer epoch seconds from the database back to a naive datetime.
+
+    Args:
+        seconds (int): Seconds since 1970-01-01 00:00:00.
+
+    Returns:
+        datetime: The stored time.
+    """
+    return EPOCH + timedelta(seconds=seconds)
+
+
+@profiled()
+def is_available(car_id, pickup_t, return_t, order_id=None):
     """
     Checks if a car is available for rent between specified pickup and return times.
 
@@ -50,23 +85,13 @@ def is_available(car_id, pickup_t, return_t):
         car_id (int): The ID of the car to check.
         pickup_t (datetime): The pickup time.
         return_t (datetime): The return time.
+        order_id (optional): The ID of the order being checked, so that it does not conflict with itself.
 
     Returns:
         bool: True if the car is available; otherwise, False.
     """
-    query = f"SELECT * FROM rent WHERE car = {car_id}"
-    orders = query_db(query, result=True)
-    flag = False
-
-    for order in orders:
-        pickup_time = dt.strptime(order[1], '%Y-%m-%d %H:%M:%S')
-        return_time = dt.strptime(order[2], '%Y-%m-%d %H:%M:%S')
-
-        if return_time >= pickup_t >= pickup_time or pickup_time <= return_t <= return_time:
-            flag = True
-            break
-
-    return flag
+    # One seek into the rent(car, pickup, return, id) index, see availability.py
+    return is_free(car_id, to_epoch(pickup_t), to_epoch(return_t), ignore_id=order_id)
 
 
 def get_by_id(object_id, table):
@@ -83,15 +108,26 @@ def get_by_id(object_id, table):
     Raises:
         AssertionError: If no record is found with the specified ID.
     """
-    query = f"SELECT * FROM {table} WHERE id = {object_id}"
-
-    res = query_db(query, result=True)
+    res = statements.select_by_id(table, object_id)
 
     assert len(res) != 0
 
     return res
 
 
+# Fixed queries. Their texts never change, so after the first call they are served from
+# the connection's cache of compiled statements. Filters on pickup use the rent indexes.
+
+CARS_OF_OWNER = "SELECT id, brand, model, year, engine, day_cost, km FROM cars WHERE owner = ?"
+
+ORDERS_OF_CLIENT = "SELECT id, pickup, return, client, car FROM rent WHERE client = ? AND pickup > ?"
+
+ORDERS_OF_CLIENT_AND_CAR = "SELECT id, pickup, return, client, car FROM rent " \
+                           "WHERE client = ? AND car = ? AND pickup > ?"
+
+ORDERS_OF_CAR = "SELECT id, pickup, return, client, car FROM rent WHERE car = ? AND pickup > ?"
+
+
 def get_cars(self):
     """
     Retrieves car data for a given owner.
@@ -99,9 +135,7 @@ def get_cars(self):
     Returns:
         list: A list of car data rows owned by the person instance.
     """
-    query = f"SELECT c.id, c.brand, c.model, c.year, c.engine, c.day_cost, c.km FROM cars c " \
-            f"JOIN person p ON c.owner = p.id WHERE p.id = {self.id};"
-    data_output = query_db(query)
+    data_output = query_db(CARS_OF_OWNER, (self.id,), result=True)
 
     return data_output
 
@@ -117,45 +151,58 @@ def get_orders(self, second_obj=None, future_orders=False):
     Returns:
         list: A list of order data rows related to the object.
     """
-    query = None
+    query, params = None, ()
 
     if self.__class__.__name__ == 'Person':
         if second_obj:
-            query = f"SELECT r.id, r.pickup, r.return, r.client, r.car FROM rent r " \
-                    f"JOIN person p ON r.client = p.id" \
-                    f"JOIN cars c ON r.car = c.id " \
-                    f"WHERE p.id = {self.id} AND c.id = {second_obj.id};"
+            query, params = ORDERS_OF_CLIENT_AND_CAR, (self.id, second_obj.id)
         else:
-            query = f"SELECT r.id, r.pickup, r.return, r.client, r.car FROM rent r " \
-                    f"JOIN person p ON r.client = p.id WHERE p.id = {self.id};"
+            query, params = ORDERS_OF_CLIENT, (self.id,)
 
     elif self.__class__.__name__ == 'Car':
         if second_obj:
-            query = f"SELECT r.id, r.pickup, r.return, r.client, r.car FROM rent r " \
-                    f"JOIN cars c ON r.car = c.id" \
-                    f"JOIN person p ON r.client = p.id " \
-                    f"WHERE c.id = {self.id} AND p.id = {second_obj.id};"
+            query, params = ORDERS_OF_CLIENT_AND_CAR, (second_obj.id, self.id)
         else:
-            query = f"SELECT r.id, r.pickup, r.return, r.client, r.car FROM rent r " \
-                    f"JOIN cars c ON r.car = c.id WHERE c.id = {self.id};"
-
-    if future_orders:
-        final_output = []
-        # Fetch the data from the database based on the constructed query
-        data_output = query_db(query, result=True)
-
-        for order in data_output:
-            # Convert the pickup time string from the order to a datetime object
-            pickup = dt.strptime(order[1], '%Y-%m-%d %H:%M:%S')
-
-            # Check if the pickup time is in the future compared to the current time
-            if pickup > dt.now():
-                final_output.append(order)
-    else:
-        # If not filtering for future orders, fetch all data based on the query
-        final_output = query_db(query, result=True)
-
-    return final_output
+            query, params = ORDERS_OF_CAR, (self.id,)
+
+    # Without the future filter every order qualifies, since all pickup times are after the epoch
+    after = to_epoch(dt.now()) if future_orders else -1
+
+    return query_db(query, params + (after,), result=True)
+
+
+# Cars passing the optional filters (a NULL filter matches every car) that have no booking
+# overlapping the period. The anti-join runs on the rent(car, pickup, return, id) index.
+AVAILABLE_CARS = "SELECT c.id, c.brand, c.model, c.year, c.engine, c.day_cost, c.km, c.owner FROM cars c " \
+                 "WHERE (?1 IS NULL OR c.brand = ?1) AND (?2 IS NULL OR c.day_cost <= ?2) " \
+                 "AND (?3 IS NULL OR c.year >= ?3) " \
+                 "AND NOT EXISTS (SELECT 1 FROM rent r WHERE r.car = c.id AND r.pickup <= ?5 AND r.return >= ?4)"
+
+
+@profiled(rows=len)
+def find_available_cars(pickup_t, return_t, brand=None, max_day_cost=None, min_year=None):
+    """
+    Retrieves all the cars that are free for a whole rental period, optionally filtered.
+
+    Args:
+        pickup_t (datetime): The start of the rental period.
+        return_t (datetime): The end of the rental period.
+        brand (str, optional): Only cars of this brand.
+        max_day_cost (int, optional): Only cars costing at most this much per day.
+        min_year (int, optional): Only cars made in this year or later.
+
+    Returns:
+        list: The car data rows of the available cars.
+    """
+    if brand:
+        brand = brand.capitalize()  # Brands are stored capitalized
+
+    params = (brand,
+              int(max_day_cost) if max_day_cost is not None else None,
+              int(min_year) if min_year is not None else None,
+              to_epoch(pickup_t), to_epoch(return_t))
+
+    return query_db(AVAILABLE_CARS, params, result=True)
 
 
 def rent_cost_general(days, car):
@@ -0,0 +1,152 @@
+import threading
+from database import get_connection, add_rollback_hook, current_transaction
+import statements
+
+# The session of each thread's innermost `with Session()` block, if any
+_local = threading.local()
+
+
+def current_session():
+    """
+    Returns:
+        Session or None: The session the calling thread is working in.
+    """
+    return getattr(_local, 'session', None)
+
+
+class IdentityMap:
+    """
+    The single in-memory object of every row loaded through a reference, per table and ID.
+
+    Objects are built from their row the first time they are needed and shared from
+    then on. Every thread keeps its own map, built from what its own connection sees,
+    so no lock is needed. The rows its connection writes through the storage engine are
+    discarded one by one. The whole map is dropped when another connection commits
+    (data_version) and when one of the thread's transactions is rolled back, so a shared
+    object never outlives the row it was built from. Writes of raw SQL on the thread's
+    own connection are not tracked; call discard() for their rows.
+
+    Other connections' commits are looked for once per transaction, since a transaction
+    reads one version of the database. Outside a transaction every lookup checks, so
+    code resolving many references does it inside transaction(mode='DEFERRED').
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def get(self, table, object_id, build):
+        """
+        Returns the object of a row, building it on first use.
+
+        Args:
+            table (str): The table holding the row.
+            object_id: The ID of the row.
+            build (callable): Builds the object from the row's values, e.g. Car.from_row.
+
+        Returns:
+            The object of the row, or None if there is no row with that ID.
+        """
+        local = self._local
+        transaction_id = current_transaction()
+        if transaction_id is None or transaction_id != getattr(local, 'transaction', None):
+            conn = get_connection()
+            version = (id(conn), conn.execute("PRAGMA data_version").fetchone()[0])
+            if version != getattr(local, 'version', None):
+                local.objects = {}
+                local.version = version
+            local.transaction = transaction_id
+
+        key = (table, str(object_id))
+        if key not in local.objects:
+            rows = statements.select_by_id(table, object_id)
+            local.objects[key] = build(rows[0]) if rows else None
+
+        return local.objects[key]
+
+    def discard(self, table, object_ids):
+        """
+        Drops the objects of some rows from the calling thread's map, after its connection wrote them.
+
+        Args:
+            table (str): The table holding the rows.
+            object_ids (iterable): The IDs of the rows.
+        """
+        objects = getattr(self._local, 'objects', None)
+        if objects:
+            for object_id in object_ids:
+                objects.pop((table, str(object_id)), None)
+
+    def clear(self):
+        """
+        Drops every object shared in the calling thread.
+        """
+        self._local.objects = {}
+        self._local.version = None
+        self._local.transaction = None
+
+
+# The identity map used by the references between entities, with objects per thread
+IDENTITY = IdentityMap()
+add_rollback_hook(IDENTITY.clear)
+
+
+class Ref:
+    """
+    A lazy reference to the entity stored in another table, holding only its ID.
+
+    Reading the ID attribute never touches the database. Reading any other attribute
+    resolves the reference through the identity map and reads it from the shared
+    object, so loading many rows costs no extra queries until a referenced entity is used.
+    """
+
+    __slots__ = ('key', 'table', 'build', 'key_attr')
+
+    def __init__(self, table, key, build, key_attr='id'):
+        """
+        Args:
+            table (str): The table holding the referenced row.
+            key: The ID of the referenced row.
+            build (callable): Builds the referenced object from its row, e.g. Person.from_row.
+            key_attr (str, optional): The attribute of the object that holds its ID. Defaults to 'id'.
+        """
+        # Set straight on the slots, bypassing __setattr__ below
+        _set = object.__setattr__
+        _set(self, 'key', key)
+        _set(self, 'table', table)
+        _set(self, 'build', build)
+        _set(self, 'key_attr', key_attr)
+
+    def resolve(self):
+        """
+        Returns:
+            The referenced object, or None if its row does not exist. Inside a session,
+            it is the session's own instance of the entity.
+        """
+        session = current_session()
+        if session is not None:
+            return session.load(self.table, self.key, self.build)
+        return IDENTITY.get(self.table, self.key, self.build)
+
+    def __getattr__(self, name):
+        # Only called for attributes a Ref does not have itself
+        if name in Ref.__slots__:
+            raise AttributeError(name)
+        if name == self.key_attr:
+            return self.key
+
+        target = self.resolve()
+        assert target is not None, f"ID {self.key} does not exist in the {self.table} table"
+        return getattr(target, name)
+
+    def __setattr__(self, name, value):
+        # Setting an entity attribute through the reference sets it on the referenced object
+        if name in Ref.__slots__:
+            object.__setattr__(self, name, value)
+            return
+
+        target = self.resolve()
+        assert target is not None, f"ID {self.key} does not exist"
+        setattr(target, name, value)
+
+    def __repr__(self):
+        return f"Ref({self.table!r}, {self.key!r})"
@@ -0,0 +1,244 @@
+import argparse
+import csv
+from itertools import islice
+from config import IMPORT_BATCH_SIZE
+from database import transaction
+from snapshot import get_snapshot
+from identity import Ref
+from person import Person
+from car import Car
+from rent import Rent
+from sequence import RENT_IDS
+from storage import get_engine
+import rollup
+import statements
+
+
+class ImportResult:
+    """
+    The outcome of a bulk import.
+
+    Attributes:
+        counts (dict): Number of rows imported, keyed by table.
+        errors (list): (table, line, message) of every rejected row. Nothing is written if there are any.
+    """
+
+    def __init__(self):
+        self.counts = {'person': 0, 'cars': 0, 'rent': 0}
+        self.errors = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+def read_rows(path):
+    """
+    Reads the rows of an import file: a CSV file whose header holds the table's column names.
+
+    Args:
+        path (str): The path of the file.
+
+    Yields:
+        tuple: The line number and the row, as a dict keyed by column name.
+    """
+    with open(path, 'r', newline='') as fh:
+        reader = csv.DictReader(fh, skipinitialspace=True)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def batches(rows, size=IMPORT_BATCH_SIZE):
+    """
+    Splits an iterable into lists of at most `size` items.
+    """
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def find_overlaps(bookings):
+    """
+    Finds the bookings that overlap an earlier booking of the same car, with a sweep over
+    the bookings sorted by car and pickup time.
+
+    Touching end points count as an overlap, as in availability.is_free.
+
+    Args:
+        bookings (list): (car, pickup, return) of every booking, times in epoch seconds.
+
+    Returns:
+        set: Positions in `bookings` of the rejected bookings.
+    """
+    overlaps = set()
+    car, latest_end = None, None
+    for i in sorted(range(len(bookings)), key=lambda i: bookings[i][:2]):
+        booking_car, pickup, return_ = bookings[i]
+        if booking_car != car:
+            car, latest_end = booking_car, return_
+        elif pickup <= latest_end:
+            overlaps.add(i)
+        else:
+            latest_end = return_
+    return overlaps
+
+
+class Importer:
+    """
+    Loads persons, cars and rental orders in bulk, without the interactive menu.
+
+    Rows are validated in batches by the entity classes' own setters. References
+    are checked against in-memory sets of the existing and imported IDs instead of
+    a query per row, and bookings against the rent table's index and each other.
+    If every row is valid, all the rows are written in a single transaction with
+    one batch per table, through the storage engine in use. Otherwise nothing is written.
+    """
+
+    def __init__(self):
+        snapshot = get_snapshot()
+        # IDs are compared as strings, as they are in the entity classes
+        self.keys = {'person': set(map(str, snapshot.person['id'])),
+                     'cars': set(snapshot.cars['id']),
+                     'rent': set(snapshot.rent['id'])}
+        self.rows = {'person': [], 'cars': [], 'rent': []}
+        self.result = ImportResult()
+
+    def _check_new(self, table, object_id):
+        assert str(object_id) not in self.keys[table], f"ID {object_id} already exists in the {table} table"
+
+    def _check_exists(self, table, object_id):
+        assert str(object_id) in self.keys[table], f"ID {object_id} does not exist in the {table} table"
+
+    def _validate(self, table, batch, build):
+        # Builds every row of a batch into an entity, keeping the valid ones
+        valid = []
+        for line, row in batch:
+            try:
+                obj = build(row)
+            except (AssertionError, ValueError, KeyError, TypeError) as e:
+                self.result.errors.append((table, line, str(e) or type(e).__name__))
+                continue
+            self.keys[table].add(str(obj.get_id()))
+            valid.append((line, obj.obj_to_tuple()))
+        return valid
+
+    def _person(self, row):
+        self._check_new('person', row['id'])
+        return Person(row['id'], row['pname'], row['lname'], row['age'], row['email'], row['phone'])
+
+    def _car(self, row):
+        self._check_new('cars', row['id'])
+        self._check_exists('person', row['owner'])
+        return Car(row['id'], row['brand'], row['model'], row['year'], row['engine'], row['day_cost'], row['km'],
+                   Ref('person', row['owner'], Person.from_row))
+
+    def _rent(self, row):
+        # Orders without an ID get one from the rent ID sequence
+        override = bool(row.get('id'))
+        if override:
+            self._check_new('rent', row['id'])
+        self._check_exists('person', row['client'])
+        self._check_exists('cars', row['car'])
+        return Rent(row['pickup'], row['return'], Ref('person', row['client'], Person.from_row),
+                    Ref('cars', row['car'], Car.from_row), id_=row.get('id'), override=override)
+
+    def add_persons(self, rows):
+        """
+        Validates persons for the import.
+
+        Args:
+            rows (iterable): (line, row) pairs, each row a dict keyed by the person table's columns.
+        """
+        for batch in batches(rows):
+            self.rows['person'] += self._validate('person', batch, self._person)
+
+    def add_cars(self, rows):
+        """
+        Validates cars for the import. Their owners must exist or be added first.
+
+        Args:
+            rows (iterable): (line, row) pairs, each row a dict keyed by the cars table's columns.
+        """
+        for batch in batches(rows):
+            self.rows['cars'] += self._validate('cars', batch, self._car)
+
+    def add_orders(self, rows):
+        """
+        Validates rental orders for the import. Their clients and cars must exist or be added first.
+        Times are in the 'YYYY-MM-DD HH:MM:SS' format.
+
+        Args:
+            rows (iterable): (line, row) pairs, each row a dict keyed by the rent table's columns.
+        """
+        for batch in batches(rows):
+            self.rows['rent'] += self._validate('rent', batch, self._rent)
+
+    def commit(self):
+        """
+        Writes every validated row in one transaction, unless some row was rejected.
+
+        Returns:
+            ImportResult: The number of rows written per table and the rejected rows.
+        """
+        orders = self.rows['rent']
+        # Orders already passed the check against the stored bookings, this checks them against each other
+        for i in sorted(find_overlaps([(row[4], row[1], row[2]) for _, row in orders])):
+            self.result.errors.append(('rent', orders[i][0], "Chosen vehicle is already booked within the "
+                                                             "desired time frame"))
+
+        if self.result.errors:
+            return self.result
+
+        with transaction():
+            engine = get_engine()
+            for table in ('person', 'cars', 'rent'):
+                engine.put_many(table, [row for _, row in self.rows[table]])
+                self.result.counts[table] = len(self.rows[table])
+            rollup.record_orders((row[1], row[2], row[4]) for _, row in orders)
+            # Imported IDs must never be handed out again to new orders
+            if orders:
+                RENT_IDS.advance(max(int(row[0]) for _, row in orders) + 1)
+
+        self.rows = {'person': [], 'cars': [], 'rent': []}
+        return self.result
+
+
+def import_files(persons=None, cars=None, orders=None):
+    """
+    Imports persons, cars and rental orders from CSV files in one transaction.
+
+    Args:
+        persons (str, optional): Path of a file of persons.
+        cars (str, optional): Path of a file of cars.
+        orders (str, optional): Path of a file of rental orders.
+
+    Returns:
+        ImportResult: The number of rows written per table and the rejected rows.
+    """
+    importer = Importer()
+    if persons:
+        importer.add_persons(read_rows(persons))
+    if cars:
+        importer.add_cars(read_rows(cars))
+    if orders:
+        importer.add_orders(read_rows(orders))
+    return importer.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import persons, cars and rental orders from CSV files.")
+    parser.add_argument('--persons', help="CSV file with the columns " + ', '.join(statements.TABLES['person']))
+    parser.add_argument('--cars', help="CSV file with the columns " + ', '.join(statements.TABLES['cars']))
+    parser.add_argument('--orders', help="CSV file with the columns " + ', '.join(statements.TABLES['rent']))
+    args = parser.parse_args()
+
+    result = import_files(args.persons, args.cars, args.orders)
+    for table, line, message in result.errors:
+        print(f"{table} line {line}: {message}")
+    if result.ok:
+        print(', '.join(f"{count} {table} rows imported" for table, count in result.counts.items()))
+    else:
+        print(f"{len(result.errors)} rows rejected, nothing was imported")
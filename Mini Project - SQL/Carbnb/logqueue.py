@@ -0,0 +1,153 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from config import LOGGER, LOG_FORMAT, LOG_ROTATE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_FLUSH_RECORDS
+
+# Asynchronous application log. Records are put on a queue by the calling thread and
+# written to the log file by a single background thread, so logging never waits on the disk.
+
+TEXT_FORMAT = '%(levelname)s:%(asctime)s:%(message)s'
+
+LOG = logging.getLogger('carbnb')
+
+_lock = threading.Lock()
+_state = {'listener': None}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line: time, level and message, plus the
+    'event' and 'object_id' fields of records written by helpers.auto_log.
+    """
+
+    def format(self, record):
+        entry = {'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+                 'level': record.levelname, 'message': record.getMessage()}
+        for field in ('event', 'object_id'):
+            if hasattr(record, field):
+                entry[field] = getattr(record, field)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _BatchedFlush:
+    # Log file handlers that leave flushing to the writer thread. StreamHandler.emit()
+    # flushes after every record; the writer flushes once per batch of records instead.
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class BatchedRotatingFileHandler(_BatchedFlush, RotatingFileHandler):
+    """
+    A RotatingFileHandler flushed by the writer thread once per batch of records.
+    """
+
+
+class BatchedTimedRotatingFileHandler(_BatchedFlush, TimedRotatingFileHandler):
+    """
+    A TimedRotatingFileHandler flushed by the writer thread once per batch of records.
+    """
+
+
+class _Writer(QueueListener):
+    # The background thread writing the queued records, flushing the file whenever the
+    # queue runs dry and at least every LOG_FLUSH_RECORDS records
+
+    def __init__(self, records, handler):
+        super().__init__(records, handler, respect_handler_level=True)
+        self.handler = handler
+        self._unflushed = 0
+
+    def dequeue(self, block):
+        if self._unflushed >= LOG_FLUSH_RECORDS or self._unflushed and self.queue.empty():
+            self.handler.flush_batch()
+            self._unflushed = 0
+
+        record = self.queue.get(block)
+        self._unflushed += 1
+        return record
+
+
+def setup_logging(path=LOGGER, fmt=LOG_FORMAT, rotate=LOG_ROTATE):
+    """
+    Configures the application log and starts its writer thread, unless it is already running.
+
+    Args:
+        path (str, optional): The log file. Defaults to LOGGER.
+        fmt (str, optional): 'json' or 'text'. Defaults to LOG_FORMAT.
+        rotate (str, optional): 'size' or 'midnight'. Defaults to LOG_ROTATE.
+
+    Returns:
+        logging.Logger: The application logger.
+    """
+    with _lock:
+        if _state['listener'] is not None:
+            return LOG
+
+        assert fmt in ('json', 'text'), f"Unknown log format: {fmt}"
+        assert rotate in ('size', 'midnight'), f"Unknown log rotation: {rotate}"
+        if rotate == 'size':
+            handler = BatchedRotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                                 encoding='utf-8', delay=True)
+        else:
+            handler = BatchedTimedRotatingFileHandler(path, when='midnight', backupCount=LOG_BACKUP_COUNT,
+                                                      encoding='utf-8', delay=True)
+        handler.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+
+        records = queue.SimpleQueue()
+        listener = _Writer(records, handler)
+        listener.start()
+
+        LOG.addHandler(QueueHandler(records))
+        LOG.setLevel(logging.DEBUG)
+        LOG.propagate = False
+        _state['listener'] = listener
+        return LOG
+
+
+@atexit.register
+def shutdown_logging():
+    """
+    Writes out the queued records and stops the writer thread. The next record logged
+    starts it again.
+    """
+    with _lock:
+        listener = _state['listener']
+        if listener is None:
+            return
+
+        listener.stop()
+        listener.handler.close()
+        for handler in list(LOG.handlers):
+            LOG.removeHandler(handler)
+        _state['listener'] = None
+
+
+def read_log(path=LOGGER, event=None):
+    """
+    Reads the records of a JSON log file. Lines in another format are skipped.
+
+    Args:
+        path (str, optional): The log file. Defaults to LOGGER.
+        event (str, optional): Only the records of this auto_log event, e.g. 'Client added'.
+
+    Yields:
+        dict: The fields of every record.
+    """
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(entry, dict) and (event is None or entry.get('event') == event):
+                yield entry
@@ -2,8 +2,11 @@ from datetime import datetime as dt
 from person import Person
 from car import Car
 from rent import Rent
-from filehandler import FileHandler
-from helpers import auto_log, get_by_id, rent_cost_general
+from helpers import auto_log, get_by_id, to_epoch, find_available_cars
+from database import transaction, close_connections
+from config import PROFILE_PATH
+from earnings import get_engine
+import profiling
 
 
 def main_menu():
@@ -18,7 +21,7 @@ def main_menu():
     """
 
     # Define a list of valid action inputs
-    possible_actions = ['1', '2', '3', '4', '5', '6', '7', '0']
+    possible_actions = ['1', '2', '3', '4', '5', '6', '7', '8', '9', '0']
 
     # Display the main menu options to the user
     print('\n*** Carbnb ***\n'
@@ -29,6 +32,8 @@ def main_menu():
           '[5] Create a new order\n'
           '[6] Edit/Delete an order\n'
           '[7] Calculate earnings\n'
+          '[8] Find available cars\n'
+          '[9] Show performance statistics\n'
           '[0] Exit')
 
     # Capture the user's choice
@@ -173,12 +178,13 @@ def edit_client(client):
          client (Person): The client object to be edited.
      """
     possible_actions = ['1', '2', '3', '4', '5', '6', '0']
-    clauses_lst = []
+    changes = {}  # New column values, keyed by column name
+    original_id = client.id  # The ID the client is stored under
 
     while True:
         # Displaying edit options and capturing user choice
         # Loop for handling client attribute edits
-        # The client.edit method is called with the clauses_lst
+        # The client.edit method is called with the collected changes
         print("\n[1] Edit ID\n"
               "[2] Edit First Name\n"
               "[3] Edit Last Name\n"
@@ -194,22 +200,22 @@ def edit_client(client):
         match edit_client_act:
             case '1':
                 client.id = input("Enter new ID")
-                clauses_lst.append(f"id = '{client.id}'")
+                changes['id'] = client.id
             case '2':
                 client.f_name = input("Enter new first mame")
-                clauses_lst.append(f"pname = '{client._f_name}'")
+                changes['pname'] = client._f_name
             case '3':
                 client.l_name = input('Enter new last name')
-                clauses_lst.append(f"lname = '{client._l_name}'")
+                changes['lname'] = client._l_name
             case '4':
                 client.age = input('Enter new age')
-                clauses_lst.append(f"age = {client.age}")
+                changes['age'] = client.age
             case '5':
                 client.email = input("Enter new Email address")
-                clauses_lst.append(f"email = '{client.email}'")
+                changes['email'] = client.email
             case '6':
                 client.phone = input('Enter new phone number')
-                clauses_lst.append(f"phone = '{client._phone}'")
+                changes['phone'] = client._phone
             case '0':
                 menu_navigator()
 
@@ -222,7 +228,7 @@ def edit_client(client):
             case '1':
                 pass
             case '2':
-                client.edit(set_clauses=clauses_lst)
+                client.edit(changes, object_id=original_id)
 
                 break
 
@@ -292,9 +298,8 @@ def get_car(id_num):
         print("Entered ID does not exist in our database")
         car_menu()  # Redirecting to the car menu if ID is not found
     else:
-        # Creating and displaying the car object
-        car = Car(id_=car_data[0], brand=car_data[1], model=car_data[2], year=car_data[3],
-                  engine=car_data[4], day_cost=car_data[5], km=car_data[6], owner=car_data[7])
+        # Creating and displaying the car object. Its owner is only loaded if it is used
+        car = Car.from_row(car_data)
         car.show()
 
     return car
@@ -308,12 +313,13 @@ def edit_car(car):
         car (Car): The car object to be edited.
     """
     possible_actions = ['1', '2', '3', '4', '5', '6', '7', '8', '0']
-    clauses_lst = []
+    changes = {}  # New column values, keyed by column name
+    original_id = car.id  # The serial number the car is stored under
 
     while True:
         # Displaying edit options and capturing user choice
         # Loop for handling car attribute edits
-        # The car.edit method is called with the clauses_lst
+        # The car.edit method is called with the collected changes
         print("\n[1] Edit serial number\n"
               "[2] Edit Brand\n"
               "[3] Edit Model\n"
@@ -331,28 +337,28 @@ def edit_car(car):
         match edit_car_act:
             case '1':
                 car.id = input("Enter new serial number")
-                clauses_lst.append(f'id = "{car._id}"')
+                changes['id'] = car._id
             case '2':
                 car.brand = input("Enter new Brand")
-                clauses_lst.append(f'brand = "{car._brand}"')
+                changes['brand'] = car._brand
             case '3':
                 car.model = input('Enter new Model')
-                clauses_lst.append(f'model = "{car._model}"')
+                changes['model'] = car._model
             case '4':
                 car.year = input('Enter new Year')
-                clauses_lst.append(f'year = {car._year}')
+                changes['year'] = car._year
             case '5':
                 car.engine = input("Enter new Engine")
-                clauses_lst.append(f'engine = {car._engine}')
+                changes['engine'] = car._engine
             case '6':
                 car.day_cost = input('Enter new Day Cost')
-                clauses_lst.append(f'day_cost = {car._day_cost}')
+                changes['day_cost'] = car._day_cost
             case '7':
                 car.km = input('Enter new KM')
-                clauses_lst.append(f'km = {car._km}')
+                changes['km'] = car._km
             case '8':
                 car.owner = input('Enter new Owner')
-                clauses_lst.append(f'owner = "{car.owner}"')
+                changes['owner'] = car.owner.id
             case '0':
                 car_menu()
 
@@ -365,7 +371,7 @@ def edit_car(car):
             case '1':
                 pass
             case '2':
-                car.edit(set_clauses=clauses_lst)
+                car.edit(changes, object_id=original_id)
 
                 break
 
@@ -516,9 +522,8 @@ def get_order(id_num):
         print("Entered ID does not exist in our database")
         order_menu()  # Redirecting to the order menu if ID is not found
     else:
-        # Creating and displaying the order object
-        o = Rent(pickup_time=order_data[1], return_time=order_data[2], client=order_data[3],
-                 car=order_data[4], id_=order_data[0], override=True)
+        # Creating and displaying the order object. Its car and client are only loaded if they are used
+        o = Rent.from_row(order_data)
         o.show()
 
     return o
@@ -532,12 +537,12 @@ def edit_order(order):
         order (Rent): The order object to be edited.
     """
     possible_actions = ['1', '2', '3', '4', '0']
-    clauses_lst = []
+    changes = {}  # New column values, keyed by column name
 
     while True:
         # Displaying edit options and capturing user choice
         # Loop for handling order attribute edits
-        # The order.edit method is called with the clauses_lst
+        # The order.edit method is called with the collected changes
         print("\n[1] Edit Pickup Time\n"
               "[2] Edit Return Time\n"
               "[3] Edit Client\n"
@@ -555,20 +560,20 @@ def edit_order(order):
                 pickup_month = input("Month (MM): ")
                 pickup_day = input('Day (DD): ')
                 order.pickup_time = f"{pickup_year}-{pickup_month}-{pickup_day} 00:00:00"
-                clauses_lst.append(f'pickup = "{order._pickup_time}"')
+                changes['pickup'] = to_epoch(order._pickup_time)
             case '2':
                 return_year = input("Enter pickup time: \n"
                                     "Year (YYYY): ")
                 return_month = input("Month (MM): ")
                 return_day = input("Day (DD): ")
                 order.return_time = f"{return_year}-{return_month}-{return_day} 00:00:00"
-                clauses_lst.append(f'return = "{order._return_time}"')
+                changes['return'] = to_epoch(order._return_time)
             case '3':
                 order.client = input('Enter new Client ID')
-                clauses_lst.append(f'client = "{order.client}"')
+                changes['client'] = order.client.id
             case '4':
                 order.car = input("Enter new Car ID")
-                clauses_lst.append(f'car = "{order.car}"')
+                changes['car'] = order.car.id
             case '0':
                 car_menu()
 
@@ -581,7 +586,7 @@ def edit_order(order):
             case '1':
                 pass
             case '2':
-                order.edit(set_clauses=clauses_lst)
+                order.edit(changes)
 
                 break
 
@@ -678,14 +683,15 @@ def save_order(order_d: dict):
 
     while o is None:
         try:
-            # Attempts to create a Rent object. If an exception occurs, it retries.
-            o = Rent(pickup_time=order_d['Pickup Time'], return_time=order_d['Return Time'],
-                     client=order_d['Client'], car=order_d['Car'], override=True)
+            # Attempts to create and save a Rent object. If an exception occurs, it retries.
+            # The lookups, the availability check and the insert share one connection and one commit.
+            with transaction():
+                o = Rent(pickup_time=order_d['Pickup Time'], return_time=order_d['Return Time'],
+                         client=order_d['Client'], car=order_d['Car'])
+                o.save()  # Saving the created Rent object
         except AssertionError as e:
             print(e)
             order_menu()  # Redirecting to the order menu if there's an error
-        else:
-            o.save()  # Saving the created Rent object
 
     return o
 
@@ -719,6 +725,47 @@ def add_order():
     menu_navigator()  # Returning to the main menu
 
 
+# CAR SEARCH
+
+
+def find_cars():
+    """
+    Prompts the user for a rental period and optional filters, and lists all the cars
+    available for the whole period.
+    """
+    print("Please enter the rental period:")
+    # Collecting the rental period from user input
+    pickup_year = input("Enter pickup time: \n"
+                        "Year (YYYY): ")
+    pickup_month = input("Month (MM): ")
+    pickup_day = input("Day (DD): ")
+
+    return_year = input("Enter return time: \n"
+                        "Year (YYYY): ")
+    return_month = input("Month (MM): ")
+    return_day = input("Day (DD): ")
+
+    # Optional filters, left empty to skip
+    brand = input("Brand (leave empty for any): ") or None
+    max_day_cost = input("Maximum day cost (leave empty for any): ") or None
+    min_year = input("Minimum year (leave empty for any): ") or None
+
+    try:
+        pickup_t = dt.strptime(f"{pickup_year}-{pickup_month}-{pickup_day} 00:00:00", '%Y-%m-%d %H:%M:%S')
+        return_t = dt.strptime(f"{return_year}-{return_month}-{return_day} 00:00:00", '%Y-%m-%d %H:%M:%S')
+        cars = find_available_cars(pickup_t, return_t, brand=brand, max_day_cost=max_day_cost, min_year=min_year)
+    except ValueError as e:
+        print(e)
+        print("Dates and numbers must contain numbers only")
+    else:
+        # Displaying the available cars
+        print(f"\n*** {len(cars)} available cars ***")
+        for car in cars:
+            print(f"{car[0]}: {car[1]} {car[2]} ({car[3]}), {car[5]} NIS per day")
+
+    menu_navigator()  # Returning to the main menu
+
+
 # EARNING CALCULATION
 
 
@@ -761,6 +808,7 @@ def get_date_range(year=False, date_range=False):
     return {'start': start_date, 'end': end_date}
 
 
+@profiling.profiled()
 def year_cal(date_d):
     """
       Calculates and prints the total earnings for a given calendar year.
@@ -768,23 +816,14 @@ def year_cal(date_d):
       Args:
           date_d (dict): A dictionary containing 'start' and 'end' datetime objects.
       """
-    orders = FileHandler.load(table='rent')  # Load all orders
-    cars = Car.load_from_db()  # Load all cars
-    res = 0  # Initialize the total earnings
-
-    for order in orders:
-        car = [c for c in cars if c.id == int(order[4])][0]  # Find the car for each order
-        pickup_date = dt.strptime(order[1], '%Y-%m-%d %H:%M:%S')
-        # Check if the order falls within the specified year
-        if date_d['start'] <= pickup_date <= date_d['end']:
-            return_date = dt.strptime(order[2], '%Y-%m-%d %H:%M:%S')
-            days = return_date - pickup_date  # Calculate rental duration
-            res += rent_cost_general(days, car)  # Add to total earnings
+    # Sum the earnings of the orders picked up within the year
+    res = get_engine().total(date_d['start'], date_d['end'])
 
     # Print total earnings for the year
     print('\n', ('*' * 10), f"Yearly earnings for calendar year {date_d['start'].year} are {res} NIS", ('*' * 10))
 
 
+@profiling.profiled()
 def range_cal(date_d):
     """
       Calculates and prints the total earnings for a specified date range.
@@ -792,21 +831,11 @@ def range_cal(date_d):
       Args:
           date_d (dict): A dictionary containing 'start' and 'end' datetime objects.
       """
-    # Similar logic as in year_cal, but for a specified date range
-    orders = FileHandler.load(table='rent')
-    cars = Car.load_from_db()
-    res = 0
+    # Sum the earnings of the orders picked up within the date range
+    res = get_engine().total(date_d['start'], date_d['end'])
     start_str = dt.strftime(date_d['start'], '%Y-%m-%d')
     end_str = dt.strftime(date_d['end'], '%Y-%m-%d')
 
-    for order in orders:
-        car = [x for x in cars if x.id == int(order[4])][0]
-        pickup_date = dt.strptime(order[1], '%Y-%m-%d %H:%M:%S')
-        if date_d['start'] < pickup_date < date_d['end']:
-            return_date = dt.strptime(order[2], '%Y-%m-%d %H:%M:%S')
-            days = return_date - pickup_date
-            res += rent_cost_general(days, car)
-
     # Print total earnings for the date range
     print('\n', ('*' * 10), f"Earnings between {start_str}-{end_str} are {res} NIS", ('*' * 10))
 
@@ -845,6 +874,22 @@ def yearly_earnings():
     menu_navigator()  # Return to the main menu
 
 
+# PERFORMANCE STATISTICS
+
+
+def show_stats():
+    """
+    Prints the call counts, latencies and rows scanned recorded so far, and writes them to PROFILE_PATH.
+    """
+    print(profiling.summary())
+
+    if profiling.is_enabled():
+        profiling.dump()
+        print(f"\nStatistics written to {PROFILE_PATH}")
+
+    menu_navigator()  # Returning to the main menu
+
+
 def menu_navigator():
     """
     Navigates to different functionalities of the car rental system based on user input from the main menu.
@@ -866,7 +911,12 @@ def menu_navigator():
             order_menu()  # Opens the order submenu for further actions
         case '7':
             yearly_earnings()  # Navigates to calculating yearly earnings
+        case '8':
+            find_cars()  # Lists the cars available for a rental period
+        case '9':
+            show_stats()  # Prints the timings recorded by the profiling module
         case '0':
+            close_connections()  # Closes the database connections
             print('Goodbye!')  # Exits the program
             exit(0)  # Properly exits the application
 
@@ -0,0 +1,390 @@
+import argparse
+import csv
+import hashlib
+import io
+import locale
+import os
+import time
+from datetime import datetime
+from itertools import islice
+from config import DATABASE, MIGRATE_BATCH_SIZE
+from database import get_connection, transaction, get_writer
+from helpers import to_epoch
+import rollup
+import statements
+
+# Journal record types of the CSV deployment's table store: an upsert carries the full row,
+# a tombstone only the key
+UPSERT = 'U'
+TOMBSTONE = 'D'
+
+# Where every table comes from in a CSV deployment's data folder: the file, and its fields
+# in the order of the table's columns. The tables are loaded in this order, parents first.
+SOURCES = {
+    'person': ('person.csv', ('ID', 'First Name', 'Last Name', 'Age', 'Email', 'Phone')),
+    'cars': ('cars.csv', ('Serial', 'Brand', 'Model', 'Year', 'Engine', 'Day Cost', 'KM', 'Owner')),
+    'rent': ('rent.csv', ('ID', 'Pickup Time', 'Return Time', 'Client', 'Car')),
+}
+
+# Columns stored as integers, and rent times, stored as epoch seconds
+INTEGERS = {'person': ('id', 'age'), 'cars': ('year', 'engine', 'day_cost', 'km'), 'rent': ()}
+TIMES = {'person': (), 'cars': (), 'rent': ('pickup', 'return')}
+
+# The CSV deployment's counter of rental IDs
+ID_COUNTER = 'id_counter.txt'
+
+
+def to_row(table, record):
+    """
+    Converts the values of a CSV row to the column values of its table.
+
+    Args:
+        table (str): 'person', 'cars' or 'rent'.
+        record (dict): The CSV row, keyed by field name.
+
+    Returns:
+        tuple: The row, in the table's column order.
+    """
+    row = []
+    for column, field in zip(statements.TABLES[table], SOURCES[table][1]):
+        value = record[field]
+        if column in INTEGERS[table]:
+            value = int(value)
+        elif column in TIMES[table]:
+            value = to_epoch(datetime.fromisoformat(value))
+        row.append(value)
+    return tuple(row)
+
+
+def _stamp(path):
+    # Modification time and size identify the version of a file, as in the CSV table store
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class CsvSource:
+    """
+    The tables of a running CSV deployment, read from its files without locking them.
+
+    Every table is its CSV file plus the journal of the changes appended since the file
+    was last compacted. Journals are only ever appended to, so the changes made after a
+    point are the journal records after a byte offset.
+    """
+
+    def __init__(self, folder):
+        """
+        Args:
+            folder (str): The CSV deployment's data folder, holding cars.csv, person.csv and rent.csv.
+        """
+        self.folder = folder
+
+    def path(self, table):
+        return os.path.join(self.folder, SOURCES[table][0])
+
+    def fieldnames(self, table):
+        # Journal records follow the field order of their CSV file's header
+        try:
+            with open(self.path(table), 'r', newline='') as fh:
+                return next(csv.reader(fh), None) or list(SOURCES[table][1])
+        except FileNotFoundError:
+            return list(SOURCES[table][1])
+
+    def journal(self, table, offset=0):
+        """
+        Reads the complete journal records of a table after a byte offset.
+
+        Args:
+            table (str): 'person', 'cars' or 'rent'.
+            offset (int): Where to start reading.
+
+        Returns:
+            tuple: The records as (type, row or key) pairs, and the offset after the last complete record.
+        """
+        try:
+            with open(self.path(table) + '.journal', 'rb') as fh:
+                fh.seek(offset)
+                data = fh.read()
+        except FileNotFoundError:
+            return [], 0
+
+        # A record still being appended is left for the next read
+        end = data.rfind(b'\n') + 1
+        fieldnames = self.fieldnames(table)
+        records = []
+        # Decoded as open() does by default, the way the CSV deployment writes its files
+        text = data[:end].decode(locale.getpreferredencoding(False))
+        for record in csv.reader(io.StringIO(text, newline='')):
+            if record and record[0] == UPSERT and len(record) == len(fieldnames) + 1:
+                records.append((UPSERT, to_row(table, dict(zip(fieldnames, record[1:])))))
+            elif record and record[0] == TOMBSTONE and len(record) == 2:
+                records.append((TOMBSTONE, record[1]))
+        return records, offset + end
+
+    def rows(self, table):
+        """
+        Streams the current rows of a table: those of the CSV file not changed by the journal,
+        then the journal's latest version of every other row.
+
+        Returns:
+            tuple: A generator of rows in the table's column order, and the journal offset they reflect.
+        """
+        # The journal is read first, so changes appended while the file is read are picked up by the next sync
+        records, offset = self.journal(table)
+        latest = {}
+        for kind, value in records:
+            key = str(value[0]) if kind == UPSERT else value
+            latest[key] = value if kind == UPSERT else None
+
+        def generate():
+            key_field = SOURCES[table][1][0]
+            try:
+                with open(self.path(table), 'r', newline='') as fh:
+                    for record in csv.DictReader(fh):
+                        if record[key_field] not in latest:
+                            yield to_row(table, record)
+            except FileNotFoundError:
+                pass
+            for row in latest.values():
+                if row is not None:
+                    yield row
+
+        return generate(), offset
+
+
+def _batches(rows, size=MIGRATE_BATCH_SIZE):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _upsert_sql(table):
+    columns = statements.TABLES[table]
+    updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) " \
+           f"ON CONFLICT (id) DO UPDATE SET {updates}"
+
+
+def _advance_rent_ids(folder, db):
+    # Orders created in the CSV deployment must never get their IDs again from the id_sequence table
+    conn = get_connection(db)
+    start = conn.execute("SELECT COALESCE(MAX(CAST(id AS INTEGER)) + 1, 0) FROM rent").fetchone()[0]
+    try:
+        with open(os.path.join(folder, ID_COUNTER), 'r') as fh:
+            start = max(start, int(fh.read()))
+    except (FileNotFoundError, ValueError):
+        pass
+    conn.execute("UPDATE id_sequence SET next = MAX(next, ?) WHERE name = 'rent'", (start,))
+
+
+class Migration:
+    """
+    Moves a running CSV deployment to SQLite: a bulk load, then incremental syncs until cutover.
+
+    load() streams the three CSV files into the database in batched transactions, with
+    the secondary indexes dropped during the load and built again after it. The batches
+    are written by the database's writer thread while the next ones are read. sync() then
+    applies the changes the CSV deployment made since: the new journal records of each
+    table, or, if a CSV file was rewritten (its journal compacted), the differences
+    between the whole file and the table. verify() compares the row counts and
+    checksums of both sides.
+
+    Example:
+        migration = Migration(r'C:\\...\\System files')
+        migration.load()
+        migration.follow(interval=5)  # until Ctrl+C, when the CSV deployment is stopped
+        assert migration.verify()['ok']
+    """
+
+    def __init__(self, folder, db=DATABASE):
+        """
+        Args:
+            folder (str): The CSV deployment's data folder.
+            db (str, optional): The database file path. Defaults to DATABASE.
+        """
+        self.source = CsvSource(folder)
+        self.db = db
+        self.state = {}  # table -> (CSV file stamp, journal offset) as of the last load or sync
+
+    def load(self, replace=False):
+        """
+        Loads every table of the CSV deployment into the database.
+
+        Args:
+            replace (bool, optional): Delete the rows the database already holds. Without it,
+                the tables must be empty.
+
+        Returns:
+            dict: Number of rows loaded per table.
+        """
+        conn = get_connection(self.db)
+        tables = tuple(SOURCES)
+        with transaction(self.db):
+            for table in reversed(tables):
+                if replace:
+                    conn.execute(f"DELETE FROM {table}")
+                count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                assert count == 0, f"The {table} table is not empty. Use replace=True, or sync()"
+
+            # Inserting into unindexed tables and indexing once afterwards is much faster
+            placeholders = ', '.join('?' * len(tables))
+            indexes = conn.execute(f"SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+                                   f"AND tbl_name IN ({placeholders})", tables).fetchall()
+            for name, _ in indexes:
+                conn.execute(f"DROP INDEX {name}")
+
+        counts, state = {}, {}
+        writer, written = get_writer(self.db), []
+        try:
+            for table in tables:
+                stamp = _stamp(self.source.path(table))
+                rows, offset = self.source.rows(table)
+                counts[table] = 0
+                for batch in _batches(rows):
+                    written.append(writer.submit(statements.insert_many, table, batch, db=self.db))
+                    counts[table] += len(batch)
+                    # Reading runs at most two batches ahead of the writer, which bounds the memory held
+                    if len(written) > 2:
+                        written.pop(0).result()
+                state[table] = (stamp, offset)
+            for future in written:
+                future.result()
+        finally:
+            # The indexes are built again once the writer is done with every batch
+            for future in written:
+                future.exception()
+            with transaction(self.db):
+                for _, sql in indexes:
+                    conn.execute(sql)
+
+        with transaction(self.db):
+            rollup.rebuild(self.db)
+            _advance_rent_ids(self.source.folder, self.db)
+
+        # Only once every batch is committed, so a failed load is never taken as a starting point by sync()
+        self.state.update(state)
+        return counts
+
+    def _resync(self, conn, table):
+        # Makes a table equal to the whole CSV file, changing only the rows that differ
+        columns = ', '.join(statements.TABLES[table])
+        stored = {str(row[0]): row for row in conn.execute(f"SELECT {columns} FROM {table}")}
+        sql, changes = _upsert_sql(table), 0
+        rows, offset = self.source.rows(table)
+        for row in rows:
+            if stored.pop(str(row[0]), None) != row:
+                conn.execute(sql, row)
+                changes += 1
+
+        for key in stored:
+            conn.execute(f"DELETE FROM {table} WHERE id = ?", (stored[key][0],))
+            changes += 1
+        return changes, offset
+
+    def sync(self):
+        """
+        Applies the changes made to the CSV deployment since the last load or sync, in one transaction.
+
+        Returns:
+            int: The number of rows written or deleted.
+        """
+        conn = get_connection(self.db)
+        changes, state = 0, {}
+        with transaction(self.db):
+            for table in SOURCES:
+                stamp = _stamp(self.source.path(table))
+                last_stamp, offset = self.state.get(table, (None, 0))
+
+                if table not in self.state or stamp != last_stamp:
+                    # The file was rewritten, so the journal records since the last sync may be gone
+                    count, offset = self._resync(conn, table)
+                else:
+                    records, offset = self.source.journal(table, offset)
+                    for kind, value in records:
+                        if kind == UPSERT:
+                            conn.execute(_upsert_sql(table), value)
+                        else:
+                            conn.execute(f"DELETE FROM {table} WHERE id = ?", (value,))
+                    count = len(records)
+
+                state[table] = (stamp, offset)
+                changes += count
+
+            if changes:
+                rollup.rebuild(self.db)
+                _advance_rent_ids(self.source.folder, self.db)
+
+        # The journal offsets move on only with the committed transaction, so records of a failed sync are read again
+        self.state.update(state)
+        return changes
+
+    def follow(self, interval=5.0, until=None):
+        """
+        Syncs every `interval` seconds, until `until()` returns True or on Ctrl+C.
+
+        Args:
+            interval (float, optional): Seconds between syncs. Defaults to 5.
+            until (callable, optional): Called after every sync. Defaults to syncing until Ctrl+C.
+        """
+        try:
+            while True:
+                self.sync()
+                if until is not None and until():
+                    return
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            self.sync()
+
+    def verify(self):
+        """
+        Compares the row count and checksum of every table with its CSV file.
+
+        The checksum is the sum of a hash of every row, so it does not depend on row order.
+
+        Returns:
+            dict: (count, checksum) of both sides per table, and 'ok' if they all match.
+        """
+        def summary(rows):
+            count = checksum = 0
+            for row in rows:
+                digest = hashlib.blake2b('\x1f'.join(map(str, row)).encode(), digest_size=8).digest()
+                checksum = (checksum + int.from_bytes(digest, 'big')) % 2 ** 64
+                count += 1
+            return count, checksum
+
+        report = {}
+        with transaction(self.db, mode='DEFERRED') as conn:
+            for table in SOURCES:
+                csv_rows, _ = self.source.rows(table)
+                db_rows = conn.execute(f"SELECT {', '.join(statements.TABLES[table])} FROM {table}")
+                report[table] = {'csv': summary(csv_rows), 'db': summary(db_rows)}
+
+        report['ok'] = all(sides['csv'] == sides['db'] for sides in report.values())
+        return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Move a CSV deployment's data to the SQLite database.")
+    parser.add_argument('folder', help="The CSV deployment's data folder")
+    parser.add_argument('--db', default=DATABASE)
+    parser.add_argument('--replace', action='store_true', help="Replace the data the database holds")
+    parser.add_argument('--follow', type=float, metavar='SECONDS',
+                        help="Keep syncing the CSV changes every SECONDS until Ctrl+C")
+    args = parser.parse_args()
+
+    migration = Migration(args.folder, args.db)
+    for table, count in migration.load(replace=args.replace).items():
+        print(f"{count} {table} rows loaded")
+    if args.follow:
+        print("Syncing, press Ctrl+C at cutover")
+        migration.follow(args.follow)
+
+    report = migration.verify()
+    for table in SOURCES:
+        print(f"{table}: CSV {report[table]['csv']}, database {report[table]['db']}")
+    print("Verified" if report['ok'] else "MISMATCH")
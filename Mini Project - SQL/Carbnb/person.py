@@ -20,6 +20,8 @@ class Person(FileHandler):
         phone (str): Phone number of the person.
     """
 
+    __slots__ = ('_id', '_f_name', '_l_name', '_age', '_email', '_phone', '_session')
+
     def __init__(self, id_, p_name, l_name, age, email, phone):
         """
         Initializes a new instance of the Person class.
@@ -51,15 +53,14 @@ class Person(FileHandler):
               f"Email: {self._email}\n"
               f"Phone: {self._phone}")
 
-    def obj_to_str(self):
+    def obj_to_tuple(self):
         """
-        Converts the person object's properties to a string format suitable for database storage.
+        Converts the person object's properties to a tuple of values for database storage.
 
         Returns:
-            str: A string representation of the person object's properties.
+            tuple: The person object's properties, in the table's column order.
         """
-        return f"'{self._id}', '{self._f_name}', '{self._l_name}', {self._age}, " \
-               f"'{self._email}', '{self._phone}'"
+        return self._id, self._f_name, self._l_name, self._age, self._email, self._phone
 
     def get_table(self):
         """
@@ -164,6 +165,19 @@ class Person(FileHandler):
 
         self._phone = new_val
 
+    @classmethod
+    def from_row(cls, row):
+        """
+        Creates a Person object from a row of the person table, without validating it again.
+
+        Args:
+            row (tuple): The row, in the table's column order.
+
+        Returns:
+            Person: The person of the row.
+        """
+        return cls._from_values(row)
+
     @classmethod
     def load_from_db(cls):
         """
@@ -174,14 +188,4 @@ class Person(FileHandler):
         """
         client_data = cls.load(table='person')
 
-        objects = []
-        for row in client_data:
-            # Creates Person object for each row in the database and adds it to the list
-            objects.append(cls(id_=row[0],
-                               p_name=row[1],
-                               l_name=row[2],
-                               age=row[3],
-                               email=int(row[4]),
-                               phone=int(row[5])))
-
-        return objects
+        return [cls.from_row(row) for row in client_data]
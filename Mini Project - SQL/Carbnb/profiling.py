@@ -0,0 +1,193 @@
+import atexit
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from config import PROFILE, PROFILE_PATH
+
+# Upper bounds in seconds of the latency histogram buckets. Slower calls fall in a last, open-ended bucket
+BUCKETS = (0.0001, 0.001, 0.01, 0.1, 1.0)
+BUCKET_LABELS = tuple(f"<={bound * 1000:g}ms" for bound in BUCKETS) + (f">{BUCKETS[-1] * 1000:g}ms",)
+
+_stats = {}
+_lock = threading.Lock()
+# Every thread keeps a stack of the rows scanned by each timed call it is inside of
+_local = threading.local()
+_state = {'enabled': PROFILE}
+
+
+class CallStats:
+    """
+    Call count, latencies and rows scanned of one instrumented operation.
+    """
+
+    __slots__ = ('calls', 'total', 'max', 'rows', 'histogram')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def add(self, seconds, rows):
+        self.calls += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.rows += rows
+        self.histogram[bisect_left(BUCKETS, seconds)] += 1
+
+    def as_dict(self):
+        """
+        Returns:
+            dict: The statistics, with times in seconds and the histogram keyed by bucket.
+        """
+        return {'calls': self.calls, 'total': self.total, 'mean': self.total / self.calls if self.calls else 0.0,
+                'max': self.max, 'rows': self.rows, 'histogram': dict(zip(BUCKET_LABELS, self.histogram))}
+
+
+def enable(on=True):
+    """
+    Turns the instrumentation on or off while the application runs.
+
+    Args:
+        on (bool, optional): True to record, False to stop recording. Defaults to True.
+    """
+    _state['enabled'] = on
+
+
+def is_enabled():
+    """
+    Returns:
+        bool: True if the instrumented operations are being recorded.
+    """
+    return _state['enabled']
+
+
+def scanned(rows):
+    """
+    Adds rows to the rows scanned by the innermost timed call of the calling thread.
+
+    Args:
+        rows (int): Number of rows (or bookings) read.
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        stack[-1] += rows
+
+
+@contextmanager
+def timer(name):
+    """
+    Times a block of code and records it under a name, if the instrumentation is on.
+    Rows reported with scanned() inside the block are counted to it.
+
+    Args:
+        name (str): The name of the operation.
+    """
+    if not _state['enabled']:
+        yield
+        return
+
+    stack = _local.__dict__.setdefault('stack', [])
+    stack.append(0)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        rows = stack.pop()
+        with _lock:
+            stats = _stats.get(name)
+            if stats is None:
+                stats = _stats[name] = CallStats()
+            stats.add(seconds, rows)
+
+
+def profiled(name=None, rows=None):
+    """
+    Decorates a function so its calls are timed while the instrumentation is on.
+    While it is off, a call costs one extra check.
+
+    Args:
+        name (str, optional): The name of the operation. Defaults to the function's qualified name.
+        rows (callable, optional): Returns the number of rows scanned from the function's result.
+
+    Returns:
+        The decorator.
+    """
+    def decorate(func):
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state['enabled']:
+                return func(*args, **kwargs)
+
+            with timer(label):
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    scanned(rows(result))
+            return result
+
+        return wrapper
+
+    return decorate
+
+
+def stats():
+    """
+    Returns:
+        dict: The statistics of every operation recorded so far, keyed by name.
+    """
+    with _lock:
+        return {name: calls.as_dict() for name, calls in _stats.items()}
+
+
+def reset():
+    """
+    Forgets every recorded call.
+    """
+    with _lock:
+        _stats.clear()
+
+
+def summary():
+    """
+    Formats the recorded statistics as a table, the operations taking the most time first.
+
+    Returns:
+        str: The table.
+    """
+    rows = sorted(stats().items(), key=lambda item: item[1]['total'], reverse=True)
+    if not rows:
+        return "No calls recorded" + ("" if is_enabled() else " (set CARBNB_PROFILE=1 to turn profiling on)")
+
+    lines = [f"{'Operation':<40} {'Calls':>8} {'Total ms':>10} {'Mean ms':>9} {'Max ms':>9} {'Rows':>9}  "
+             + ' '.join(f"{label:>8}" for label in BUCKET_LABELS)]
+    for name, row in rows:
+        lines.append(f"{name:<40} {row['calls']:>8} {row['total'] * 1000:>10.1f} {row['mean'] * 1000:>9.3f} "
+                     f"{row['max'] * 1000:>9.3f} {row['rows']:>9}  "
+                     + ' '.join(f"{count:>8}" for count in row['histogram'].values()))
+    return '\n'.join(lines)
+
+
+def dump(path=PROFILE_PATH):
+    """
+    Writes the recorded statistics to a JSON file.
+
+    Args:
+        path (str, optional): The file to write. Defaults to PROFILE_PATH.
+    """
+    with open(path, 'w') as fh:
+        json.dump({'written': datetime.now().isoformat(timespec='seconds'), 'operations': stats()}, fh, indent=2)
+
+
+@atexit.register
+def _dump_at_exit():
+    # The statistics of a profiled run are kept when the application exits
+    if _state['enabled'] and _stats:
+        dump()
@@ -1,9 +1,14 @@
 from datetime import datetime
-from config import RENT_ID_COUNTER, RENT_FIELDNAMES
+from config import RENT_FIELDNAMES
 from filehandler import FileHandler
-from helpers import get_by_id, is_available
+from helpers import is_available, to_epoch, from_epoch
+from database import transaction
+import rollup
+import statements
+from sequence import RENT_IDS
 from car import Car
 from person import Person
+from identity import Ref
 
 
 class Rent(FileHandler):
@@ -22,55 +27,39 @@ class Rent(FileHandler):
         client (Person): The client who is renting the car.
     """
 
-    __ID_COUNTER = 0  # A class variable to track the next available ID
+    __slots__ = ('id', '_pickup_time', '_return_time', '_client', '_car', '_session')
 
     def __init__(self, pickup_time, return_time, client, car, id_=0, override=False):
         """
         Initializes a new instance of the Rent class.
 
         Args:
-            pickup_time (str): The pickup time for the rental in 'YYYY-MM-DD HH:MM:SS' format.
-            return_time (str): The return time for the rental in 'YYYY-MM-DD HH:MM:SS' format.
+            pickup_time (str or int): The pickup time for the rental in 'YYYY-MM-DD HH:MM:SS' format,
+                or in epoch seconds as stored in the database.
+            return_time (str or int): The return time for the rental in 'YYYY-MM-DD HH:MM:SS' format,
+                or in epoch seconds as stored in the database.
             client (int): The ID of the client who is renting the car.
             car (int): The ID of the car being rented.
             id_ (int, optional): The ID of the rental order. Default is 0.
-            override (bool, optional): If True, the id_ parameter is used as the ID.
+            override (bool, optional): If True, the id_ parameter is used as the ID. Otherwise a new ID
+                is allocated, in memory from a block of IDs reserved in the database.
         """
         if override:
             self.id = id_
         else:
-            Rent.get_id_counter()
-            self.id = Rent.__ID_COUNTER
-            Rent.__ID_COUNTER += 1
-            Rent.save_id_counter()
+            self.id = RENT_IDS.next_id()
 
         self.car = car
         self.pickup_time = pickup_time
         self.return_time = return_time
         self.client = client
 
-    @staticmethod
-    def get_id_counter():
-        """
-        Reads the current ID counter from a file and updates the class variable.
-        """
-        with open(RENT_ID_COUNTER, 'r') as fh:
-            Rent.__ID_COUNTER = int(fh.read())
-
-    @staticmethod
-    def save_id_counter():
-        """
-        Saves the current ID counter to a file.
-        """
-        with open(RENT_ID_COUNTER, 'w') as fh:
-            fh.write(str(Rent.__ID_COUNTER))
-
-    # Method definitions for obj_to_str, get_table, show, get_fieldnames, get_id
+    # Method definitions for obj_to_tuple, get_table, show, get_fieldnames, get_id
     # and property methods for pickup_time, return_time, car, client are included here.
     # Each property setter includes validation logic to ensure input values meet specific criteria.
 
-    def obj_to_str(self):
-        return f"'{self.id}', '{self._pickup_time}', '{self._return_time}', '{self._client.id}', '{self._car.id}'"
+    def obj_to_tuple(self):
+        return self.id, to_epoch(self._pickup_time), to_epoch(self._return_time), self._client.id, self._car.id
 
     def get_table(self):
         return 'rent'
@@ -95,12 +84,16 @@ class Rent(FileHandler):
 
     @pickup_time.setter
     def pickup_time(self, new_val):
-        assert not any(x.isalpha() for x in new_val), f"Invalid date. " \
-                                                      f"Date ust be in the YYYY-MM-DD format " \
-                                                      f"cannot contain letters or be under 6 " \
-                                                      f"characters"
+        if isinstance(new_val, int):
+            # Times loaded from the database are stored as epoch seconds
+            date_object = from_epoch(new_val)
+        else:
+            assert not any(x.isalpha() for x in new_val), f"Invalid date. " \
+                                                          f"Date ust be in the YYYY-MM-DD format " \
+                                                          f"cannot contain letters or be under 6 " \
+                                                          f"characters"
 
-        date_object = datetime.strptime(new_val, '%Y-%m-%d %H:%M:%S')
+            date_object = datetime.strptime(new_val, '%Y-%m-%d %H:%M:%S')
 
         self._pickup_time = date_object
 
@@ -110,17 +103,21 @@ class Rent(FileHandler):
 
     @return_time.setter
     def return_time(self, new_val):
-        assert not any(x.isalpha() for x in new_val), f"Invalid date. " \
-                                                      f"Date ust be in the YYYY-MM-DD format " \
-                                                      f"cannot contain letters or be under 6 " \
-                                                      f"characters"
+        if isinstance(new_val, int):
+            # Times loaded from the database are stored as epoch seconds
+            date_object = from_epoch(new_val)
+        else:
+            assert not any(x.isalpha() for x in new_val), f"Invalid date. " \
+                                                          f"Date ust be in the YYYY-MM-DD format " \
+                                                          f"cannot contain letters or be under 6 " \
+                                                          f"characters"
 
-        date_object = datetime.strptime(new_val, '%Y-%m-%d %H:%M:%S')
+            date_object = datetime.strptime(new_val, '%Y-%m-%d %H:%M:%S')
 
         self._return_time = date_object
-        assert is_available(self.car.id, self._pickup_time, self._return_time) is False, "Chosen vehicle is already " \
-                                                                                      "booked within the desired time" \
-                                                                                      " frame"
+        assert is_available(self.car.id, self._pickup_time, self._return_time, self.id), "Chosen vehicle is already " \
+                                                                                         "booked within the desired " \
+                                                                                         "time frame"
 
     @property
     def car(self):
@@ -128,15 +125,15 @@ class Rent(FileHandler):
 
     @car.setter
     def car(self, new_val):
-        assert len(new_val) > 6 and not any(x.isalpha() for x in new_val), f"Invalid ID number. " \
-                                                                           f"Number cannot contain letters or be " \
-                                                                           f"under 6 characters"
+        # Only the car's ID is kept. The Car is built through the identity map when it is used
+        if not isinstance(new_val, Ref):
+            assert len(new_val) > 6 and not any(x.isalpha() for x in new_val), f"Invalid ID number. " \
+                                                                               f"Number cannot contain letters or be " \
+                                                                               f"under 6 characters"
+            new_val = Ref('cars', new_val, Car.from_row)
+            assert new_val.resolve() is not None, f"This car Serial Number does not exists in our database"
 
-        row = get_by_id(new_val, table='cars')[0]
-        assert row is not None, f"This car Serial Number does not exists in our database"
-
-        self._car = Car(row[0], row[1], row[2], row[3],
-                        row[4], row[5], row[6], row[7])
+        self._car = new_val
 
     @property
     def client(self):
@@ -144,14 +141,46 @@ class Rent(FileHandler):
 
     @client.setter
     def client(self, new_val):
-        assert len(new_val) > 6 and not any(x.isalpha() for x in new_val), f"Invalid ID number. " \
-                                                                           f"Number cannot contain letters or be " \
-                                                                           f"under 6 characters"
-        row = get_by_id(new_val, table='person')[0]
-        assert row is not None, f"This client ID does not exists in our database"
-
-        self._client = Person(row[0], row[1], row[2], row[3], row[4],
-                              row[5])
+        # Only the client's ID is kept. The Person is built through the identity map when it is used
+        if not isinstance(new_val, Ref):
+            assert len(new_val) > 6 and not any(x.isalpha() for x in new_val), f"Invalid ID number. " \
+                                                                               f"Number cannot contain letters or be " \
+                                                                               f"under 6 characters"
+            new_val = Ref('person', new_val, Person.from_row)
+            assert new_val.resolve() is not None, f"This client ID does not exists in our database"
+
+        self._client = new_val
+
+    # Writes keep the daily revenue rollup in step with the rent table, in the same transaction as the order.
+
+    def _unrecord(self, object_id):
+        # Takes the stored version of the order back out of the rollup
+        row = statements.select_by_id('rent', object_id)
+        if row:
+            rollup.record_order(row[0][1], row[0][2], row[0][4], sign=-1)
+
+    def save(self):
+        pickup, return_ = to_epoch(self._pickup_time), to_epoch(self._return_time)
+        with transaction():
+            super().save()
+            rollup.record_order(pickup, return_, self._car.id)
+
+        return True
+
+    def edit(self, changes: dict, object_id=None):
+        object_id = self.id if object_id is None else object_id
+        pickup, return_ = to_epoch(self._pickup_time), to_epoch(self._return_time)
+        with transaction():
+            self._unrecord(object_id)
+            super().edit(changes, object_id)
+            rollup.record_order(pickup, return_, self._car.id)
+
+        return True
+
+    def delete(self):
+        with transaction():
+            self._unrecord(self.id)
+            super().delete()
 
     def rent_cost(self):
         """
@@ -163,6 +192,22 @@ class Rent(FileHandler):
         days = self._return_time - self._pickup_time
         return days.days * self.car.day_cost
 
+    @classmethod
+    def from_row(cls, row):
+        """
+        Creates a Rent object from a row of the rent table, without validating it again.
+        The car and client are referenced lazily, so no query is made for them.
+
+        Args:
+            row (tuple): The row, in the table's column order.
+
+        Returns:
+            Rent: The rental order of the row.
+        """
+        return cls._from_values((row[0], from_epoch(row[1]), from_epoch(row[2]),
+                                 Ref('person', row[3], Person.from_row),
+                                 Ref('cars', row[4], Car.from_row)))
+
     @classmethod
     def load_from_db(cls):
         """
@@ -173,13 +218,5 @@ class Rent(FileHandler):
         """
         order_data = cls.load(table='rent')
 
-        objects = []
-        for row in order_data:
-            # Creates Rent object for each row in the database and adds it to the list
-            objects.append(cls(pickup_time=row[1],
-                               return_time=row[2],
-                               client=row[3],
-                               car=row[4],
-                               id_=row[0], override=True))
-
-        return objects
+        # A single query: the cars and clients are only loaded if they are used
+        return [cls.from_row(row) for row in order_data]
@@ -0,0 +1,96 @@
+from config import DATABASE
+from database import get_connection, transaction
+from helpers import to_epoch
+from schema import REVENUE_DAILY_ROWS
+from profiling import profiled, scanned
+
+DAY = 86400  # Seconds in a day
+
+# Adds (sign=1) or takes back (sign=-1) the revenue of one order on its pickup day
+ADD_ORDER = """INSERT INTO revenue_daily (day, car, owner, revenue, orders)
+SELECT ? / 86400, id, owner, (? - ?) / 86400 * day_cost * ?, ? FROM cars WHERE id = ?
+ON CONFLICT (day, car, owner) DO UPDATE SET revenue = revenue + excluded.revenue, orders = orders + excluded.orders"""
+DROP_EMPTY_DAY = "DELETE FROM revenue_daily WHERE day = ? / 86400 AND car = ? AND orders <= 0"
+
+CLEAR_CAR = "DELETE FROM revenue_daily WHERE car = ?"
+FILL_CAR = f"INSERT INTO revenue_daily {REVENUE_DAILY_ROWS} WHERE r.car = ? GROUP BY 1, 2, 3"
+
+# The revenue of a period, and the number of rollup rows summed
+DAYS_TOTAL = "SELECT COALESCE(SUM(revenue), 0), COUNT(*) FROM revenue_daily WHERE day BETWEEN ? AND ?"
+DAYS_TOTAL_OF_OWNER = ("SELECT COALESCE(SUM(revenue), 0), COUNT(*) FROM revenue_daily "
+                       "WHERE day BETWEEN ? AND ? AND owner = ?")
+
+
+def record_order(pickup, return_, car, sign=1):
+    """
+    Adds the revenue of an order to the rollup, or takes it back.
+
+    Args:
+        pickup (int): The pickup time of the order, in epoch seconds.
+        return_ (int): The return time of the order, in epoch seconds.
+        car: The ID of the rented car.
+        sign (int, optional): 1 to add the order, -1 to take it back. Defaults to 1.
+    """
+    conn = get_connection()
+    conn.execute(ADD_ORDER, (pickup, return_, pickup, sign, sign, car))
+    if sign < 0:
+        conn.execute(DROP_EMPTY_DAY, (pickup, car))
+
+
+def record_orders(orders):
+    """
+    Adds the revenue of many new orders to the rollup with a single prepared statement.
+
+    Args:
+        orders (iterable): (pickup, return, car) of every order, times in epoch seconds.
+    """
+    get_connection().executemany(ADD_ORDER, ((pickup, return_, pickup, 1, 1, car)
+                                             for pickup, return_, car in orders))
+
+
+def refresh_car(car):
+    """
+    Recomputes the rollup rows of a car from its orders, e.g. after its day cost,
+    owner or ID changed or it was deleted.
+
+    Args:
+        car: The ID of the car.
+    """
+    with transaction() as conn:
+        conn.execute(CLEAR_CAR, (car,))
+        conn.execute(FILL_CAR, (car,))
+
+
+def rebuild(db=DATABASE):
+    """
+    Recomputes the whole rollup from the rent and cars tables.
+
+    Args:
+        db (str, optional): The database file path. Defaults to DATABASE.
+    """
+    with transaction(db) as conn:
+        conn.execute("DELETE FROM revenue_daily")
+        conn.execute(f"INSERT INTO revenue_daily {REVENUE_DAILY_ROWS} GROUP BY 1, 2, 3")
+
+
+@profiled()
+def total(start, end, owner=None):
+    """
+    Sums the revenue of the orders picked up between two dates, both days included.
+
+    Args:
+        start (datetime): The first day of the period.
+        end (datetime): The last day of the period.
+        owner (optional): Only count the cars of this owner.
+
+    Returns:
+        int: The total revenue of the period.
+    """
+    days = (to_epoch(start) // DAY, to_epoch(end) // DAY)
+    if owner is None:
+        res, rows = get_connection().execute(DAYS_TOTAL, days).fetchone()
+    else:
+        res, rows = get_connection().execute(DAYS_TOTAL_OF_OWNER, days + (str(owner),)).fetchone()
+
+    scanned(rows)
+    return res
@@ -0,0 +1,110 @@
+from config import RENT_ID_COUNTER
+
+# Versioned migrations of the database schema.
+# The schema version is kept in SQLite's user_version pragma. Every connection runs
+# migrate() when it is opened, and any migration newer than the database's version
+# is applied inside a single transaction.
+
+
+def _epoch_times_and_indexes(conn):
+    """
+    Stores rent pickup/return times as integer epoch seconds instead of
+    'YYYY-MM-DD HH:MM:SS' text, and adds the indexes used by the availability
+    and order lookups:
+        rent(car, pickup, return, id) - conflict checks for a car, covering the whole query
+        rent(client, pickup)          - a client's (future) orders
+        cars(owner)                   - a person's cars
+    """
+    conn.execute("""CREATE TABLE rent_new (
+    id TEXT PRIMARY KEY,
+    pickup INTEGER NOT NULL,
+    return INTEGER NOT NULL,
+    client TEXT NOT NULL,
+    car TEXT NOT NULL,
+    FOREIGN KEY (client) REFERENCES person (id) ON DELETE CASCADE,
+    FOREIGN KEY (car) REFERENCES cars (id) ON DELETE CASCADE
+)""")
+    # strftime('%s') reads the stored text as UTC, matching helpers.to_epoch
+    conn.execute("INSERT INTO rent_new (id, pickup, return, client, car) "
+                 "SELECT id, CAST(strftime('%s', pickup) AS INTEGER), CAST(strftime('%s', return) AS INTEGER), "
+                 "client, car FROM rent")
+    conn.execute("DROP TABLE rent")
+    conn.execute("ALTER TABLE rent_new RENAME TO rent")
+
+    conn.execute("CREATE INDEX rent_car_pickup_return ON rent (car, pickup, return, id)")
+    conn.execute("CREATE INDEX rent_client_pickup ON rent (client, pickup)")
+    conn.execute("CREATE INDEX cars_owner ON cars (owner)")
+
+
+# Revenue of the orders per pickup day (days since the epoch), car and owner. An order
+# earns its whole rental days times the current day cost of its car.
+REVENUE_DAILY_ROWS = """SELECT r.pickup / 86400, c.id, c.owner, SUM((r.return - r.pickup) / 86400 * c.day_cost), COUNT(*)
+FROM rent r JOIN cars c ON c.id = r.car"""
+
+
+def _revenue_daily(conn):
+    """
+    Adds the revenue_daily rollup, filled from the existing orders. The rent and cars
+    writes keep it up to date from then on (see the rollup module).
+    """
+    conn.execute("""CREATE TABLE revenue_daily (
+    day INTEGER NOT NULL,
+    car TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    revenue INTEGER NOT NULL,
+    orders INTEGER NOT NULL,
+    PRIMARY KEY (day, car, owner)
+) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX revenue_daily_car ON revenue_daily (car)")
+    conn.execute(f"INSERT INTO revenue_daily {REVENUE_DAILY_ROWS} GROUP BY 1, 2, 3")
+
+
+def _id_sequence(conn):
+    """
+    Moves the rental ID counter from id_counter.txt into an id_sequence table, holding
+    the first ID of every sequence that has not been reserved yet (see the sequence module).
+    """
+    conn.execute("CREATE TABLE id_sequence (name TEXT PRIMARY KEY, next INTEGER NOT NULL)")
+
+    # Start past both the counter file and the highest stored order ID
+    start = conn.execute("SELECT COALESCE(MAX(CAST(id AS INTEGER)) + 1, 0) FROM rent").fetchone()[0]
+    try:
+        with open(RENT_ID_COUNTER, 'r') as fh:
+            start = max(start, int(fh.read()))
+    except (FileNotFoundError, ValueError):
+        pass
+
+    conn.execute("INSERT INTO id_sequence (name, next) VALUES ('rent', ?)", (start,))
+
+
+# Migrations in the order they are applied. The schema version of a database is
+# the number of migrations it has been through.
+MIGRATIONS = [
+    _epoch_times_and_indexes,
+    _revenue_daily,
+    _id_sequence,
+]
+
+
+def migrate(conn):
+    """
+    Brings a database up to the latest schema version.
+
+    Args:
+        conn (sqlite3.Connection): An autocommit connection to the database.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRATIONS):
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Read the version again under the write lock, in case another process migrated first
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
@@ -0,0 +1,83 @@
+import threading
+from config import ID_BLOCK_SIZE
+from database import transaction, current_transaction, add_rollback_hook
+
+RESERVE_BLOCK = "UPDATE id_sequence SET next = next + ? WHERE name = ? RETURNING next"
+ADVANCE = "UPDATE id_sequence SET next = MAX(next, ?) WHERE name = ?"
+
+
+class IdAllocator:
+    """
+    Hands out unique IDs from blocks reserved in the id_sequence table.
+
+    Reserving a block moves the sequence forward by the block size in a single
+    write, and the IDs of the block are then handed out from memory. Each thread
+    keeps its own block, because a block reserved inside a transaction only exists
+    once that transaction commits. If it is rolled back, the thread drops the block
+    and reserves a new one, so an ID is never handed out twice.
+    """
+
+    def __init__(self, name, block_size=ID_BLOCK_SIZE):
+        """
+        Args:
+            name (str): The name of the sequence in the id_sequence table.
+            block_size (int, optional): Number of IDs reserved at a time. Defaults to ID_BLOCK_SIZE.
+        """
+        self.name = name
+        self.block_size = block_size
+        self._local = threading.local()
+        add_rollback_hook(self.drop_block)
+
+    def _reserve(self):
+        # A block reserved inside an enclosing transaction only exists once that commits
+        enclosing = current_transaction()
+        with transaction() as conn:
+            end = conn.execute(RESERVE_BLOCK, (self.block_size, self.name)).fetchone()[0]
+
+        self._local.next, self._local.end = end - self.block_size, end
+        self._local.reserved_in = enclosing
+
+    def advance(self, start):
+        """
+        Moves the sequence past IDs that were given out some other way, e.g. the IDs of
+        imported orders, so that they are never handed out again. Inside a transaction(),
+        the sequence moves when it commits.
+
+        Args:
+            start (int): The first ID that may still be handed out.
+        """
+        with transaction() as conn:
+            conn.execute(ADVANCE, (start, self.name))
+
+        # The rest of the thread's block is skipped up to the new start
+        end = getattr(self._local, 'end', 0)
+        self._local.next = max(getattr(self._local, 'next', 0), min(start, end))
+
+    def drop_block(self):
+        """
+        Forgets the calling thread's block if it was reserved inside the transaction being
+        rolled back, so that the next ID comes from a new one. A block reserved in a
+        transaction of its own was committed with it, and is kept.
+        """
+        reserved_in, rolled_back = getattr(self._local, 'reserved_in', None), current_transaction()
+        if reserved_in is not None and rolled_back is not None and reserved_in >= rolled_back:
+            self._local.next = self._local.end = 0
+            self._local.reserved_in = None
+
+    def next_id(self):
+        """
+        Returns a new ID, reserving a new block first if the thread's block is used up.
+
+        Returns:
+            int: An ID that has not been handed out before, by this or any other process.
+        """
+        if getattr(self._local, 'next', 0) >= getattr(self._local, 'end', 0):
+            self._reserve()
+
+        new_id = self._local.next
+        self._local.next += 1
+        return new_id
+
+
+# The allocator of rental order IDs
+RENT_IDS = IdAllocator('rent')
@@ -0,0 +1,157 @@
+import identity
+import statements
+from database import transaction
+from person import Person
+from car import Car
+from rent import Rent
+
+# The table of every entity class a session can load
+ENTITY_TABLES = {Person: 'person', Car: 'cars', Rent: 'rent'}
+
+
+class Session:
+    """
+    A unit of work over the entity objects: one instance per row, with changes written at commit.
+
+    Within a session every row is represented by a single object, whether it is
+    loaded with get() or reached through a reference (a car's owner, an order's car
+    or client), so an edit made through one path is seen through all of them.
+    Setting a public attribute of a loaded object marks it dirty. commit() then
+    writes the new, changed and deleted objects in a single transaction, updating
+    only the columns that changed.
+
+    Example:
+        with Session() as session:
+            car = session.get(Car, 1234567)
+            car.day_cost = 300
+            car.owner.phone = '0501234567'
+        # Both changes are committed when the block exits
+    """
+
+    def __init__(self):
+        self._objects = {}  # (table, ID) -> the session's object of a row
+        self._originals = {}  # id(object) -> the object's column values as last loaded or written
+        self._dirty = {}  # id(object) -> (object, names of the attributes set since the last commit)
+        self._new = []
+        self._deleted = []
+        self._outer = None
+
+    def __enter__(self):
+        # References resolved in the block go through this session
+        self._outer = identity.current_session()
+        identity._local.session = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        identity._local.session = self._outer
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def _attach(self, obj):
+        self._objects[(obj.get_table(), str(obj.get_id()))] = obj
+        self._originals[id(obj)] = obj.obj_to_tuple()
+        obj._session = self
+
+    def load(self, table, object_id, build):
+        """
+        Returns the session's object of a row, building it on first use.
+
+        Args:
+            table (str): The table holding the row.
+            object_id: The ID of the row.
+            build (callable): Builds the object from the row's values, e.g. Car.from_row.
+
+        Returns:
+            The object of the row, or None if there is no row with that ID.
+        """
+        obj = self._objects.get((table, str(object_id)))
+        if obj is None:
+            rows = statements.select_by_id(table, object_id)
+            if not rows:
+                return None
+            obj = build(rows[0])
+            self._attach(obj)
+
+        return obj
+
+    def get(self, cls, object_id):
+        """
+        Returns the session's instance of an entity.
+
+        Args:
+            cls (type): Person, Car or Rent.
+            object_id: The entity's ID.
+
+        Returns:
+            The entity, or None if it does not exist.
+        """
+        return self.load(ENTITY_TABLES[cls], object_id, cls.from_row)
+
+    def add(self, obj):
+        """
+        Adds a new entity to the session. It is inserted at commit.
+        """
+        self._objects[(obj.get_table(), str(obj.get_id()))] = obj
+        self._new.append(obj)
+
+    def delete(self, obj):
+        """
+        Marks an entity of the session for deletion at commit.
+        """
+        self._objects.pop((obj.get_table(), str(obj.get_id())), None)
+        if obj in self._new:
+            self._new.remove(obj)
+        else:
+            self._deleted.append(obj)
+
+    def mark_dirty(self, obj, name):
+        """
+        Records that an attribute of an entity was set. Called by the entities themselves.
+        """
+        self._dirty.setdefault(id(obj), (obj, set()))[1].add(name)
+
+    def dirty_attributes(self, obj):
+        """
+        Returns:
+            set: Names of the attributes of an entity set since the last commit.
+        """
+        return set(self._dirty.get(id(obj), (None, ()))[1])
+
+    def commit(self):
+        """
+        Writes every new, changed and deleted entity of the session in one transaction.
+        """
+        with transaction():
+            for obj in self._new:
+                obj.save()
+
+            for obj, _ in self._dirty.values():
+                original = self._originals.get(id(obj))
+                if original is None:
+                    continue
+
+                # Only the columns whose values differ from the stored row are updated
+                columns = statements.TABLES[obj.get_table()]
+                changes = {column: new for column, old, new in zip(columns, original, obj.obj_to_tuple())
+                           if old != new}
+                if changes:
+                    self._objects.pop((obj.get_table(), str(original[0])), None)
+                    obj.edit(changes, object_id=original[0])
+
+            for obj in self._deleted:
+                obj.delete()
+
+        for obj in self._new + [obj for obj, _ in self._dirty.values()]:
+            self._attach(obj)
+        self._new, self._dirty, self._deleted = [], {}, []
+
+    def rollback(self):
+        """
+        Forgets the session's pending changes and every object it loaded.
+        """
+        for obj in self._objects.values():
+            obj._session = None
+        self._objects, self._originals = {}, {}
+        self._new, self._dirty, self._deleted = [], {}, []
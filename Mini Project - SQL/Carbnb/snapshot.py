@@ -0,0 +1,181 @@
+import threading
+from array import array
+from database import get_connection, transaction, add_rollback_hook
+import statements
+
+# The type of every column of the snapshot tables. 'q' columns are held in 64-bit integer
+# arrays, 'str' columns are dictionary encoded. Pickup and return are epoch seconds.
+COLUMN_TYPES = {
+    'person': {'id': 'q', 'pname': 'str', 'lname': 'str', 'age': 'q', 'email': 'str', 'phone': 'str'},
+    'cars': {'id': 'str', 'brand': 'str', 'model': 'str', 'year': 'q', 'engine': 'q', 'day_cost': 'q',
+             'km': 'q', 'owner': 'str'},
+    'rent': {'id': 'str', 'pickup': 'q', 'return': 'q', 'client': 'str', 'car': 'str'},
+}
+
+
+class StringColumn:
+    """
+    A dictionary-encoded column of strings.
+
+    Every distinct value is stored once, in `values`, and the column itself is an
+    array of integer codes indexing into it. Repeated values such as brands, owners
+    or the car of each order cost one integer per row.
+    """
+
+    def __init__(self, items):
+        """
+        Args:
+            items (iterable): The values of the column, in row order.
+        """
+        self.positions = {}  # value -> code
+        self.values = []  # code -> value
+        self.codes = array('q')
+
+        positions, values = self.positions, self.values
+        for item in items:
+            item = str(item)
+            code = positions.get(item)
+            if code is None:
+                code = positions[item] = len(values)
+                values.append(item)
+            self.codes.append(code)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+    def __iter__(self):
+        values = self.values
+        return (values[code] for code in self.codes)
+
+    def code(self, value):
+        """
+        Returns the code of a value, or -1 if the column does not hold it.
+        """
+        return self.positions.get(str(value), -1)
+
+
+class ColumnTable:
+    """
+    A read-only, column-oriented copy of one table: one array per column.
+    """
+
+    def __init__(self, name, rows):
+        """
+        Args:
+            name (str): The table's name, a key of COLUMN_TYPES.
+            rows (list): The table's rows, in statements.TABLES column order.
+        """
+        self.name = name
+        self.columns = {}
+
+        # zip(*rows) turns the rows into one tuple per column in a single C-level pass
+        values = list(zip(*rows)) or [()] * len(statements.TABLES[name])
+        for column, items in zip(statements.TABLES[name], values):
+            if COLUMN_TYPES[name][column] == 'str':
+                self.columns[column] = StringColumn(items)
+            else:
+                self.columns[column] = array('q', items)
+
+        self._positions = None
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def row(self, i):
+        """
+        Returns:
+            dict: The values of row i, keyed by column name.
+        """
+        return {column: values[i] for column, values in self.columns.items()}
+
+    def position(self, object_id):
+        """
+        Returns the row number of an ID, or -1 if the table has no row with that ID.
+        """
+        if self._positions is None:
+            self._positions = {str(object_id): i for i, object_id in enumerate(self.columns['id'])}
+        return self._positions.get(str(object_id), -1)
+
+
+class Snapshot:
+    """
+    A read-only, columnar copy of the cars, person and rent tables for reporting.
+
+    Attributes:
+        cars (ColumnTable): The cars table.
+        person (ColumnTable): The person table.
+        rent (ColumnTable): The rent table.
+    """
+
+    def __init__(self, tables):
+        """
+        Args:
+            tables (dict): Rows of every table in COLUMN_TYPES, keyed by table name.
+        """
+        self.cars = ColumnTable('cars', tables['cars'])
+        self.person = ColumnTable('person', tables['person'])
+        self.rent = ColumnTable('rent', tables['rent'])
+
+    def rent_car_positions(self):
+        """
+        Returns:
+            array: For every order, the row number of its car in the cars table, or -1 if the car is gone.
+        """
+        # Resolve each distinct car once, then map the order codes through the result
+        by_code = [self.cars.position(car) for car in self.rent['car'].values]
+        return array('q', (by_code[code] for code in self.rent['car'].codes))
+
+
+def load_snapshot():
+    """
+    Reads the cars, person and rent tables into a new Snapshot, in a single read transaction.
+
+    Returns:
+        Snapshot: The snapshot of the current data.
+    """
+    # All three tables are read from the same version of the database
+    with transaction(mode='DEFERRED'):
+        tables = {table: statements.select_all(table) for table in COLUMN_TYPES}
+
+    return Snapshot(tables)
+
+
+# The last snapshot of every thread, read through the thread's own connection
+_cache = threading.local()
+
+
+def get_snapshot():
+    """
+    Returns a Snapshot of the current data, reusing the calling thread's last one while the
+    database has not changed.
+
+    Returns:
+        Snapshot: The snapshot of the current data.
+    """
+    conn = get_connection()
+    # data_version moves when other connections commit, total_changes when this one writes
+    version = (id(conn), conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+
+    if version != getattr(_cache, 'version', None):
+        _cache.snapshot = load_snapshot()
+        _cache.version = version
+
+    return _cache.snapshot
+
+
+def invalidate():
+    """
+    Drops the calling thread's cached snapshot, so its next get_snapshot reads the tables again.
+    """
+    _cache.version = _cache.snapshot = None
+
+
+# A rollback leaves data_version and total_changes as they were, so a snapshot read inside
+# the rolled back transaction would otherwise be served after it
+add_rollback_hook(invalidate)
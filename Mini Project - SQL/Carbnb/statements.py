@@ -0,0 +1,128 @@
+from functools import lru_cache
+from typing import Any
+from config import DATABASE
+from database import get_connection
+
+# Columns of every table the entity classes work with, in storage order.
+# Table and column names cannot be bound as parameters, so only names listed
+# here are ever put into the text of a statement.
+TABLES = {
+    'person': ('id', 'pname', 'lname', 'age', 'email', 'phone'),
+    'cars': ('id', 'brand', 'model', 'year', 'engine', 'day_cost', 'km', 'owner'),
+    'rent': ('id', 'pickup', 'return', 'client', 'car'),
+}
+
+
+def _columns(table: str, columns) -> tuple:
+    # Rejects any table or column name that is not part of the schema
+    assert table in TABLES, f"Unknown table: {table}"
+    for column in columns:
+        assert column in TABLES[table], f"Unknown column for {table}: {column}"
+    return tuple(columns)
+
+
+# Statement texts are built once per shape and reused, so every call with the same
+# shape hits the connection's cache of compiled statements instead of re-parsing.
+
+@lru_cache(maxsize=None)
+def _select_sql(table: str, where: tuple = ()) -> str:
+    sql = f"SELECT {', '.join(TABLES[table])} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(f"{column} = ?" for column in _columns(table, where))
+    return sql
+
+
+@lru_cache(maxsize=None)
+def _insert_sql(table: str) -> str:
+    columns = _columns(table, TABLES[table])
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+
+@lru_cache(maxsize=None)
+def _update_sql(table: str, columns: tuple) -> str:
+    assignments = ", ".join(f"{column} = ?" for column in _columns(table, columns))
+    return f"UPDATE {table} SET {assignments} WHERE id = ?"
+
+
+@lru_cache(maxsize=None)
+def _delete_sql(table: str) -> str:
+    _columns(table, ())
+    return f"DELETE FROM {table} WHERE id = ?"
+
+
+def execute(sql: str, params: tuple = (), db: str = DATABASE) -> list:
+    """
+    Executes a parameterized statement and returns all its result rows.
+
+    Args:
+        sql (str): The statement, with ? placeholders for every value.
+        params (tuple, optional): The values bound to the placeholders.
+        db (str, optional): The database file path. Defaults to DATABASE.
+
+    Returns:
+        list: The result rows as tuples. Empty for statements that return no rows.
+    """
+    return get_connection(db).execute(sql, params).fetchall()
+
+
+def select_all(table: str) -> list:
+    """
+    Returns every row of a table.
+    """
+    return execute(_select_sql(table))
+
+
+def select_by_id(table: str, object_id: Any) -> list:
+    """
+    Returns the rows of a table whose id matches the given ID (at most one row).
+    """
+    return execute(_select_sql(table, ('id',)), (object_id,))
+
+
+def select_where(table: str, **conditions: Any) -> list:
+    """
+    Returns the rows of a table whose columns equal all the given values.
+
+    Example:
+        select_where('cars', owner=123456789)
+    """
+    columns = tuple(sorted(conditions))
+    return execute(_select_sql(table, columns), tuple(conditions[c] for c in columns))
+
+
+def insert(table: str, values: tuple) -> None:
+    """
+    Inserts a row holding a value for every column of the table, in storage order.
+    """
+    execute(_insert_sql(table), tuple(values))
+
+
+def insert_many(table: str, rows, db: str = DATABASE) -> None:
+    """
+    Inserts many rows with a single prepared statement, each holding a value for every
+    column of the table, in storage order.
+    """
+    get_connection(db).executemany(_insert_sql(table), rows)
+
+
+def update(table: str, object_id: Any, changes: dict) -> None:
+    """
+    Sets the given columns of the row with the given ID.
+
+    Args:
+        table (str): The table holding the row.
+        object_id: The current ID of the row.
+        changes (dict): New values keyed by column name.
+    """
+    if not changes:
+        return
+
+    columns = tuple(sorted(changes))
+    execute(_update_sql(table, columns), tuple(changes[c] for c in columns) + (object_id,))
+
+
+def delete(table: str, object_id: Any) -> None:
+    """
+    Deletes the row with the given ID.
+    """
+    execute(_delete_sql(table), (object_id,))
@@ -0,0 +1,234 @@
+from abc import ABCMeta, abstractmethod
+from config import DATABASE
+from database import get_connection, transaction
+from identity import IDENTITY
+import statements
+
+
+class StorageEngine(metaclass=ABCMeta):
+    """
+    The interface every storage backend implements, so the entity classes and the menus
+    work the same whatever keeps their rows.
+
+    Rows are tuples in the column order of statements.TABLES, addressed by entity
+    ('person', 'cars' or 'rent') and key (the first column). The batch methods are the
+    primitives; the single-row ones are built on them. scan() walks the rows in key
+    order: numeric for person IDs, text order for car and order IDs, as SQLite sorts them.
+
+    Methods:
+        get_many: Rows of many keys.
+        put_many: Inserts or replaces many rows.
+        delete_many: Deletes the rows of many keys.
+        scan: Rows within a key range, in key order.
+        count: Number of rows of an entity.
+    """
+
+    @abstractmethod
+    def get_many(self, entity, keys):
+        """
+        Returns the rows of many keys.
+
+        Args:
+            entity (str): 'person', 'cars' or 'rent'.
+            keys (iterable): The keys to look up.
+
+        Returns:
+            dict: The row of every key that exists, keyed by the key as a string.
+        """
+
+    @abstractmethod
+    def put_many(self, entity, rows):
+        """
+        Inserts many rows, replacing the stored rows with the same keys.
+        """
+
+    @abstractmethod
+    def delete_many(self, entity, keys):
+        """
+        Deletes the rows of many keys. Keys that do not exist are ignored.
+        """
+
+    @abstractmethod
+    def scan(self, entity, start=None, end=None):
+        """
+        Iterates over the rows whose key is within a range, in key order.
+
+        Args:
+            entity (str): 'person', 'cars' or 'rent'.
+            start (optional): The smallest key included. Defaults to the first row.
+            end (optional): The first key past the range. Defaults to past the last row.
+
+        Yields:
+            tuple: The rows.
+        """
+
+    @abstractmethod
+    def count(self, entity):
+        """
+        Returns the number of rows of an entity.
+        """
+
+    def get(self, entity, key):
+        """
+        Returns the row of a key, or None if it does not exist.
+        """
+        return self.get_many(entity, [key]).get(str(key))
+
+    def put(self, entity, row):
+        """
+        Inserts a row, replacing the stored row with the same key.
+        """
+        self.put_many(entity, [row])
+
+    def delete(self, entity, key):
+        """
+        Deletes the row of a key, if it exists.
+        """
+        self.delete_many(entity, [key])
+
+    def update(self, entity, key, changes):
+        """
+        Sets some columns of a stored row, possibly including its key.
+
+        Args:
+            entity (str): 'person', 'cars' or 'rent'.
+            key: The key the row is stored under.
+            changes (dict): New values keyed by column name.
+        """
+        row = self.get(entity, key)
+        assert row is not None, f"ID {key} does not exist in {entity}"
+        values = dict(zip(statements.TABLES[entity], row))
+        values.update(changes)
+        if str(values['id']) != str(key):
+            self.delete(entity, key)
+        self.put(entity, tuple(values[column] for column in statements.TABLES[entity]))
+
+
+class SqliteEngine(StorageEngine):
+    """
+    The SQLite database, through the shared per-thread connections.
+    """
+
+    def __init__(self, db=DATABASE):
+        """
+        Args:
+            db (str, optional): The database file path. Defaults to DATABASE.
+        """
+        self.db = db
+
+    def get_many(self, entity, keys):
+        keys = list(keys)
+        columns = ', '.join(statements.TABLES[entity])
+        rows = {}
+        conn = get_connection(self.db)
+        # SQLite limits the number of parameters of a statement, so the keys are looked up in chunks
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            sql = f"SELECT {columns} FROM {entity} WHERE id IN ({', '.join('?' * len(chunk))})"
+            for row in conn.execute(sql, chunk):
+                rows[str(row[0])] = row
+        return rows
+
+    def put_many(self, entity, rows):
+        rows = list(rows)
+        columns = statements.TABLES[entity]
+        sql = f"INSERT OR REPLACE INTO {entity} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        with transaction(self.db) as conn:
+            conn.executemany(sql, rows)
+        self._written(entity, [row[0] for row in rows])
+
+    def delete_many(self, entity, keys):
+        keys = list(keys)
+        with transaction(self.db) as conn:
+            conn.executemany(f"DELETE FROM {entity} WHERE id = ?", ((key,) for key in keys))
+        self._written(entity, keys)
+
+    def update(self, entity, key, changes):
+        statements.update(entity, key, changes)
+        self._written(entity, [key, changes.get('id', key)])
+
+    def _written(self, entity, keys):
+        # The shared objects of the rows this connection wrote are built again on their next use
+        if self.db == DATABASE:
+            IDENTITY.discard(entity, keys)
+
+    def scan(self, entity, start=None, end=None):
+        assert entity in statements.TABLES, f"Unknown entity: {entity}"
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("id >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("id < ?")
+            params.append(end)
+
+        sql = f"SELECT {', '.join(statements.TABLES[entity])} FROM {entity}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        # The cursor yields the rows as SQLite steps through the primary key, without fetching them all
+        return get_connection(self.db).execute(sql + " ORDER BY id", params)
+
+    def count(self, entity):
+        assert entity in statements.TABLES, f"Unknown entity: {entity}"
+        return get_connection(self.db).execute(f"SELECT COUNT(*) FROM {entity}").fetchone()[0]
+
+
+class MemoryEngine(StorageEngine):
+    """
+    Rows kept in dictionaries only, for tests and for benchmarking the other engines against.
+
+    The availability checks, revenue rollup, identity map and snapshots read the
+    database directly, so they do not see the rows of this engine.
+    """
+
+    def __init__(self):
+        self._rows = {entity: {} for entity in statements.TABLES}
+
+    def get_many(self, entity, keys):
+        rows = self._rows[entity]
+        return {str(key): rows[str(key)] for key in keys if str(key) in rows}
+
+    def put_many(self, entity, rows):
+        stored = self._rows[entity]
+        for row in rows:
+            stored[str(row[0])] = tuple(row)
+
+    def delete_many(self, entity, keys):
+        stored = self._rows[entity]
+        for key in keys:
+            stored.pop(str(key), None)
+
+    def scan(self, entity, start=None, end=None):
+        # Sorted on the stored key values, so keys compare as they do in SQLite
+        for row in sorted(self._rows[entity].values(), key=lambda row: row[0]):
+            if (start is None or row[0] >= start) and (end is None or row[0] < end):
+                yield row
+
+    def count(self, entity):
+        return len(self._rows[entity])
+
+
+_engine = SqliteEngine()
+
+
+def get_engine():
+    """
+    Returns:
+        StorageEngine: The engine the entity classes store their rows in.
+    """
+    return _engine
+
+
+def set_engine(engine):
+    """
+    Makes the entity classes store their rows in another engine.
+
+    Args:
+        engine (StorageEngine): The new engine.
+
+    Returns:
+        StorageEngine: The previous engine, so it can be put back.
+    """
+    global _engine
+    previous, _engine = _engine, engine
+    return previous
@@ -0,0 +1,101 @@
+import random
+from array import array
+from datetime import datetime as dt, timedelta
+
+# Shares of the generated rows that are persons and cars. The rest are rental orders
+PERSON_SHARE = 0.1
+CAR_SHARE = 0.1
+
+# Names the persons and cars are drawn from
+FIRST_NAMES = ('Noa', 'Ariel', 'Yael', 'Itai', 'Maya', 'Omer', 'Tamar', 'Eitan', 'Shira', 'Daniel')
+LAST_NAMES = ('Cohen', 'Levi', 'Mizrahi', 'Peretz', 'Biton', 'Dahan', 'Avraham', 'Friedman', 'Katz', 'Azulay')
+MODELS = {'Toyota': ('Corolla', 'Yaris', 'Camry'), 'Hyundai': ('Tucson', 'Elantra', 'Ioniq'),
+          'Kia': ('Picanto', 'Sportage', 'Niro'), 'Mazda': ('Mazda3', 'CX-5', 'MX-5'),
+          'Skoda': ('Octavia', 'Fabia', 'Kodiaq')}
+
+
+class SyntheticData:
+    """
+    Generates the rows of a dataset of a given size, always the same for the same seed.
+
+    Person IDs start at 100000000 and car IDs at 1000000, so they pass the entity
+    validation. Order IDs count from 0, like the id_sequence table. Every car's orders
+    follow each other with a gap, so no two orders of a car overlap, and each order
+    lasts whole days.
+    """
+
+    def __init__(self, rows, seed=0, start=dt(2090, 1, 1)):
+        """
+        Args:
+            rows (int): Total number of rows, split between persons, cars and orders.
+            seed (optional): The seed of the random generators. Defaults to 0.
+            start (datetime, optional): The earliest pickup time. Defaults to 2090-01-01, so every
+                order is still open.
+        """
+        self.seed = seed
+        self.start = start
+        self.person_count = max(1, int(rows * PERSON_SHARE))
+        self.car_count = max(1, int(rows * CAR_SHARE))
+        self.order_count = max(0, rows - self.person_count - self.car_count)
+        self.end = start  # The latest return time, known once the orders are generated
+
+    def _random(self, stream):
+        # Every kind of row has its own generator, so each can be produced on its own
+        return random.Random(f"{self.seed}:{stream}")
+
+    def person_id(self, i):
+        """
+        Returns the ID of the i-th person.
+        """
+        return 100000000 + i
+
+    def car_id(self, i):
+        """
+        Returns the ID of the i-th car.
+        """
+        return 1000000 + i
+
+    def persons(self):
+        """
+        Yields:
+            tuple: (id, first name, last name, age, email, phone) of every person.
+        """
+        rng = self._random('person')
+        for i in range(self.person_count):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            yield (self.person_id(i), first, last, rng.randint(18, 90), f"{first}.{last}{i}@example.com".lower(),
+                   f"05{rng.randrange(10 ** 8):08d}")
+
+    def cars(self):
+        """
+        Yields:
+            tuple: (id, brand, model, year, engine, day cost, km, owner ID) of every car.
+        """
+        rng = self._random('cars')
+        brands = sorted(MODELS)
+        for i in range(self.car_count):
+            brand = rng.choice(brands)
+            yield (self.car_id(i), brand, rng.choice(MODELS[brand]), rng.randint(2005, 2024),
+                   rng.choice((1000, 1200, 1400, 1600, 2000, 2500)), rng.randrange(100, 1000, 10),
+                   rng.randrange(200000), self.person_id(rng.randrange(self.person_count)))
+
+    def orders(self):
+        """
+        Yields:
+            tuple: (id, pickup time, return time, client ID, car ID) of every order, with
+                the times as datetimes.
+        """
+        rng = self._random('rent')
+        # Hours from the start to the latest return time of every car
+        free_from = array('q', bytes(8 * self.car_count))
+        latest = 0
+        for i in range(self.order_count):
+            car = rng.randrange(self.car_count)
+            pickup = free_from[car] + rng.randint(1, 72)
+            ret = pickup + 24 * rng.randint(1, 14)
+            free_from[car] = ret
+            latest = max(latest, ret)
+            yield (i, self.start + timedelta(hours=pickup), self.start + timedelta(hours=ret),
+                   self.person_id(rng.randrange(self.person_count)), self.car_id(car))
+
+        self.end = self.start + timedelta(hours=latest)
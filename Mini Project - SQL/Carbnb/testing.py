@@ -2,6 +2,36 @@ import unittest
 from rent import Rent
 from car import Car
 from person import Person
+from database import transaction
+from helpers import get_orders, to_epoch, is_available
+from datetime import datetime
+import rollup
+from sequence import IdAllocator
+from identity import Ref, IDENTITY
+import availability
+from database import get_connection, close_connections, Writer
+from session import Session
+from helpers import get_by_id
+from snapshot import get_snapshot
+import earnings
+from array import array
+import importer
+import export
+import gzip
+import json
+import sqlite3
+from migrate import Migration
+import storage
+import statements
+from synthetic import SyntheticData
+import profiling
+import logqueue
+from helpers import auto_log
+import audit
+import os
+import threading
+import tempfile
+from unittest.mock import patch
 
 
 class MyTestCase(unittest.TestCase):
@@ -103,6 +133,587 @@ class MyTestCase(unittest.TestCase):
         c.delete()
         p.delete()
 
+    def test_transaction_rollback(self):
+        # save a person inside a failing transaction and make sure nothing was committed
+        p = Person(id_=987654321, p_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        with self.assertRaises(AssertionError):
+            with transaction():
+                p.save()
+                self.assertEqual(len(p.check_id()), 1, "Object visible inside the transaction")
+                raise AssertionError("Abort")
+
+        self.assertEqual(p.check_id(), [], "Object rolled back")
+
+    def test_availability(self):
+        # book a car, make sure overlapping bookings fail and the stored order does not conflict with itself
+        p = Person(id_=987654321, p_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        c = Car(id_=987654321, brand='Test', model='Testing', year=2023,
+                engine=1600, day_cost=600, km=2000, owner='987654321')
+        c.save()
+        r = Rent(pickup_time='2090-01-10 00:00:00', return_time='2090-01-20 00:00:00',
+                 client='987654321', car='987654321', id_=98765, override=True)
+        r.save()
+
+        with self.assertRaises(AssertionError):
+            Rent(pickup_time='2090-01-01 00:00:00', return_time='2090-01-30 00:00:00',
+                 client='987654321', car='987654321', id_=98766, override=True)
+
+        stored = Rent(pickup_time=r.obj_to_tuple()[1], return_time=r.obj_to_tuple()[2],
+                      client='987654321', car='987654321', id_=98765, override=True)
+        self.assertEqual(stored.pickup_time, r.pickup_time)
+        self.assertEqual(len(get_orders(p, future_orders=True)), 1)
+        self.assertEqual(len(get_orders(c, future_orders=True)), 1)
+
+        r.delete()
+        c.delete()
+        p.delete()
+
+    def test_revenue_rollup(self):
+        # make sure order and car writes keep the daily revenue rollup in step
+        year = (datetime(2091, 1, 1), datetime(2091, 12, 31))
+        p = Person(id_=987654321, p_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        c = Car(id_=987654321, brand='Test', model='Testing', year=2023,
+                engine=1600, day_cost=600, km=2000, owner='987654321')
+        c.save()
+        r = Rent(pickup_time='2091-01-10 00:00:00', return_time='2091-01-20 00:00:00',
+                 client='987654321', car='987654321', id_=98765, override=True)
+        r.save()
+        self.assertEqual(rollup.total(*year), 6000)
+        self.assertEqual(rollup.total(datetime(2091, 1, 10), datetime(2091, 1, 10), owner=987654321), 6000)
+
+        r.pickup_time = '2091-01-15 00:00:00'
+        r.edit({'pickup': to_epoch(r.pickup_time)})
+        self.assertEqual(rollup.total(*year), 3000)
+        self.assertEqual(rollup.total(datetime(2091, 1, 10), datetime(2091, 1, 14)), 0)
+
+        c.day_cost = 100
+        c.edit({'day_cost': 100})
+        self.assertEqual(rollup.total(*year), 500)
+
+        r.delete()
+        self.assertEqual(rollup.total(*year), 0)
+        c.delete()
+        p.delete()
+
+    def test_id_sequence(self):
+        # two allocators sharing the rent sequence, as in two processes, never hand out the same ID
+        first, second = IdAllocator('rent', block_size=10), IdAllocator('rent', block_size=10)
+        ids = [allocator.next_id() for _ in range(15) for allocator in (first, second)]
+        self.assertEqual(len(set(ids)), len(ids))
+
+        # a block reserved in a rolled back transaction is dropped with it
+        with self.assertRaises(RuntimeError):
+            with transaction():
+                third = IdAllocator('rent', block_size=10)
+                third.next_id()
+                raise RuntimeError
+        fourth = IdAllocator('rent', block_size=10)
+        fourth_ids = [fourth.next_id() for _ in range(2)]
+        self.assertNotIn(third.next_id(), ids + fourth_ids)
+
+        # a block reserved in a transaction of its own is kept through a later rollback
+        kept = first.next_id()
+        with self.assertRaises(RuntimeError):
+            with transaction():
+                raise RuntimeError
+        self.assertEqual(first.next_id(), kept + 1)
+
+    def test_lazy_references(self):
+        # loading cars makes a single query, and owners are loaded once, on first use
+        p = Person(id_=987654321, p_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        for serial in (9876543, 9876544):
+            Car(id_=serial, brand='Test', model='Testing', year=2023,
+                engine=1600, day_cost=600, km=2000, owner='987654321').save()
+
+        queries = []
+        get_connection().set_trace_callback(queries.append)
+        cars = [c for c in Car.load_from_db() if c.owner.id == '987654321']
+        self.assertEqual(len([q for q in queries if q.startswith('SELECT')]), 1)
+        get_connection().set_trace_callback(None)
+
+        self.assertEqual(len(cars), 2)
+        self.assertIsInstance(cars[0].owner, Ref)
+        self.assertEqual(cars[0].owner.l_name, 'Testing')
+        self.assertIs(cars[0].owner.resolve(), cars[1].owner.resolve())
+
+        for c in cars:
+            c.delete()
+        p.delete()
+
+    def test_session(self):
+        # one instance per row within a session, and the edits are written at commit
+        p = Person(id_=987654321, p_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        Car(id_=9876543, brand='Test', model='Testing', year=2023,
+            engine=1600, day_cost=600, km=2000, owner='987654321').save()
+
+        with Session() as session:
+            car = session.get(Car, 9876543)
+            owner = session.get(Person, 987654321)
+            self.assertIs(car.owner.resolve(), owner)
+
+            car.day_cost = 300
+            car.owner.l_name = 'Edited'
+            self.assertEqual(owner.l_name, 'Edited')
+            self.assertEqual(session.dirty_attributes(car), {'day_cost'})
+            self.assertEqual(get_by_id(9876543, table='cars')[0][5], 600)
+
+        self.assertEqual(get_by_id(9876543, table='cars')[0][5], 300)
+        self.assertEqual(get_by_id(987654321, table='person')[0][2], 'Edited')
+
+        with Session() as session:
+            session.delete(session.get(Car, 9876543))
+        self.assertEqual(Car.check_id(table='cars', object_id=9876543), [])
+        p.delete()
+
+    def test_from_row(self):
+        # stored rows are rebuilt into slotted objects without running the setters
+        row = ('987654321', 'Test', 'Testing', 20, 'mashu@mashu.com', '0501234567')
+        p = Person.from_row(row)
+        self.assertEqual(p.obj_to_tuple(), row)
+        self.assertFalse(hasattr(p, '__dict__'))
+
+        r = Rent.from_row(('98765', 3786912000, 3787776000, '987654321', '9876543'))
+        self.assertEqual(r.obj_to_tuple(), ('98765', 3786912000, 3787776000, '987654321', '9876543'))
+        self.assertEqual(r.pickup_time, datetime(2090, 1, 1))
+
+    def test_snapshot(self):
+        # the snapshot holds one array per column, with repeated strings stored once
+        p = Person(id_=987654321, p_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        cars = [Car(id_=serial, brand='Test', model='Testing', year=2023,
+                    engine=1600, day_cost=600, km=2000, owner='987654321') for serial in (9876543, 9876544)]
+        for c in cars:
+            c.save()
+        r = Rent(pickup_time='2091-01-10 00:00:00', return_time='2091-01-20 00:00:00',
+                 client='987654321', car='9876543', id_=98765, override=True)
+        r.save()
+
+        snapshot = get_snapshot()
+        self.assertIs(get_snapshot(), snapshot)
+        first, second = snapshot.cars.position(9876543), snapshot.cars.position(9876544)
+        self.assertEqual(snapshot.cars['day_cost'][first], 600)
+        self.assertEqual(snapshot.cars['owner'].codes[first], snapshot.cars['owner'].codes[second])
+        self.assertEqual(snapshot.cars.row(second)['brand'], 'Test')
+        order = snapshot.rent.position(98765)
+        self.assertEqual(snapshot.rent['pickup'][order], to_epoch(datetime(2091, 1, 10)))
+        self.assertEqual(snapshot.rent_car_positions()[order], first)
+        self.assertEqual(earnings.get_engine().total(datetime(2091, 1, 1), datetime(2091, 12, 31)), 6000)
+
+        # a snapshot read inside a rolled back transaction is not served after it
+        with self.assertRaises(ZeroDivisionError):
+            with transaction() as conn:
+                conn.execute("UPDATE cars SET day_cost = 999 WHERE id = ?", (9876543,))
+                self.assertEqual(get_snapshot().cars['day_cost'][first], 999)
+                1 / 0
+        self.assertEqual(get_snapshot().cars['day_cost'][first], 600)
+
+        r.delete()
+        self.assertIsNot(get_snapshot(), snapshot)
+        for c in cars:
+            c.delete()
+        p.delete()
+
+    def test_earnings(self):
+        # an order counts whole in the period it is picked up in, and the period's ends are left out unless inclusive
+        start, end = datetime(2091, 1, 1), datetime(2091, 2, 1)
+        pickups = array('q', (to_epoch(time) for time in (datetime(2090, 12, 25), start, datetime(2091, 1, 10),
+                                                          datetime(2091, 1, 15), datetime(2091, 1, 28), end)))
+        returns = array('q', (pickup + 10 * 86400 for pickup in pickups))
+        engine = earnings.EarningsEngine(pickups, returns, array('q', [0, 0, 1, -1, 0, 0]), array('q', [100, 300]))
+
+        self.assertEqual(engine.total(start, end), 4000)
+        self.assertEqual(engine.total(start, end, inclusive=True), 6000)
+        self.assertEqual(engine.total(datetime(2090, 12, 1), start), 1000)
+        self.assertEqual(engine.total(end, start), 0)
+
+    def test_availability_bounds(self):
+        # a booking conflicts with a period it overlaps or touches, and the order being edited is left out
+        p = Person(id_=987654321, p_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        c = Car(id_=9876543, brand='Test', model='Testing', year=2023,
+                engine=1600, day_cost=100, km=2000, owner='987654321')
+        c.save()
+        orders = [Rent(pickup_time=f'2091-01-{day:02} 00:00:00', return_time=f'2091-01-{day + 4:02} 00:00:00',
+                       client='987654321', car='9876543', id_=98765 + i, override=True) for i, day in enumerate((10, 20))]
+        for r in orders:
+            r.save()
+        try:
+            self.assertFalse(is_available(9876543, datetime(2091, 1, 14), datetime(2091, 1, 16)))
+            self.assertTrue(is_available(9876543, datetime(2091, 1, 15), datetime(2091, 1, 19)))
+            self.assertFalse(is_available(9876543, datetime(2091, 1, 22), datetime(2091, 1, 30)))
+            self.assertTrue(is_available(9876543, datetime(2091, 1, 21), datetime(2091, 1, 30), order_id=98766))
+            self.assertFalse(is_available(9876543, datetime(2091, 1, 12), datetime(2091, 1, 30), order_id=98766))
+            self.assertTrue(is_available(9876544, datetime(2091, 1, 12), datetime(2091, 1, 30)))
+        finally:
+            for r in orders:
+                r.delete()
+            c.delete()
+            p.delete()
+
+    def test_import(self):
+        # a bulk import writes every table in one go, or nothing if a row is rejected
+        files = {'persons': 'id,pname,lname,age,email,phone\n'
+                            '987654321,Test,Testing,20,mashu@mashu.com,0501234567\n',
+                 'cars': 'id,brand,model,year,engine,day_cost,km,owner\n'
+                         '9876543,Test,Testing,2023,1600,600,2000,987654321\n'
+                         '9876544,Test,Testing,2023,1600,600,2000,987654321\n',
+                 'orders': 'id,pickup,return,client,car\n'
+                           '98765,2091-01-10 00:00:00,2091-01-20 00:00:00,987654321,9876543\n'
+                           '98766,2091-01-15 00:00:00,2091-01-25 00:00:00,987654321,9876543\n'}
+        with tempfile.TemporaryDirectory() as folder:
+            paths = {}
+            for name, text in files.items():
+                paths[name] = os.path.join(folder, name + '.csv')
+                with open(paths[name], 'w') as fh:
+                    fh.write(text)
+
+            result = importer.import_files(**paths)
+            self.assertEqual([(e[0], e[1]) for e in result.errors], [('rent', 3)])
+            self.assertEqual(Car.check_id(table='cars', object_id=9876543), [])
+
+            with open(paths['orders'], 'w') as fh:
+                fh.write(files['orders'].replace('98766,2091-01-15 00:00:00,2091-01-25', '98766,2091-01-25 00:00:00,2091-01-30'))
+            result = importer.import_files(**paths)
+            self.assertTrue(result.ok)
+            self.assertEqual(result.counts, {'person': 1, 'cars': 2, 'rent': 2})
+
+        self.assertEqual(rollup.total(datetime(2091, 1, 1), datetime(2091, 12, 31)), 9000)
+        self.assertFalse(is_available(9876543, datetime(2091, 1, 12), datetime(2091, 1, 13)))
+
+        # new orders get IDs past the imported ones
+        r = Rent(pickup_time='2091-02-10 00:00:00', return_time='2091-02-20 00:00:00',
+                 client='987654321', car='9876544')
+        self.assertGreater(int(r.id), 98766)
+
+        for r in Rent.load_from_db():
+            if r.client.id == '987654321':
+                r.delete()
+        for serial in (9876543, 9876544):
+            Car.from_row(get_by_id(serial, table='cars')[0]).delete()
+        Person.from_row(get_by_id(987654321, table='person')[0]).delete()
+
+        # the rows are written through the storage engine in use
+        engine = storage.MemoryEngine()
+        previous = storage.set_engine(engine)
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                path = os.path.join(folder, 'persons.csv')
+                with open(path, 'w') as fh:
+                    fh.write(files['persons'])
+                self.assertTrue(importer.import_files(persons=path).ok)
+            self.assertEqual(engine.get('person', 987654321)[2], 'Testing')
+            self.assertEqual(statements.select_by_id('person', 987654321), [])
+        finally:
+            storage.set_engine(previous)
+
+    def test_export(self):
+        # exports stream the filtered rows to CSV or gzipped JSON Lines
+        p = Person(id_=987654321, p_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        c = Car(id_=9876543, brand='Test', model='Testing', year=2023,
+                engine=1600, day_cost=600, km=2000, owner='987654321')
+        c.save()
+        orders = [Rent(pickup_time=f'2091-01-{day} 10:00:00', return_time=f'2091-01-{day + 2} 10:00:00',
+                       client='987654321', car='9876543', id_=98765 + day, override=True) for day in (10, 20)]
+        for r in orders:
+            r.save()
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'rent.csv')
+            self.assertEqual(export.export('rent', path, owner=987654321, end=datetime(2091, 1, 10)), 1)
+            with open(path) as fh:
+                self.assertEqual(fh.read().splitlines(),
+                                 ['id,pickup,return,client,car', '98775,2091-01-10 10:00:00,2091-01-12 10:00:00,987654321,9876543'])
+
+            path = os.path.join(folder, 'revenue.jsonl.gz')
+            self.assertEqual(export.export('revenue', path, fmt='jsonl', car=9876543), 2)
+            with gzip.open(path, 'rt') as fh:
+                rows = [json.loads(line) for line in fh]
+            self.assertEqual(rows[1], {'day': '2091-01-20', 'car': '9876543', 'owner': '987654321',
+                                       'revenue': 1200, 'orders': 1})
+
+        for r in orders:
+            r.delete()
+        c.delete()
+        p.delete()
+
+    def test_migration(self):
+        # a CSV deployment is loaded, its later journal changes synced, and both sides verified
+        files = {'person.csv': 'ID,First Name,Last Name,Age,Email,Phone\r\n'
+                               '987654321,Test,Testing,20,mashu@mashu.com,0501234567\r\n',
+                 'cars.csv': 'Serial,Brand,Model,Year,Engine,Day Cost,KM,Owner\r\n'
+                             '9876543,Test,Testing,2023,1600,600,2000,987654321\r\n',
+                 'rent.csv': 'ID,Pickup Time,Return Time,Client,Car\r\n'
+                             '98765,2091-01-10 00:00:00,2091-01-20 00:00:00,987654321,9876543\r\n',
+                 'cars.csv.journal': 'U,9876544,Test,Testing,2023,1600,300,2000,987654321\r\n'}
+        with tempfile.TemporaryDirectory() as folder:
+            for name, text in files.items():
+                with open(os.path.join(folder, name), 'w', newline='') as fh:
+                    fh.write(text)
+            db = os.path.join(folder, 'carbnb.db')
+            target = sqlite3.connect(db)
+            get_connection().backup(target)
+            target.close()
+
+            migration = Migration(folder, db)
+            self.assertEqual(migration.load(replace=True), {'person': 1, 'cars': 2, 'rent': 1})
+            self.assertTrue(migration.verify()['ok'])
+            conn = get_connection(db)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'cars_owner'").fetchone()[0], 1)
+            self.assertEqual(conn.execute("SELECT SUM(revenue) FROM revenue_daily").fetchone()[0], 6000)
+
+            with open(os.path.join(folder, 'rent.csv.journal'), 'a', newline='') as fh:
+                fh.write('U,98766,2091-02-01 00:00:00,2091-02-03 00:00:00,987654321,9876544\r\nD,98765\r\nU,98767,20')
+            # a sync that fails leaves the journal records to the next one
+            with patch('rollup.rebuild', side_effect=RuntimeError):
+                self.assertRaises(RuntimeError, migration.sync)
+            self.assertEqual(migration.sync(), 2)
+            self.assertEqual(conn.execute("SELECT id, pickup FROM rent").fetchall(),
+                             [('98766', to_epoch(datetime(2091, 2, 1)))])
+            self.assertTrue(migration.verify()['ok'])
+            close_connections()
+
+    def test_storage_engines(self):
+        # the entity classes work the same on every engine, batch operations included
+        for engine in (storage.SqliteEngine(), storage.MemoryEngine()):
+            previous = storage.set_engine(engine)
+            try:
+                p = Person(id_=987654321, p_name='Test', l_name='Testing', age=20, email='mashu@mashu.com',
+                           phone='0501234567')
+                p.save()
+                with self.assertRaises(AssertionError):
+                    p.save()
+                p.edit({'lname': 'Edited'})
+                self.assertEqual(p.check_id()[0][2], 'Edited')
+
+                engine.put_many('person', [(987654322 + i, 'Test', 'Testing', 20, 'mashu@mashu.com', '0501234567')
+                                           for i in range(3)])
+                keys = [row[0] for row in engine.scan('person', 987654321, 987654324)]
+                self.assertEqual(keys, [987654321, 987654322, 987654323])
+                self.assertEqual(sorted(engine.get_many('person', [987654322, 987654324, 1])), ['987654322', '987654324'])
+
+                engine.delete_many('person', [987654322 + i for i in range(3)])
+                p.delete()
+                self.assertEqual(p.check_id(), [])
+            finally:
+                storage.set_engine(previous)
+
+
+    def test_synthetic_data(self):
+        # the same seed gives the same rows, and no car is booked twice at the same time
+        data = SyntheticData(2000, seed=7)
+        self.assertEqual((data.person_count, data.car_count, data.order_count), (200, 200, 1600))
+        self.assertEqual(list(data.persons()), list(SyntheticData(2000, seed=7).persons()))
+        self.assertNotEqual(list(data.cars()), list(SyntheticData(2000, seed=8).cars()))
+
+        orders = list(data.orders())
+        self.assertEqual(len({order[0] for order in orders}), 1600)
+        self.assertEqual(importer.find_overlaps([(car, pickup, ret) for _, pickup, ret, _, car in orders]), set())
+        self.assertEqual(data.end, max(order[2] for order in orders))
+
+    def test_profiling(self):
+        # timed calls are counted with the rows they read while profiling is on, and not at all while it is off
+        p = Person(id_=987654321, p_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        profiling.reset()
+        profiling.enable()
+        try:
+            p.check_id()
+            rollup.total(datetime(2091, 1, 1), datetime(2091, 12, 31))
+            stats = profiling.stats()
+            self.assertEqual(stats['filehandler.FileHandler.check_id']['calls'], 1)
+            self.assertEqual(stats['filehandler.FileHandler.check_id']['rows'], 1)
+            self.assertEqual(sum(stats['rollup.total']['histogram'].values()), 1)
+
+            with tempfile.TemporaryDirectory() as folder:
+                path = os.path.join(folder, 'profile.json')
+                profiling.dump(path)
+                with open(path) as fh:
+                    self.assertEqual(json.load(fh)['operations']['rollup.total']['calls'], 1)
+
+            profiling.enable(False)
+            p.check_id()
+            self.assertEqual(profiling.stats()['filehandler.FileHandler.check_id']['calls'], 1)
+        finally:
+            profiling.enable(False)
+            profiling.reset()
+            p.delete()
+
+    def test_log_queue(self):
+        # records are written by the background writer as JSON lines, all of them once it is stopped
+        logqueue.shutdown_logging()
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'carbnb.log')
+            logqueue.setup_logging(path)
+            try:
+                for object_id in range(250):
+                    auto_log('Client added', object_id=object_id)
+                auto_log('Car deleted', object_id=9876543)
+            finally:
+                logqueue.shutdown_logging()
+
+            self.assertEqual([entry['object_id'] for entry in logqueue.read_log(path, 'Client added')], list(range(250)))
+            self.assertEqual(list(logqueue.read_log(path, 'Car deleted'))[0]['message'], 'Car deleted: ID: 9876543')
+
+    def test_audit_index(self):
+        # the records of the log are found by object, event and time, and only new lines are read again
+        with tempfile.TemporaryDirectory() as folder:
+            log = os.path.join(folder, 'carbnb.log')
+            with open(log, 'w') as fh:
+                fh.write('INFO:2024-01-31 10:00:00,123:Car edited: ID: 1234567\n')
+                fh.write('not a record\n')
+                fh.write(json.dumps({'time': '2024-02-10T09:30:00.000', 'level': 'INFO',
+                                     'message': 'Car edited: ID: 1234567', 'event': 'Car edited',
+                                     'object_id': 1234567}) + '\n')
+                fh.write(json.dumps({'time': '2024-02-11T12:00:00.000', 'level': 'INFO',
+                                     'message': 'Client added: ID: 123456789', 'event': 'Client added',
+                                     'object_id': 123456789}) + '\n')
+                fh.write('INFO:2024-02-12 08:00:00,000:Car del')
+
+            index = audit.AuditIndex(log, os.path.join(folder, 'audit.db'))
+            try:
+                self.assertEqual(index.update(), 3)
+                self.assertEqual(index.update(), 0)
+                self.assertEqual([record['time'] for record in index.query(1234567)],
+                                 ['2024-01-31 10:00:00.123', '2024-02-10 09:30:00.000'])
+                self.assertEqual(len(index.query(1234567, datetime(2024, 2, 1), datetime(2024, 3, 1))), 1)
+                self.assertEqual(index.query(event='Client added')[0]['message'], 'Client added: ID: 123456789')
+
+                # the half written line is read once it is complete, and the rotated log before the new one
+                with open(log, 'a') as fh:
+                    fh.write('eted: ID: 1234567\n')
+                os.rename(log, log + '.1')
+                with open(log, 'w') as fh:
+                    fh.write('INFO:2024-02-13 08:00:00,000:Car added: ID: 7654321\n')
+                self.assertEqual(index.latest(1234567)['event'], 'Car deleted')
+                self.assertEqual(index.latest(7654321)['time'], '2024-02-13 08:00:00.000')
+                self.assertEqual(len(index.query()), 5)
+            finally:
+                index.close()
+
+    def test_writer_thread(self):
+        # queued jobs are committed together, a failing job is rolled back alone, and reads go on meanwhile
+        self.assertEqual(get_connection().execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        writer = Writer()
+        ids = [str(987654000 + i) for i in range(200)]
+
+        def add(object_id):
+            statements.insert('person', (object_id, 'Test', 'Testing', 20, 'mashu@mashu.com', '0501234567'))
+
+        def fail():
+            add('987653999')
+            assert False, "Rolled back"
+
+        try:
+            futures = []
+            threads = [threading.Thread(target=lambda part=part: futures.extend(writer.submit(add, object_id)
+                                                                                for object_id in part))
+                       for part in (ids[:100], ids[100:])]
+            for thread in threads:
+                thread.start()
+            failed = writer.submit(fail)
+            for thread in threads:
+                thread.join()
+            for future in futures:
+                future.result()
+            self.assertRaises(AssertionError, failed.result)
+            # the job cannot commit while this thread holds the write lock, so waiting on it is refused
+            with transaction():
+                late = writer.submit(add, '987653998')
+                self.assertRaises(AssertionError, late.result)
+            self.assertIsNone(late.result())
+            writer.close()
+
+            self.assertEqual(statements.select_by_id('person', '987653999'), [])
+            self.assertEqual(sum(len(statements.select_by_id('person', object_id)) for object_id in ids), 200)
+            self.assertLess(writer.commits, 200)
+        finally:
+            with transaction() as conn:
+                conn.executemany("DELETE FROM person WHERE id = ?", ((object_id,) for object_id in ids + ['987653998']))
+
+    def test_identity_rollback(self):
+        # an object read inside a rolled back transaction is not served after it
+        p = Person(id_=987654321, p_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        c = Car(id_=9876543, brand='Test', model='Testing', year=2023,
+                engine=1600, day_cost=100, km=2000, owner='987654321')
+        c.save()
+        ref = Ref('cars', 9876543, Car.from_row)
+        try:
+            with self.assertRaises(ZeroDivisionError):
+                with transaction() as conn:
+                    conn.execute("UPDATE cars SET day_cost = 999 WHERE id = ?", (9876543,))
+                    self.assertEqual(ref.day_cost, 999)
+                    1 / 0
+            self.assertEqual(ref.day_cost, 100)
+        finally:
+            c.delete()
+            p.delete()
+
+    def test_identity_writes(self):
+        # a write drops only the objects of its rows, and a transaction checks for other commits once
+        p = Person(id_=987654321, p_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        c = Car(id_=9876543, brand='Test', model='Testing', year=2023,
+                engine=1600, day_cost=100, km=2000, owner='987654321')
+        c.save()
+        other = Person(id_=987654322, p_name='Test', l_name='Testing', age=20, email='mashu@mashu.com',
+                       phone='0501234567')
+        try:
+            car = IDENTITY.get('cars', 9876543, Car.from_row)
+            other.save()
+            self.assertIs(IDENTITY.get('cars', 9876543, Car.from_row), car)
+            c.edit({'day_cost': 200})
+            self.assertEqual(IDENTITY.get('cars', 9876543, Car.from_row).day_cost, 200)
+
+            with patch('identity.get_connection', wraps=get_connection) as connection:
+                with transaction(mode='DEFERRED'):
+                    for _ in range(3):
+                        IDENTITY.get('cars', 9876543, Car.from_row)
+                self.assertEqual(connection.call_count, 1)
+        finally:
+            other.delete()
+            c.delete()
+            p.delete()
+
+    def test_thread_caches(self):
+        # every thread keeps its own shared objects, and sees no uncommitted booking of another
+        p = Person(id_=987654321, p_name='Test', l_name='Testing', age=20, email='mashu@mashu.com', phone='0501234567')
+        p.save()
+        c = Car(id_=9876543, brand='Test', model='Testing', year=2023,
+                engine=1600, day_cost=100, km=2000, owner='987654321')
+        c.save()
+        start, end = to_epoch(datetime(2091, 1, 10)), to_epoch(datetime(2091, 1, 20))
+        seen = {}
+
+        def other_thread():
+            seen['free'] = availability.is_free(9876543, start, end)
+            seen['day_cost'] = IDENTITY.get('cars', 9876543, Car.from_row).day_cost
+            close_connections()
+
+        try:
+            with self.assertRaises(RuntimeError):
+                with transaction() as conn:
+                    Rent(pickup_time='2091-01-10 00:00:00', return_time='2091-01-20 00:00:00',
+                         client='987654321', car='9876543', id_=98765, override=True).save()
+                    conn.execute("UPDATE cars SET day_cost = 999 WHERE id = ?", (9876543,))
+                    mine = IDENTITY.get('cars', 9876543, Car.from_row)
+                    self.assertFalse(availability.is_free(9876543, start, end))
+
+                    thread = threading.Thread(target=other_thread)
+                    thread.start()
+                    thread.join()
+                    self.assertEqual(seen, {'free': True, 'day_cost': 100})
+                    self.assertIs(IDENTITY.get('cars', 9876543, Car.from_row), mine)
+                    raise RuntimeError
+            self.assertTrue(availability.is_free(9876543, start, end))
+        finally:
+            c.delete()
+            p.delete()
 
 if __name__ == '__main__':
     unittest.main()